@@ -32,6 +32,22 @@ def create_app():
     # Extensions
     db.init_app(app)
     migrate.init_app(app, db)
+
+    from .metrics import init_app as init_metrics
+
+    init_metrics(app)
+
+    from .profiling import init_app as init_profiling
+
+    init_profiling(app)
+
+    from .chunk_store import init_app as init_chunk_store
+
+    init_chunk_store(app)
+
+    from .warmup import init_app as init_warmup
+
+    init_warmup(app)
     CORS(
         app,
         resources={
@@ -200,6 +216,7 @@ def create_app():
                     "ip": request.headers.get("X-Forwarded-For", request.remote_addr),
                     "user_id": user_id,
                     "request_id": getattr(g, "request_id", None),
+                    "stages": getattr(g, "stage_timings", None),
                 },
             )
         except Exception:
@@ -305,4 +322,92 @@ def create_app():
             else:
                 click.echo("User already exists. Use --force to update password.")
 
+    @app.cli.command("profile-token")
+    @click.option("--ttl", default=600, show_default=True, type=int, help="Seconds valid")
+    def profile_token(ttl):
+        """Mint an X-Profile header value that profiles matching requests."""
+        from .profiling import make_token, profiling_secret
+
+        click.echo(make_token(profiling_secret(app), ttl))
+
+    @app.cli.command("mock-gemini")
+    @click.option("--host", default="127.0.0.1", show_default=True)
+    @click.option("--port", default=8089, show_default=True, type=int)
+    @click.option(
+        "--embed-latency",
+        default="fixed:20",
+        show_default=True,
+        help="Embedding latency in ms: fixed:MS, uniform:LO:HI, normal:MEAN:STD, lognormal:MEDIAN:SIGMA, exp:MEAN",
+    )
+    @click.option(
+        "--generate-latency",
+        default="lognormal:800:0.5",
+        show_default=True,
+        help="Generation (time to first token) latency in ms, same forms as --embed-latency",
+    )
+    @click.option(
+        "--stream-chunk-latency",
+        default="fixed:40",
+        show_default=True,
+        help="Delay between streamed chunks in ms",
+    )
+    @click.option("--error-rate", default=0.0, show_default=True, type=float)
+    @click.option(
+        "--rpm", default=0, show_default=True, type=int, help="Quota; 0 disables 429s"
+    )
+    @click.option(
+        "--completion-tokens",
+        default=0,
+        show_default=True,
+        type=int,
+        help="Pad/trim answers to this many tokens (0 = natural length)",
+    )
+    @click.option("--embedding-dim", default=768, show_default=True, type=int)
+    @click.option(
+        "--prompt-token-latency",
+        default=0.0,
+        show_default=True,
+        type=float,
+        help="Extra ms per uncached prompt token (makes context caching visible)",
+    )
+    @click.option(
+        "--cache-min-tokens",
+        default=0,
+        show_default=True,
+        type=int,
+        help="Reject cachedContents smaller than this many tokens",
+    )
+    def mock_gemini(
+        host,
+        port,
+        embed_latency,
+        generate_latency,
+        stream_chunk_latency,
+        error_rate,
+        rpm,
+        completion_tokens,
+        embedding_dim,
+        prompt_token_latency,
+        cache_min_tokens,
+    ):
+        """Run a local stand-in for the Gemini API (set GEMINI_API_BASE_URL to use it)."""
+        from .mock_gemini import MockGeminiConfig, create_mock_gemini_app
+
+        config = MockGeminiConfig(
+            embed_latency=embed_latency,
+            generate_latency=generate_latency,
+            stream_chunk_latency=stream_chunk_latency,
+            error_rate=error_rate,
+            rate_limit_rpm=rpm,
+            completion_tokens=completion_tokens,
+            embedding_dim=embedding_dim,
+            prompt_token_latency_ms=prompt_token_latency,
+            cache_min_tokens=cache_min_tokens,
+        )
+        click.echo(
+            f"Mock Gemini listening on http://{host}:{port} "
+            f"(GEMINI_API_BASE_URL=http://{host}:{port}/v1beta)"
+        )
+        create_mock_gemini_app(config).run(host=host, port=port, threaded=True)
+
     return app
@@ -234,6 +234,45 @@ class CustomRoleModelView(ModelView):
     can_delete = True
 
 
+class ProfilesView(SecuredBaseView):
+    """Request profiles captured by the X-Profile header or sampling."""
+
+    @expose("/")
+    def index(self):
+        from ..profiling import list_profiles, profiles_dir
+
+        return self.render("admin/profiles.html", profiles=list_profiles(profiles_dir()))
+
+    @expose("/<profile_id>")
+    def details(self, profile_id):
+        from flask import abort, request
+        from ..profiling import profile_path, profiles_dir, top_functions
+
+        path = profile_path(profiles_dir(), profile_id, ".prof")
+        if path is None:
+            abort(404)
+        sort = request.args.get("sort", "cumulative")
+        if sort not in ("cumulative", "tottime", "ncalls"):
+            sort = "cumulative"
+        return self.render(
+            "admin/profile_details.html",
+            profile_id=profile_id,
+            sort=sort,
+            report=top_functions(path, sort=sort),
+        )
+
+    @expose("/<profile_id>/download/<kind>")
+    def download(self, profile_id, kind):
+        from flask import abort, send_file
+        from ..profiling import profile_path, profiles_dir
+
+        suffix = {"pstats": ".prof", "collapsed": ".collapsed"}.get(kind)
+        path = profile_path(profiles_dir(), profile_id, suffix) if suffix else None
+        if path is None:
+            abort(404)
+        return send_file(path, as_attachment=True, download_name=path.name)
+
+
 def register_admin_views(admin_app, SecuredModelView):
     # Use custom model views for problematic models
     class SecuredUserModelView(SecuredModelView, CustomUserModelView):
@@ -259,3 +298,4 @@ def register_admin_views(admin_app, SecuredModelView):
     admin_app.add_view(SecuredPersonaModelView(Persona, db.session))
     admin_app.add_view(SecuredResourceModelView(Resource, db.session))
     admin_app.add_view(SecuredFeedbackModelView(Feedback, db.session))
+    admin_app.add_view(ProfilesView(name="Profiles", endpoint="profiles"))
@@ -0,0 +1,295 @@
+"""
+Database-backed storage for knowledge-base chunks and embeddings.
+
+With ``EMBEDDING_STORE=database`` the indexer keeps the ``chunks`` and
+``chunk_embeddings`` tables in step with the markdown corpus and reads its
+vectors from them instead of the local embedding log, so every node pointing
+at the same database shares one source of truth. Vectors are float32 blobs;
+chunks with identical text share an embedding through their content hash.
+
+On SQLite the ``chunks_fts`` FTS5 table (created by the migrations, kept in
+sync by triggers) indexes chunk headers and text; :func:`keyword_search` ranks
+it with ``bm25()``. Where that index exists, chunk rows are synced on every
+index build whichever store holds the vectors, so the keyword index is on
+disk and ready in every worker without being rebuilt in memory. Other
+databases only get chunk rows with ``EMBEDDING_STORE=database``.
+
+Reads stream through ``Query.yield_per`` (server-side cursors where the
+driver supports them) in batches of ``CHUNK_STORE_BATCH_SIZE`` rows straight
+into float32 arrays, and writes use bulk inserts and updates, so neither side
+materialises ORM objects for the whole corpus.
+"""
+
+import os
+import re
+import hashlib
+import logging
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy.exc import SQLAlchemyError
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ("log", "database")
+
+_app = None
+# Whether each database URL has the chunks_fts table
+_fts_tables: Dict[str, bool] = {}
+
+
+def backend() -> str:
+    """``log`` (default) or ``database``, from ``EMBEDDING_STORE``."""
+    name = os.getenv("EMBEDDING_STORE", "log").strip().lower() or "log"
+    if name not in BACKENDS:
+        raise ValueError(f"EMBEDDING_STORE must be one of {', '.join(BACKENDS)}")
+    return name
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def _batches(items: List, size: int):
+    for start in range(0, len(items), size):
+        yield items[start : start + size]
+
+
+class DatabaseEmbeddingStore:
+    """Embedding store over the ``chunks`` and ``chunk_embeddings`` tables."""
+
+    def __init__(self, app, batch_size: int = None):
+        self.app = app
+        self.batch_size = batch_size or int(os.getenv("CHUNK_STORE_BATCH_SIZE", "1000"))
+
+    def key(self, chunk: Dict, embedding_model: str) -> str:
+        return text_hash(chunk["text"])
+
+    def load(self, chunks: List[Dict], embedding_model: str) -> Dict[str, np.ndarray]:
+        """Sync the chunk rows with ``chunks`` and stream every stored vector."""
+        from . import db
+        from .models.chunk_models import Chunk, ChunkEmbedding
+
+        with self.app.app_context():
+            self.sync_chunks(chunks)
+            vectors: Dict[str, np.ndarray] = {}
+            rows = (
+                db.session.query(Chunk.content_hash, ChunkEmbedding.vector)
+                .join(ChunkEmbedding, ChunkEmbedding.chunk_pk == Chunk.id)
+                .filter(ChunkEmbedding.embedding_model == embedding_model)
+                .yield_per(self.batch_size)
+            )
+            for content_hash, blob in rows:
+                vectors[content_hash] = ChunkEmbedding.unpack(blob)
+            # Rows whose text is already embedded under another row share it
+            self._write(vectors, embedding_model, replace=False)
+            return vectors
+
+    def append(
+        self, records: Iterable[Tuple[str, Optional[List[float]]]], embedding_model: str
+    ):
+        """Store new vectors for every chunk row with the given content hashes."""
+        vectors = {key: vector for key, vector in records if vector is not None}
+        if vectors:
+            with self.app.app_context():
+                self._write(vectors, embedding_model, replace=True)
+
+    def _write(self, vectors: Dict, embedding_model: str, replace: bool):
+        from . import db
+        from .models.chunk_models import Chunk, ChunkEmbedding
+
+        inserts, updates = [], []
+        for batch in _batches(list(vectors), self.batch_size):
+            rows = (
+                db.session.query(Chunk.id, Chunk.content_hash, ChunkEmbedding.id)
+                .outerjoin(
+                    ChunkEmbedding,
+                    (ChunkEmbedding.chunk_pk == Chunk.id)
+                    & (ChunkEmbedding.embedding_model == embedding_model),
+                )
+                .filter(Chunk.content_hash.in_(batch))
+                .all()
+            )
+            for chunk_pk, content_hash, embedding_pk in rows:
+                vector = np.asarray(vectors[content_hash], dtype=np.float32)
+                values = {"vector": ChunkEmbedding.pack(vector), "dimensions": len(vector)}
+                if embedding_pk is None:
+                    inserts.append(
+                        dict(values, chunk_pk=chunk_pk, embedding_model=embedding_model)
+                    )
+                elif replace:
+                    updates.append(dict(values, id=embedding_pk))
+        if inserts:
+            db.session.bulk_insert_mappings(ChunkEmbedding, inserts)
+        if updates:
+            db.session.bulk_update_mappings(ChunkEmbedding, updates)
+        db.session.commit()
+
+    def sync_chunks(self, chunks: List[Dict]) -> Dict[str, int]:
+        """Insert, update and delete chunk rows so they mirror ``chunks``."""
+        from . import db
+        from .models.chunk_models import Chunk, ChunkEmbedding
+        from .models.resource_models import Resource
+
+        resources = {
+            filepath: (resource_id, user_id)
+            for filepath, resource_id, user_id in db.session.query(
+                Resource.filepath, Resource.id, Resource.user_id
+            )
+        }
+        existing = {
+            (row.source_path, row.position): row
+            for row in db.session.query(
+                Chunk.id,
+                Chunk.source_path,
+                Chunk.position,
+                Chunk.chunk_id,
+                Chunk.header,
+                Chunk.content_hash,
+                Chunk.file_mtime,
+                Chunk.resource_id,
+            ).yield_per(self.batch_size)
+        }
+
+        inserts, updates, stale_embeddings = [], [], []
+        for chunk in chunks:
+            source_path = chunk.get("source_path") or chunk["source_file"]
+            resource_id, user_id = resources.get(source_path, (None, None))
+            values = {
+                "chunk_id": chunk["chunk_id"],
+                "source_path": source_path,
+                "position": chunk["position"],
+                "resource_id": resource_id,
+                "header": chunk.get("header") or "",
+                "text": chunk["text"],
+                "content_hash": text_hash(chunk["text"]),
+                "file_mtime": chunk.get("file_mtime"),
+            }
+            row = existing.pop((source_path, chunk["position"]), None)
+            if row is None:
+                inserts.append(dict(values, user_id=user_id))
+            elif (
+                row.content_hash != values["content_hash"]
+                or row.header != values["header"]
+                or row.chunk_id != values["chunk_id"]
+                or row.file_mtime != values["file_mtime"]
+                or row.resource_id != resource_id
+            ):
+                updates.append(dict(values, id=row.id))
+                if row.content_hash != values["content_hash"]:
+                    stale_embeddings.append(row.id)
+
+        removed = [row.id for row in existing.values()]
+        for batch in _batches(stale_embeddings + removed, self.batch_size):
+            ChunkEmbedding.query.filter(ChunkEmbedding.chunk_pk.in_(batch)).delete(
+                synchronize_session=False
+            )
+        for batch in _batches(removed, self.batch_size):
+            Chunk.query.filter(Chunk.id.in_(batch)).delete(synchronize_session=False)
+        if inserts:
+            db.session.bulk_insert_mappings(Chunk, inserts)
+        if updates:
+            db.session.bulk_update_mappings(Chunk, updates)
+        db.session.commit()
+        counts = {"inserted": len(inserts), "updated": len(updates), "deleted": len(removed)}
+        if inserts or updates or removed:
+            logger.info("synced knowledge chunks", extra=counts)
+        return counts
+
+    def close(self):
+        pass
+
+    def maintain(self, keys: Iterable[str]):
+        """Nothing to compact: rows are updated in place."""
+
+
+def sync_corpus(chunks: List[Dict]):
+    """Mirror ``chunks`` into the chunk table (and so the FTS index), if there is one."""
+    if _app is None or not fts_enabled():
+        return
+    from . import db
+
+    with _app.app_context():
+        # Only SQLite with FTS5 has a keyword index to feed
+        if not _fts_available(db.session):
+            return
+        try:
+            DatabaseEmbeddingStore(_app).sync_chunks(chunks)
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            logger.warning("could not sync knowledge chunks to the database: %s", e)
+
+
+def fts_enabled() -> bool:
+    return os.getenv("KNOWLEDGE_FTS_ENABLED", "true").lower() == "true"
+
+
+def _fts_available(session) -> bool:
+    """Whether the bound database is SQLite with FTS5 and the ``chunks_fts`` table."""
+    from . import db
+
+    bind = session.get_bind()
+    if bind.dialect.name != "sqlite":
+        return False
+    key = str(bind.url)
+    if key not in _fts_tables:
+        try:
+            # Fails with "no such table" or, without FTS5, "no such module"
+            session.execute(db.text("SELECT rowid FROM chunks_fts LIMIT 0"))
+            _fts_tables[key] = True
+        except SQLAlchemyError:
+            session.rollback()
+            _fts_tables[key] = False
+    return _fts_tables[key]
+
+
+def _match_expression(query: str) -> str:
+    """Any of the query's terms, each quoted so FTS5 syntax in user input is inert."""
+    terms = dict.fromkeys(re.findall(r"\w+", query.lower()))
+    return " OR ".join(f'"{term}"' for term in terms)
+
+
+def keyword_search(query: str, top_k: int = 10) -> List[Dict]:
+    """
+    Knowledge chunks matching ``query`` by BM25 (headers weighted double), best
+    first, each with a ``bm25`` score (higher is better). Empty when the FTS
+    index is unavailable.
+    """
+    expression = _match_expression(query)
+    if _app is None or not fts_enabled() or not expression:
+        return []
+    from . import db
+    from .models.chunk_models import Chunk
+
+    with _app.app_context():
+        if not _fts_available(db.session):
+            return []
+        rows = db.session.execute(
+            db.text(
+                "SELECT rowid, bm25(chunks_fts, 2.0, 1.0) AS score FROM chunks_fts "
+                "WHERE chunks_fts MATCH :expression ORDER BY score LIMIT :limit"
+            ),
+            {"expression": expression, "limit": top_k},
+        ).all()
+        chunks = {
+            chunk.id: chunk
+            for chunk in Chunk.query.filter(Chunk.id.in_([row.rowid for row in rows]))
+        }
+        results = []
+        for row in rows:
+            chunk = chunks.get(row.rowid)
+            if chunk is not None:
+                results.append(dict(chunk.to_dict(), bm25=-float(row.score)))
+        return results
+
+
+def get_store() -> DatabaseEmbeddingStore:
+    if _app is None:
+        raise RuntimeError("EMBEDDING_STORE=database needs the Flask app (create_app)")
+    return DatabaseEmbeddingStore(_app)
+
+
+def init_app(app):
+    """Remember the app so background index builds can open app contexts."""
+    global _app
+    _app = app
@@ -0,0 +1,139 @@
+"""
+Provider-side context caching for stable prompt prefixes.
+
+The persona block and answer instructions (optionally the pinned knowledge base)
+are identical across requests, so providers that support it (Gemini
+``cachedContents``) upload them once and later requests send only the variable
+suffix plus a cache handle. This module tracks those handles per process: one
+per (model, prefix hash), refreshed before their TTL runs out, remembered as
+uncacheable when the provider rejects them (e.g. below its minimum token count),
+retried after ``CONTEXT_CACHE_RETRY_SECONDS`` when creation fails transiently
+(timeouts, 429 and 5xx), and dropped when the persona they were built from
+changes.
+"""
+
+import os
+import time
+import hashlib
+import logging
+import threading
+from typing import Callable, Dict, Optional
+
+from .providers.base import estimate_tokens
+from .resilience import is_retryable
+
+logger = logging.getLogger(__name__)
+
+
+class _Handle:
+    __slots__ = ("name", "expires_at", "tags")
+
+    def __init__(self, name: Optional[str], expires_at: float, tags):
+        self.name = name  # None marks a prefix the provider refused to cache
+        self.expires_at = expires_at
+        self.tags = set(tags)
+
+
+class ContextCache:
+    def __init__(
+        self,
+        enabled: bool = True,
+        ttl_seconds: int = 3600,
+        min_tokens: int = 4096,
+        refresh_margin: float = 60.0,
+        retry_seconds: float = 30.0,
+    ):
+        self.enabled = enabled
+        self.ttl_seconds = ttl_seconds
+        self.min_tokens = min_tokens
+        self.refresh_margin = refresh_margin
+        self.retry_seconds = retry_seconds
+        self._handles: Dict[str, _Handle] = {}
+        self._lock = threading.Lock()
+        self._key_locks: Dict[str, threading.Lock] = {}
+
+    @staticmethod
+    def key(model: str, prefix: str) -> str:
+        return hashlib.sha256(f"{model}\x00{prefix}".encode("utf-8")).hexdigest()
+
+    def handle_for(
+        self,
+        model: str,
+        prefix: str,
+        create: Callable[[int], Optional[str]],
+        tags=(),
+    ) -> Optional[str]:
+        """
+        Return a live cache handle for ``prefix``, creating it with ``create(ttl)``.
+
+        ``create`` returns the provider's handle name, or ``None``/raises when the
+        provider will not cache it; callers then send the prefix inline.
+        """
+        if not self.enabled or not prefix or estimate_tokens(prefix) < self.min_tokens:
+            return None
+
+        key = self.key(model, prefix)
+        handle = self._fresh(key)
+        if handle is not None:
+            return handle.name
+
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        # One creation per prefix; concurrent requests wait for it
+        with key_lock:
+            handle = self._fresh(key)
+            if handle is not None:
+                return handle.name
+            # A definitive rejection holds for the TTL; transient errors are retried soon
+            remember = self.ttl_seconds
+            try:
+                name = create(self.ttl_seconds)
+            except Exception as exc:
+                logger.warning("context cache creation failed: %s", exc)
+                name = None
+                if is_retryable(exc):
+                    remember = self.retry_seconds
+            with self._lock:
+                self._handles[key] = _Handle(name, time.time() + remember, tags)
+            return name
+
+    def _fresh(self, key: str) -> Optional[_Handle]:
+        with self._lock:
+            handle = self._handles.get(key)
+        if handle is None:
+            return None
+        # Live handles are refreshed early; uncacheable markers last their full time
+        margin = self.refresh_margin if handle.name else 0.0
+        if handle.expires_at - margin <= time.time():
+            return None
+        return handle
+
+    def forget(self, name: str):
+        """Drop a handle the provider reports as expired or unknown."""
+        with self._lock:
+            for key, handle in list(self._handles.items()):
+                if handle.name == name:
+                    del self._handles[key]
+
+    def invalidate_tag(self, tag: str, delete: Callable[[str], None] = None):
+        """Drop (and optionally delete provider-side) every handle built with ``tag``."""
+        with self._lock:
+            doomed = [(k, h) for k, h in self._handles.items() if tag in h.tags]
+            for key, _handle in doomed:
+                del self._handles[key]
+        for _key, handle in doomed:
+            if handle.name and delete is not None:
+                try:
+                    delete(handle.name)
+                except Exception as exc:
+                    logger.warning("failed to delete cached content %s: %s", handle.name, exc)
+        return len(doomed)
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            enabled=os.getenv("CONTEXT_CACHE_ENABLED", "true").lower() == "true",
+            ttl_seconds=int(os.getenv("CONTEXT_CACHE_TTL_SECONDS", "3600")),
+            min_tokens=int(os.getenv("CONTEXT_CACHE_MIN_TOKENS", "4096")),
+            retry_seconds=float(os.getenv("CONTEXT_CACHE_RETRY_SECONDS", "30")),
+        )
@@ -0,0 +1,198 @@
+"""
+Extractive compression of retrieved chunks before prompt assembly.
+
+Retrieved chunks go into the prompt whole, although usually only a couple of
+their sentences bear on the question. :func:`compress_chunks` splits the chunks
+into sentences, scores them all in one vectorised pass and keeps the best ones,
+up to ``CONTEXT_COMPRESSION_TOKEN_BUDGET`` tokens, in their original order.
+
+Two scorers are available (``CONTEXT_COMPRESSION_SCORER``):
+
+* ``bm25`` (default) scores each sentence against the query terms with
+  sentences as the documents. This needs no extra provider call.
+* ``embedding`` embeds the sentences in one batch and ranks them by cosine
+  similarity to the query embedding. Without a query embedding, or if the
+  batch fails, it falls back to ``bm25``.
+
+A small prior for chunk rank and sentence position breaks ties. Context that
+already fits the budget is returned unchanged. Headings of a chunk are kept
+whenever any of its sentences is.
+"""
+
+import os
+import re
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .providers.base import estimate_tokens
+
+SCORERS = ("bm25", "embedding")
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Separates kept sentences that were not adjacent in the chunk
+GAP = " … "
+
+_TERM = re.compile(r"\w+")
+# Sentence ends: terminal punctuation followed by whitespace and an upper-case
+# letter, digit, quote or list marker
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+(?=[A-Z0-9\"'(*\-])")
+
+
+def settings() -> Tuple[bool, int, str]:
+    """``(enabled, token_budget, scorer)`` from the environment."""
+    scorer = os.getenv("CONTEXT_COMPRESSION_SCORER", "bm25").strip().lower() or "bm25"
+    if scorer not in SCORERS:
+        raise ValueError(f"CONTEXT_COMPRESSION_SCORER must be one of {', '.join(SCORERS)}")
+    return (
+        os.getenv("CONTEXT_COMPRESSION_ENABLED", "true").lower() == "true",
+        int(os.getenv("CONTEXT_COMPRESSION_TOKEN_BUDGET", "600")),
+        scorer,
+    )
+
+
+def split_sentences(text: str) -> List[Tuple[str, bool]]:
+    """``(unit, is_heading)`` pairs: markdown headings, then sentences of each line."""
+    units = []
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith("#"):
+            units.append((line, True))
+            continue
+        units.extend((part, False) for part in _SENTENCE_END.split(line) if part.strip())
+    return units
+
+
+def bm25_scores(query: str, sentences: List[str]) -> np.ndarray:
+    """BM25 of every sentence against ``query``, sentences acting as the documents."""
+    terms = list(dict.fromkeys(_TERM.findall(query.lower())))
+    if not terms or not sentences:
+        return np.zeros(len(sentences))
+    column = {term: i for i, term in enumerate(terms)}
+    frequencies = np.zeros((len(sentences), len(terms)))
+    lengths = np.zeros(len(sentences))
+    for row, sentence in enumerate(sentences):
+        tokens = _TERM.findall(sentence.lower())
+        lengths[row] = len(tokens)
+        for token in tokens:
+            i = column.get(token)
+            if i is not None:
+                frequencies[row, i] += 1
+
+    containing = (frequencies > 0).sum(axis=0)
+    idf = np.log1p((len(sentences) - containing + 0.5) / (containing + 0.5))
+    norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths / max(lengths.mean(), 1.0))
+    weights = frequencies * (BM25_K1 + 1) / (frequencies + norm[:, None])
+    return weights @ idf
+
+
+def embedding_scores(query_embedding, sentence_embeddings) -> np.ndarray:
+    """Cosine similarity of every sentence embedding to the query embedding."""
+    matrix = np.asarray(sentence_embeddings, dtype=np.float32)
+    query = np.asarray(query_embedding, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1) * (np.linalg.norm(query) or 1.0)
+    return (matrix @ query) / np.where(norms == 0, 1.0, norms)
+
+
+def compress_chunks(
+    query: str,
+    chunks: List[Dict],
+    query_embedding: Optional[List[float]] = None,
+    embed: Optional[Callable[[List[str]], List]] = None,
+    token_budget: int = None,
+) -> Tuple[List[Dict], Dict]:
+    """
+    Keep the sentences of ``chunks`` most relevant to ``query``.
+
+    ``embed`` (a list of texts to a list of vectors) is only used by the
+    ``embedding`` scorer. Returns ``(chunks, stats)``. The chunks are copies
+    with their ``text`` cut down, and chunks left with no sentence are
+    dropped. ``stats`` holds the ``original_tokens`` and ``context_tokens``.
+    """
+    enabled, default_budget, scorer = settings()
+    budget = default_budget if token_budget is None else token_budget
+    original_tokens = sum(estimate_tokens(chunk["text"]) for chunk in chunks)
+    stats = {
+        "original_tokens": original_tokens,
+        "context_tokens": original_tokens,
+        "compressed": False,
+    }
+    if not enabled or not chunks or original_tokens <= budget:
+        return chunks, stats
+
+    # Flatten every chunk into (chunk, position, unit) rows
+    owners, positions, units, headings = [], [], [], []
+    for rank, chunk in enumerate(chunks):
+        for position, (unit, is_heading) in enumerate(split_sentences(chunk["text"])):
+            owners.append(rank)
+            positions.append(position)
+            units.append(unit)
+            headings.append(is_heading)
+    owners = np.asarray(owners)
+    positions = np.asarray(positions)
+    headings = np.asarray(headings, dtype=bool)
+    # Unrounded, so the per-sentence costs add up to estimate_tokens of the result
+    tokens = np.asarray(
+        [max(len(unit.split()) * 1.3, len(unit) / 4) for unit in units]
+    )
+
+    scores = None
+    if scorer == "embedding" and query_embedding and embed is not None:
+        sentence_embeddings = embed([units[i] for i in np.flatnonzero(~headings)])
+        if sentence_embeddings and all(sentence_embeddings):
+            scores = np.zeros(len(units))
+            scores[~headings] = embedding_scores(query_embedding, sentence_embeddings)
+            scorer_used = "embedding"
+    if scores is None:
+        scores = bm25_scores(query, units)
+        scorer_used = "bm25"
+    # Prefer better-ranked chunks and earlier sentences when scores tie
+    scores = scores + 1e-3 / (1 + owners) + 1e-4 / (1 + positions)
+
+    keep = np.zeros(len(units), dtype=bool)
+    used = 0
+    for row in np.argsort(-scores, kind="stable"):
+        if headings[row]:
+            continue
+        # Plus one word for a possible gap marker before the sentence
+        cost = tokens[row] + 1.3
+        # A chunk's headings come along with its first kept sentence
+        first_from_chunk = not keep[owners == owners[row]].any()
+        if first_from_chunk:
+            cost += tokens[(owners == owners[row]) & headings].sum()
+        if used + cost > budget:
+            continue
+        keep[row] = True
+        if first_from_chunk:
+            keep[(owners == owners[row]) & headings] = True
+        used += cost
+
+    compressed = []
+    for rank, chunk in enumerate(chunks):
+        rows = np.flatnonzero((owners == rank) & keep)
+        if not len(rows) or headings[rows].all():
+            continue
+        text, previous = "", None
+        for row in rows:
+            if previous is not None:
+                if headings[previous] or headings[row]:
+                    text += "\n"
+                else:
+                    text += " " if row == previous + 1 else GAP
+            text += units[row]
+            previous = row
+        compressed.append(dict(chunk, text=text))
+
+    if not compressed:
+        # Nothing fits (one huge sentence): keep the retrieval as it was
+        return chunks, stats
+    stats.update(
+        context_tokens=sum(estimate_tokens(chunk["text"]) for chunk in compressed),
+        compressed=True,
+        scorer=scorer_used,
+        sentences=int(len(units)),
+        sentences_kept=int(keep.sum()),
+    )
+    return compressed, stats
@@ -0,0 +1,197 @@
+"""
+Rolling per-session conversation summaries.
+
+Inlining the last few full exchanges makes prompts grow with every turn of a
+long session. Instead, each session has a ``ConversationSummary`` row holding
+a short running summary and the id of the last ``chat_history`` row folded
+into it. The prompt carries that summary plus only the turns after it
+verbatim, which is normally just the most recent one.
+
+Off by default (``CONVERSATION_SUMMARY_ENABLED``): each fold is an extra LLM
+call through the same provider and circuit breaker as the answers. After each
+turn is saved, :func:`schedule_update` folds every turn but the newest into
+the summary with one LLM call, in a background worker, off the request path.
+Updates for a session are coalesced: a turn saved while its session is being
+summarised only marks it for one more pass. Rows are
+updated conditionally on ``summarized_through_id``, so concurrent workers in
+other processes never fold the same turns twice. If summarising fails, the
+unfolded turns simply stay verbatim until the next pass succeeds.
+"""
+
+import os
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Set, Tuple
+
+from sqlalchemy.exc import IntegrityError
+
+logger = logging.getLogger(__name__)
+
+# Turns folded per LLM call, and characters of each reply the summariser sees
+FOLD_MAX_TURNS = 10
+FOLD_MAX_RESPONSE_CHARS = 4000
+
+_lock = threading.Lock()
+_running: Set[Tuple[int, str]] = set()
+_dirty: Set[Tuple[int, str]] = set()
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def enabled() -> bool:
+    return os.getenv("CONVERSATION_SUMMARY_ENABLED", "false").lower() == "true"
+
+
+def max_words() -> int:
+    return int(os.getenv("CONVERSATION_SUMMARY_MAX_WORDS", "250"))
+
+
+def _turn(chat) -> Dict:
+    return {
+        "message": chat.message,
+        "response": chat.response,
+        "created_at": chat.created_at.isoformat(),
+    }
+
+
+def load(user_id: int, session_id: str, limit: int) -> Tuple[Optional[str], List[Dict]]:
+    """The session's summary (or None) and, in order, the last ``limit`` turns it does not cover."""
+    from .models.chat_models import ChatHistory, ConversationSummary
+
+    row = ConversationSummary.query.filter_by(user_id=user_id, session_id=session_id).first()
+    through = row.summarized_through_id if row else 0
+    chats = (
+        ChatHistory.query.filter(
+            ChatHistory.user_id == user_id,
+            ChatHistory.session_id == session_id,
+            ChatHistory.id > through,
+        )
+        .order_by(ChatHistory.id.desc())
+        .limit(limit)
+        .all()
+    )
+    return (row.summary or None) if row else None, [_turn(chat) for chat in reversed(chats)]
+
+
+def build_summary_prompt(summary: Optional[str], turns: List[Dict], words: int) -> str:
+    exchanges = "\n\n".join(
+        f"Human: {turn['message']}\nAssistant: {(turn['response'] or '')[:FOLD_MAX_RESPONSE_CHARS]}"
+        for turn in turns
+    )
+    return f"""You maintain a running summary of a conversation between a user and an AI assistant.
+Update the summary with the new exchanges below. Keep the user's goals, preferences and
+constraints, facts, names and numbers, decisions and answers given, and open questions that
+later turns may refer back to. Drop greetings and filler. Write plain prose of at most {words} words.
+
+## Current Summary:
+{summary or "(none yet)"}
+
+## New Exchanges:
+{exchanges}
+
+Updated summary:"""
+
+
+def update(user_id: int, session_id: str, api_key: str) -> bool:
+    """
+    Fold every turn of the session except the newest into its summary.
+
+    Returns whether the summary changed. Needs an app context.
+    """
+    from . import db
+    from .models.chat_models import ChatHistory, ConversationSummary
+    from .rag_pipeline_llm_driven import call_gemini
+
+    row = ConversationSummary.query.filter_by(user_id=user_id, session_id=session_id).first()
+    through = row.summarized_through_id if row else 0
+    pending = (
+        ChatHistory.query.filter(
+            ChatHistory.user_id == user_id,
+            ChatHistory.session_id == session_id,
+            ChatHistory.id > through,
+        )
+        .order_by(ChatHistory.id.asc())
+        .limit(FOLD_MAX_TURNS + 1)
+        .all()
+    )
+    # The newest turn is sent verbatim, so it is folded on the next pass
+    fold = pending[:FOLD_MAX_TURNS] if len(pending) > FOLD_MAX_TURNS else pending[:-1]
+    if not fold:
+        return False
+
+    words = max_words()
+    text, _usage, error = call_gemini(
+        build_summary_prompt(row.summary if row else None, [_turn(c) for c in fold], words),
+        api_key,
+    )
+    if error or not (text or "").strip():
+        logger.warning("conversation summary failed for session %s: %s", session_id, error)
+        return False
+    # Bound the summary even if the model ignores the word limit
+    summary = " ".join(text.split()[: words * 2])
+    values = {
+        "summary": summary,
+        "summarized_through_id": fold[-1].id,
+        "turns": (row.turns if row else 0) + len(fold),
+    }
+
+    try:
+        if row is None:
+            db.session.add(ConversationSummary(user_id=user_id, session_id=session_id, **values))
+            updated = 1
+        else:
+            # Another worker may have folded these turns meanwhile
+            updated = ConversationSummary.query.filter_by(
+                id=row.id, summarized_through_id=through
+            ).update(values, synchronize_session=False)
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return False
+    return bool(updated)
+
+
+def _run(app, key: Tuple[int, str]):
+    from .rag_pipeline_llm_driven import get_api_key
+
+    while True:
+        try:
+            with app.app_context():
+                while update(key[0], key[1], get_api_key()):
+                    # Catch up on turns saved while the summariser was busy
+                    pass
+        except Exception:
+            logger.exception("conversation summary update failed for session %s", key[1])
+        with _lock:
+            if key not in _dirty:
+                _running.discard(key)
+                return
+            _dirty.discard(key)
+
+
+def drain():
+    """Wait for pending summary updates (before the database goes away)."""
+    global _executor
+    with _lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=True)
+
+
+def schedule_update(app, user_id: int, session_id: str):
+    """Update the session's summary in the background; cheap to call after every turn."""
+    global _executor
+    if not enabled() or not session_id:
+        return
+    key = (user_id, session_id)
+    with _lock:
+        if key in _running:
+            _dirty.add(key)
+            return
+        _running.add(key)
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=int(os.getenv("CONVERSATION_SUMMARY_WORKERS", "2")),
+                thread_name_prefix="conversation-summary",
+            )
+    _executor.submit(_run, app, key)
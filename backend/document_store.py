@@ -0,0 +1,207 @@
+"""
+Per-user content-addressed store for client documents.
+
+The chat client registers document bodies (or chunks) once and then refers to
+them by SHA-256 in ``/api/chat/message/client-documents``, instead of re-sending
+megabytes of JSON on every turn. Each user has a byte and document-count quota;
+registering past it evicts that user's least recently used documents, and a
+single registration that would not fit on its own is rejected.
+"""
+
+import os
+import re
+import hashlib
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+
+from . import db
+from .metrics import record_cache
+from .models.document_store_models import ClientDocument
+
+SHA256_RE = re.compile(r"^[0-9a-f]{64}$")
+
+
+class DocumentStoreError(ValueError):
+    """Rejected registration (e.g. a single document larger than the quota allows)."""
+
+
+def content_hash(content: str) -> str:
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def quota_bytes() -> int:
+    return int(os.getenv("CLIENT_DOC_STORE_MAX_BYTES_PER_USER", str(50 * 1024 * 1024)))
+
+
+def quota_documents() -> int:
+    return int(os.getenv("CLIENT_DOC_STORE_MAX_DOCS_PER_USER", "500"))
+
+
+def usage(user_id: int) -> Dict:
+    count, total = (
+        db.session.query(func.count(ClientDocument.id), func.sum(ClientDocument.size_bytes))
+        .filter(ClientDocument.user_id == user_id)
+        .one()
+    )
+    return {
+        "documents": count or 0,
+        "bytes": int(total or 0),
+        "max_documents": quota_documents(),
+        "max_bytes": quota_bytes(),
+    }
+
+
+def register_documents(user_id: int, documents: List[Dict]) -> List[Dict]:
+    """
+    Store ``{filename, content[, sha256]}`` items and return their references.
+
+    A client-supplied ``sha256`` is verified against the content. Already stored
+    content is only touched (no second copy), so re-registering is cheap.
+    """
+    max_doc_bytes = min(
+        quota_bytes(), int(os.getenv("CLIENT_DOC_STORE_MAX_DOC_BYTES", str(5 * 1024 * 1024)))
+    )
+    validated = []
+    for item in documents:
+        content = item.get("content") if isinstance(item, dict) else None
+        if not isinstance(content, str) or not content.strip():
+            raise DocumentStoreError("Each document needs non-empty content")
+        size = len(content.encode("utf-8"))
+        if size > max_doc_bytes:
+            raise DocumentStoreError(
+                f"Document '{item.get('filename', 'unknown')}' exceeds {max_doc_bytes} bytes"
+            )
+        digest = content_hash(content)
+        claimed = (item.get("sha256") or "").lower()
+        if claimed and claimed != digest:
+            raise DocumentStoreError(
+                f"sha256 mismatch for '{item.get('filename', 'unknown')}'"
+            )
+        validated.append((digest, item, content, size))
+
+    # Eviction never removes the batch being registered, so the batch alone
+    # has to fit the quota
+    sizes = {digest: size for digest, _item, _content, size in validated}
+    if len(sizes) > quota_documents():
+        raise DocumentStoreError(f"At most {quota_documents()} documents can be stored")
+    if sum(sizes.values()) > quota_bytes():
+        raise DocumentStoreError(f"Documents exceed the {quota_bytes()} byte quota")
+
+    now = datetime.utcnow()
+    registered = []
+    for digest, item, content, size in validated:
+        doc = ClientDocument.query.filter_by(user_id=user_id, sha256=digest).first()
+        if doc is None:
+            doc = ClientDocument(
+                user_id=user_id,
+                sha256=digest,
+                filename=(item.get("filename") or "unknown")[:255],
+                content=content,
+                size_bytes=size,
+            )
+            try:
+                with db.session.begin_nested():
+                    db.session.add(doc)
+            except IntegrityError:
+                # A concurrent request registered the same content first
+                doc = ClientDocument.query.filter_by(user_id=user_id, sha256=digest).one()
+        doc.last_used_at = now
+        registered.append({"sha256": digest, "filename": doc.filename, "size_bytes": size})
+
+    db.session.flush()
+    _evict(user_id, keep={ref["sha256"] for ref in registered})
+    db.session.commit()
+    return registered
+
+
+def _evict(user_id: int, keep=frozenset()):
+    """Drop least recently used documents until the user is within quota."""
+    current = usage(user_id)
+    over_bytes = current["bytes"] - current["max_bytes"]
+    over_docs = current["documents"] - current["max_documents"]
+    if over_bytes <= 0 and over_docs <= 0:
+        return
+
+    candidates = (
+        db.session.query(ClientDocument.id, ClientDocument.sha256, ClientDocument.size_bytes)
+        .filter(ClientDocument.user_id == user_id)
+        .order_by(ClientDocument.last_used_at.asc(), ClientDocument.id.asc())
+        .all()
+    )
+    doomed = []
+    for doc_id, sha, size in candidates:
+        if over_bytes <= 0 and over_docs <= 0:
+            break
+        if sha in keep:
+            continue
+        doomed.append(doc_id)
+        over_bytes -= size
+        over_docs -= 1
+    if doomed:
+        ClientDocument.query.filter(ClientDocument.id.in_(doomed)).delete(
+            synchronize_session=False
+        )
+
+
+def lookup(user_id: int, hashes: List[str]) -> Tuple[List[str], List[str]]:
+    """Split ``hashes`` into (present, missing) for this user."""
+    wanted = [h.lower() for h in hashes if isinstance(h, str)]
+    present = {
+        sha
+        for (sha,) in db.session.query(ClientDocument.sha256).filter(
+            ClientDocument.user_id == user_id, ClientDocument.sha256.in_(wanted)
+        )
+    }
+    return [h for h in wanted if h in present], [h for h in wanted if h not in present]
+
+
+def resolve_documents(user_id: int, items: List[Dict]) -> Tuple[List[Dict], List[str]]:
+    """
+    Expand ``{"sha256": ...}`` references into ``{filename, content}`` documents.
+
+    Inline ``{filename, content}`` items pass through unchanged. Returns the
+    documents in request order plus the hashes that are not (or no longer) stored.
+    """
+    refs = [
+        (item.get("sha256") or "").lower()
+        for item in items
+        if isinstance(item, dict) and item.get("sha256") and not item.get("content")
+    ]
+    stored = {}
+    if refs:
+        stored = {
+            doc.sha256: doc
+            for doc in ClientDocument.query.filter(
+                ClientDocument.user_id == user_id, ClientDocument.sha256.in_(refs)
+            )
+        }
+        ClientDocument.query.filter(
+            ClientDocument.user_id == user_id, ClientDocument.sha256.in_(list(stored))
+        ).update({"last_used_at": datetime.utcnow()}, synchronize_session=False)
+        record_cache("client_documents", hits=len(stored), misses=len(set(refs) - set(stored)))
+
+    documents, missing = [], []
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        sha = (item.get("sha256") or "").lower()
+        if sha and not item.get("content"):
+            doc = stored.get(sha)
+            if doc is None:
+                missing.append(sha)
+                continue
+            documents.append(
+                {"filename": item.get("filename") or doc.filename, "content": doc.content}
+            )
+        else:
+            documents.append(item)
+    return documents, missing
+
+
+def delete_document(user_id: int, sha256: str) -> bool:
+    deleted = ClientDocument.query.filter_by(user_id=user_id, sha256=sha256.lower()).delete()
+    db.session.commit()
+    return bool(deleted)
@@ -0,0 +1,283 @@
+"""
+Append-only store of knowledge-base embeddings.
+
+Vectors are kept as records in numbered segment files under
+``.embeddings_log/`` next to the other index artifacts, keyed by a hash of the
+embedding model and the chunk text, so an unchanged chunk keeps its vector
+even when it moves or is renumbered. Persisting new embeddings appends just
+those records instead of rewriting the whole cache.
+
+Each record is ``magic | payload length | crc32 | key (20 bytes) | float32
+vector``. On open, a torn or corrupt record at the end of the active segment
+(a crash mid-append) is truncated away; everything before it is kept.
+Appends are flushed at once but fsynced in batches
+(``EMBEDDING_LOG_FSYNC_RECORDS`` records or ``EMBEDDING_LOG_FSYNC_SECONDS``),
+so a crash can only lose the last unsynced records, which are re-embedded on
+the next load. When superseded or orphaned records make up more than
+``EMBEDDING_LOG_COMPACT_RATIO`` of the log, a background thread rewrites the
+live records into a fresh segment and removes the old ones. Only records
+this process read in its last :meth:`EmbeddingLog.load` can be judged dead;
+anything appended after it (by this or another worker, possibly for a newer
+corpus) is carried into the compacted segment as is.
+
+Writers and compaction on a host are serialised with a lock file.
+"""
+
+import os
+import time
+import zlib
+import struct
+import hashlib
+import logging
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from .file_lock import exclusive
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"EMB1"
+HEADER = struct.Struct("<4sII")
+KEY_BYTES = 20
+SEGMENT_PREFIX = "segment-"
+SEGMENT_SUFFIX = ".log"
+
+
+def chunk_key(embedding_model: str, text: str) -> bytes:
+    """Record key of ``text`` embedded with ``embedding_model``."""
+    return hashlib.sha1(f"{embedding_model}\0{text}".encode("utf-8")).digest()
+
+
+def _segment_name(number: int) -> str:
+    return f"{SEGMENT_PREFIX}{number:06d}{SEGMENT_SUFFIX}"
+
+
+def _segment_number(path: Path) -> Optional[int]:
+    name = path.name
+    if not (name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX)):
+        return None
+    number = name[len(SEGMENT_PREFIX) : -len(SEGMENT_SUFFIX)]
+    return int(number) if number.isdigit() else None
+
+
+def _encode(key: bytes, vector) -> bytes:
+    payload = key + np.asarray(vector, dtype=np.float32).tobytes()
+    return HEADER.pack(MAGIC, len(payload), zlib.crc32(payload)) + payload
+
+
+def _decode(data: bytes) -> Tuple[List[Tuple[bytes, np.ndarray]], int]:
+    """Records in ``data`` and the offset just past the last valid one."""
+    records, offset = [], 0
+    while offset + HEADER.size <= len(data):
+        magic, length, crc = HEADER.unpack_from(data, offset)
+        start, end = offset + HEADER.size, offset + HEADER.size + length
+        if magic != MAGIC or length < KEY_BYTES or end > len(data):
+            break
+        payload = data[start:end]
+        if zlib.crc32(payload) != crc:
+            break
+        records.append(
+            (bytes(payload[:KEY_BYTES]), np.frombuffer(payload[KEY_BYTES:], dtype=np.float32))
+        )
+        offset = end
+    return records, offset
+
+
+class EmbeddingLog:
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+        self.segment_bytes = int(
+            float(os.getenv("EMBEDDING_LOG_SEGMENT_MB", "64")) * 1024 * 1024
+        )
+        self.fsync_records = int(os.getenv("EMBEDDING_LOG_FSYNC_RECORDS", "256"))
+        self.fsync_seconds = float(os.getenv("EMBEDDING_LOG_FSYNC_SECONDS", "1"))
+        self.compact_ratio = float(os.getenv("EMBEDDING_LOG_COMPACT_RATIO", "0.5"))
+        self._handle = None
+        self._unsynced = 0
+        self._synced_at = time.monotonic()
+        self._records = 0
+        # Valid length of each segment at the last load: the records that
+        # live_keys passed to compact() can speak for
+        self._snapshot: Dict[int, int] = {}
+        self._compacting: Optional[threading.Thread] = None
+
+    # --- locking and segments ----------------------------------------------
+
+    @contextmanager
+    def _locked(self):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with exclusive(self.directory / ".lock"):
+            yield
+
+    def _segments(self) -> List[Path]:
+        if not self.directory.exists():
+            return []
+        segments = {}
+        for path in self.directory.iterdir():
+            number = _segment_number(path)
+            if number is not None:
+                segments[number] = path
+        return [segments[number] for number in sorted(segments)]
+
+    def key(self, chunk: Dict, embedding_model: str) -> bytes:
+        return chunk_key(embedding_model, chunk["text"])
+
+    # --- reading -------------------------------------------------------------
+
+    def load(self, chunks=None, embedding_model: str = None) -> Dict[bytes, np.ndarray]:
+        """Latest vector per key, repairing a torn tail left by a crash."""
+        vectors: Dict[bytes, np.ndarray] = {}
+        with self._locked():
+            segments = self._segments()
+            self._records = 0
+            self._snapshot = {}
+            for position, path in enumerate(segments):
+                data = path.read_bytes()
+                records, valid = _decode(data)
+                if valid < len(data):
+                    if position == len(segments) - 1:
+                        logger.warning(
+                            "truncating %d bytes of torn records from %s",
+                            len(data) - valid,
+                            path.name,
+                        )
+                        with open(path, "r+b") as handle:
+                            handle.truncate(valid)
+                            os.fsync(handle.fileno())
+                    else:
+                        logger.warning("ignoring corrupt records at %d in %s", valid, path.name)
+                self._records += len(records)
+                self._snapshot[_segment_number(path)] = valid
+                vectors.update(records)
+        return vectors
+
+    # --- writing -------------------------------------------------------------
+
+    def append(
+        self, records: Iterable[Tuple[bytes, List[float]]], embedding_model: str = None
+    ):
+        """Append ``(key, vector)`` records; fsynced once the batch threshold is reached."""
+        encoded = [_encode(key, vector) for key, vector in records if vector is not None]
+        if not encoded:
+            return
+        with self._locked():
+            handle = self._active_handle()
+            handle.write(b"".join(encoded))
+            handle.flush()
+            self._records += len(encoded)
+            self._unsynced += len(encoded)
+            if (
+                self._unsynced >= self.fsync_records
+                or time.monotonic() - self._synced_at >= self.fsync_seconds
+            ):
+                self._sync()
+
+    def _active_handle(self):
+        # Reuse the open segment unless it is full or was compacted away
+        if (
+            self._handle is not None
+            and os.fstat(self._handle.fileno()).st_nlink
+            and self._handle.tell() < self.segment_bytes
+        ):
+            return self._handle
+        self._sync()
+        if self._handle is not None:
+            self._handle.close()
+        segments = self._segments()
+        if segments and segments[-1].stat().st_size < self.segment_bytes:
+            path = segments[-1]
+        else:
+            number = _segment_number(segments[-1]) + 1 if segments else 1
+            path = self.directory / _segment_name(number)
+        self._handle = open(path, "ab")
+        return self._handle
+
+    def _sync(self):
+        if self._handle is not None and self._unsynced:
+            os.fsync(self._handle.fileno())
+        self._unsynced = 0
+        self._synced_at = time.monotonic()
+
+    def close(self):
+        """Fsync pending records and release the active segment."""
+        with self._locked():
+            self._sync()
+            if self._handle is not None:
+                self._handle.close()
+                self._handle = None
+
+    # --- compaction ----------------------------------------------------------
+
+    def needs_compaction(self, live_keys: Iterable[bytes]) -> bool:
+        live = len(set(live_keys))
+        return self._records > 0 and (self._records - live) / self._records > self.compact_ratio
+
+    def compact(self, live_keys: Iterable[bytes]) -> int:
+        """
+        Rewrite the latest record of each live key into a new segment and drop
+        the older segments. Returns the number of records kept.
+
+        Records past the last :meth:`load` are kept whatever their key: they
+        may belong to another worker's newer corpus.
+        """
+        live_keys = set(live_keys)
+        with self._locked():
+            if self._handle is not None:
+                self._sync()
+                self._handle.close()
+                self._handle = None
+            segments = self._segments()
+            if not segments:
+                return 0
+            latest: Dict[bytes, np.ndarray] = {}
+            for path in segments:
+                data = path.read_bytes()
+                seen = self._snapshot.get(_segment_number(path), 0)
+                records, _valid = _decode(data[:seen])
+                latest.update((key, vector) for key, vector in records if key in live_keys)
+                records, _valid = _decode(data[seen:])
+                latest.update(records)
+
+            number = _segment_number(segments[-1]) + 1
+            target = self.directory / _segment_name(number)
+            staging = self.directory / f".{target.name}.tmp"
+            with open(staging, "wb") as handle:
+                handle.write(b"".join(_encode(key, vector) for key, vector in latest.items()))
+                handle.flush()
+                os.fsync(handle.fileno())
+            os.replace(staging, target)
+            # The compacted segment supersedes everything before it; a crash
+            # before these unlinks leaves duplicates, never lost vectors
+            for path in segments:
+                path.unlink(missing_ok=True)
+            self._records = len(latest)
+            self._snapshot = {number: target.stat().st_size}
+            return len(latest)
+
+    def maintain(self, live_keys: Iterable[bytes]):
+        """Compact in the background once enough of the log is dead."""
+        live_keys = set(live_keys)
+        if self.needs_compaction(live_keys):
+            self.compact_in_background(live_keys)
+
+    def compact_in_background(self, live_keys: Iterable[bytes]):
+        """Start :meth:`compact` in a thread unless one is already running."""
+        if self._compacting is not None and self._compacting.is_alive():
+            return
+        live_keys = set(live_keys)
+
+        def run():
+            try:
+                kept = self.compact(live_keys)
+                logger.info("compacted embedding log", extra={"records": kept})
+            except Exception:
+                logger.exception("embedding log compaction failed")
+
+        self._compacting = threading.Thread(
+            target=run, name="embedding-log-compaction", daemon=True
+        )
+        self._compacting.start()
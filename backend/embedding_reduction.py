@@ -0,0 +1,200 @@
+"""
+Reduced-dimension storage for knowledge-base embeddings.
+
+With ``EMBEDDING_REDUCTION`` set, the in-memory index keeps each chunk vector at
+``EMBEDDING_REDUCED_DIM`` dimensions instead of the provider's full size:
+
+* ``truncate`` keeps the leading dimensions (Matryoshka-style; valid for models
+  trained that way, such as Gemini's text-embedding-004)
+* ``pca`` projects onto the top principal components fitted over the corpus
+
+Queries are projected the same way. The full-size vectors are written once to
+a sidecar ``.npy`` next to the embeddings cache and memory-mapped, so an
+optional re-rank (``EMBEDDING_RERANK_CANDIDATES``) can rescore the best reduced
+candidates at full dimension without holding them in RAM.
+"""
+
+import os
+from pathlib import Path
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+METHODS = ("none", "truncate", "pca")
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class EmbeddingReduction:
+    def __init__(
+        self,
+        method: str,
+        dim: int,
+        mean: np.ndarray = None,
+        components: np.ndarray = None,
+        full_vectors: np.ndarray = None,
+        rerank_candidates: int = 0,
+    ):
+        self.method = method
+        self.dim = dim
+        self.mean = mean
+        self.components = components  # (dim, full_dim) for pca
+        self.full_vectors = full_vectors  # row-normalised, possibly memory-mapped
+        self.rerank_candidates = rerank_candidates
+
+    @classmethod
+    def fit(cls, method: str, dim: int, matrix: np.ndarray, rerank_candidates: int = 0):
+        """Fit a reduction of ``matrix`` (one full-size embedding per row)."""
+        if method not in METHODS[1:]:
+            raise ValueError(f"Unknown embedding reduction '{method}'")
+        matrix = np.asarray(matrix, dtype=np.float32)
+        dim = min(dim, matrix.shape[1])
+        mean = components = None
+        if method == "pca":
+            mean = matrix.mean(axis=0)
+            centered = matrix - mean
+            # Eigenvectors of the d x d covariance: cheap for any corpus size
+            eigenvalues, eigenvectors = np.linalg.eigh(centered.T @ centered)
+            top = np.argsort(eigenvalues)[::-1][:dim]
+            components = np.ascontiguousarray(eigenvectors[:, top].T, dtype=np.float32)
+        return cls(method, dim, mean, components, _normalize(matrix), rerank_candidates)
+
+    def project(self, vectors) -> np.ndarray:
+        """Reduce full-size vectors (rows) to unit-length ``dim``-size vectors."""
+        vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+        if self.method == "truncate":
+            reduced = vectors[:, : self.dim]
+        else:
+            reduced = (vectors - self.mean) @ self.components.T
+        return _normalize(reduced)
+
+    @property
+    def can_rerank(self) -> bool:
+        return self.rerank_candidates > 0 and self.full_vectors is not None
+
+    def full_scores(self, query_embedding, rows: Sequence[int]) -> np.ndarray:
+        """Full-dimension cosine similarity of the query to the given index rows."""
+        (query,) = _normalize(np.atleast_2d(np.asarray(query_embedding, dtype=np.float32)))
+        rows = np.asarray(rows, dtype=np.int64)
+        if self.full_vectors is None or not len(rows):
+            return np.zeros(len(rows), dtype=np.float32)
+        return np.asarray(self.full_vectors[rows]) @ query
+
+    def save(self, path: Path, content_hash: str):
+        """
+        Persist the fitted projection and the full vectors (``<path>.full.npy``).
+
+        Both files are written beside their target and renamed over it: other
+        processes may have the previous full vectors memory-mapped, and
+        truncating a mapped file under them would crash their reads.
+        """
+        path = Path(path)
+
+        def write_projection(f):
+            np.savez(
+                f,
+                content_hash=np.array(content_hash),
+                method=np.array(self.method),
+                dim=np.array(self.dim),
+                mean=self.mean if self.mean is not None else np.zeros(0, np.float32),
+                components=self.components
+                if self.components is not None
+                else np.zeros((0, 0), np.float32),
+            )
+
+        _save_replacing(_full_path(path), lambda f: np.save(f, self.full_vectors))
+        _save_replacing(path, write_projection)
+
+    @classmethod
+    def load(
+        cls, path: Path, content_hash: str, method: str, dim: int, rerank_candidates: int = 0
+    ) -> Optional["EmbeddingReduction"]:
+        """The saved reduction if it matches this corpus and configuration."""
+        path = Path(path)
+        try:
+            with np.load(path) as saved:
+                if (
+                    str(saved["content_hash"]) != content_hash
+                    or str(saved["method"]) != method
+                    or int(saved["dim"]) != dim
+                ):
+                    return None
+                mean = saved["mean"] if saved["mean"].size else None
+                components = saved["components"] if saved["components"].size else None
+            full_vectors = np.load(_full_path(path), mmap_mode="r")
+        except (OSError, KeyError, ValueError):
+            return None
+        return cls(method, dim, mean, components, full_vectors, rerank_candidates)
+
+
+def _full_path(path: Path) -> Path:
+    return Path(path).with_suffix(".full.npy")
+
+
+def _save_replacing(path: Path, write):
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    try:
+        with open(tmp, "wb") as f:
+            write(f)
+        os.replace(tmp, path)
+    finally:
+        tmp.unlink(missing_ok=True)
+
+
+def reduction_settings():
+    """``(method, dim, rerank_candidates)`` from the environment."""
+    method = os.getenv("EMBEDDING_REDUCTION", "none").strip().lower() or "none"
+    if method not in METHODS:
+        raise ValueError(f"EMBEDDING_REDUCTION must be one of {', '.join(METHODS)}")
+    return (
+        method,
+        int(os.getenv("EMBEDDING_REDUCED_DIM", "384")),
+        int(os.getenv("EMBEDDING_RERANK_CANDIDATES", "50")),
+    )
+
+
+def reduce_chunks(
+    chunks: List[dict], cache_path: Path, content_hash: str
+) -> Optional[EmbeddingReduction]:
+    """
+    Replace each embedded chunk's vector with its reduced form, in place.
+
+    Embedded chunks get an ``embedding_row`` into the full-size vectors. The
+    fitted reduction is reused from ``cache_path`` while the corpus and settings
+    are unchanged. Returns ``None`` (chunks untouched) when reduction is off.
+    """
+    method, dim, rerank_candidates = reduction_settings()
+    embedded = [chunk for chunk in chunks if chunk.get("embedding")]
+    if method == "none" or not embedded:
+        return None
+
+    full_dim = len(embedded[0]["embedding"])
+    dim = min(dim, full_dim)
+    reduction = EmbeddingReduction.load(
+        cache_path, content_hash, method, dim, rerank_candidates
+    )
+    if reduction is None or len(reduction.full_vectors) != len(embedded):
+        reduction = EmbeddingReduction.fit(
+            method, dim, [chunk["embedding"] for chunk in embedded], rerank_candidates
+        )
+        try:
+            reduction.save(cache_path, content_hash)
+            # Reopen so the full vectors are memory-mapped rather than held in RAM
+            reduction = (
+                EmbeddingReduction.load(
+                    cache_path, content_hash, method, dim, rerank_candidates
+                )
+                or reduction
+            )
+        except OSError as e:
+            print(f"Warning: Failed to save embedding reduction: {e}")
+
+    reduced = reduction.project([chunk["embedding"] for chunk in embedded])
+    for row, (chunk, vector) in enumerate(zip(embedded, reduced)):
+        chunk["embedding"] = vector.tolist()
+        chunk["embedding_row"] = row
+    return reduction
@@ -0,0 +1,475 @@
+"""
+In-process knowledge-base index shared by all requests of a worker.
+
+``load_or_generate_embeddings`` re-reads every markdown file and the embedding
+log on each call. The pipeline instead asks :func:`get_index`, which keeps the
+index loaded and notices corpus changes (file paths, sizes and mtimes, checked
+at most every ``INDEX_CHECK_INTERVAL_SECONDS``) or a previous load that left
+chunks without an embedding (e.g. the provider was unavailable).
+
+The loaded index is a struct of arrays rather than a list of chunk dicts with
+Python float lists. Each index generation is an immutable directory under
+``.index/`` next to the embeddings cache, holding:
+
+* ``matrix.npy``      - row-normalised float32 vectors (reduced if configured)
+* ``chunks.jsonl``    - one JSON object of chunk metadata per row
+* ``offsets.npy``     - byte offset of each row in ``chunks.jsonl``
+* ``projection.npz``  - the embedding reduction, if any (``.full.npy`` beside it)
+* ``meta.json``       - version, corpus signature and chunk counts
+
+All of it is memory-mapped, so every worker on the host shares one physical
+copy through the page cache, and chunk dicts are only materialised for the
+rows a query returns. Nothing a request touches is a long-lived Python object,
+so forked workers do not dirty shared pages through reference counting.
+
+Generations are double-buffered: a rebuild writes a complete new generation
+in a staging directory, renames it into place and then atomically replaces
+the ``CURRENT`` pointer file. In-process, the new :class:`KnowledgeIndex` is
+swapped in with a single reference assignment. Queries that already hold the
+previous index keep using it (its mapped files stay valid even after the
+directory is pruned), and stale indexes are rebuilt in the background while
+the old generation keeps serving, so a reindex never blocks or corrupts a
+query. Other workers switch to a generation published for their corpus on
+their next freshness check, without rebuilding it.
+"""
+
+import os
+import json
+import time
+import shutil
+import hashlib
+import logging
+import tempfile
+import threading
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from .file_lock import exclusive
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RESOURCES_DIR = Path(__file__).parent / "resources"
+
+# Chunk fields kept in the metadata column (the vectors live in the matrix)
+CHUNK_FIELDS = (
+    "text", "source_file", "source_path", "chunk_id", "header", "file_mtime", "duplicates"
+)
+
+CURRENT_POINTER = "CURRENT"
+
+
+class KnowledgeIndex:
+    """One mapped, read-only index generation."""
+
+    def __init__(self, base_dir: str, directory: Path):
+        from .embedding_reduction import EmbeddingReduction, reduction_settings
+
+        self.base_dir = base_dir
+        self.directory = Path(directory)
+        meta = json.loads((self.directory / "meta.json").read_text(encoding="utf-8"))
+        self.version = meta["version"]
+        self.signature = meta["signature"]
+        self.total_chunks = meta["total_chunks"]
+        self.matrix = np.load(self.directory / "matrix.npy", mmap_mode="r")
+        self.offsets = np.load(self.directory / "offsets.npy", mmap_mode="r")
+        blob_path = self.directory / "chunks.jsonl"
+        # np.memmap refuses empty files
+        self._blob = (
+            np.memmap(blob_path, dtype=np.uint8, mode="r")
+            if blob_path.stat().st_size
+            else np.zeros(0, dtype=np.uint8)
+        )
+        self.reduction = None
+        if meta.get("reduction"):
+            _method, _dim, rerank_candidates = reduction_settings()
+            self.reduction = EmbeddingReduction.load(
+                self.directory / "projection.npz",
+                self.signature,
+                meta["reduction"]["method"],
+                meta["reduction"]["dim"],
+                rerank_candidates,
+            )
+            if self.reduction is None:
+                raise ValueError(f"index generation {self.directory.name} has no projection")
+        self.complete = len(self) == self.total_chunks
+        self._pinned_text: Optional[str] = None
+        self._pinned_lock = threading.Lock()
+        self.loaded_at = time.time()
+        self.checked_at = time.monotonic()
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def chunk(self, row: int) -> Dict:
+        """A fresh dict with the metadata of ``row``."""
+        start, end = int(self.offsets[row]), int(self.offsets[row + 1])
+        chunk = json.loads(self._blob[start:end].tobytes())
+        chunk["embedding_row"] = row
+        return chunk
+
+    @property
+    def chunks(self) -> List[Dict]:
+        """Every chunk, materialised (for tools; requests should use :meth:`search`)."""
+        return [self.chunk(row) for row in range(len(self))]
+
+    def search(self, query_embeddings: List[Optional[List[float]]], top_k: int) -> List[List[Dict]]:
+        """Top ``top_k`` chunks (with ``similarity``) per full-size query embedding."""
+        from .rag_pipeline_llm_driven import rank_rows
+
+        results: List[List[Dict]] = [[] for _ in query_embeddings]
+        full_dim = (
+            self.reduction.full_vectors.shape[1]
+            if self.reduction is not None
+            else self.matrix.shape[1] if self.matrix.ndim == 2 else 0
+        )
+        rows = [i for i, e in enumerate(query_embeddings) if e and len(e) == full_dim]
+        if not rows or not len(self):
+            return results
+
+        query_matrix = np.asarray([query_embeddings[i] for i in rows], dtype=np.float32)
+        ranked = rank_rows(
+            query_matrix, self.matrix, top_k, self.reduction, np.arange(len(self))
+        )
+        for query_index, query, order in zip(rows, query_matrix, ranked):
+            norm = float(np.linalg.norm(query)) or 1.0
+            scores = self._scores(query / norm, order)
+            for row, score in zip(order, scores):
+                chunk = self.chunk(int(row))
+                chunk["similarity"] = float(score)
+                results[query_index].append(chunk)
+        return results
+
+    def pinned_text(self) -> str:
+        """The whole corpus as one prompt section, read once per generation."""
+        from .rag_pipeline_llm_driven import load_resources
+
+        with self._pinned_lock:
+            if self._pinned_text is None:
+                self._pinned_text = load_resources(self.base_dir)
+            return self._pinned_text
+
+    def _scores(self, query: np.ndarray, rows: np.ndarray) -> np.ndarray:
+        if self.reduction is not None:
+            if self.reduction.can_rerank:
+                return self.reduction.full_scores(query, rows)
+            query = self.reduction.project(query)[0]
+        return np.asarray(self.matrix[rows]) @ query
+
+    def stats(self) -> Dict:
+        return {
+            "chunks": self.total_chunks,
+            "embedded": len(self),
+            "dimensions": int(self.matrix.shape[1]) if self.matrix.ndim == 2 else 0,
+            "reduction": self.reduction.method if self.reduction is not None else None,
+            "generation": self.directory.name,
+            "version": self.version,
+            "matrix_bytes": int(self.matrix.nbytes),
+            "loaded_at": self.loaded_at,
+        }
+
+
+_indexes: Dict[str, KnowledgeIndex] = {}
+_lock = threading.Lock()
+_refreshing: Dict[str, threading.Thread] = {}
+# Serialises the first load of each corpus in this process
+_first_loads: Dict[str, threading.Lock] = {}
+
+
+def corpus_signature(base_dir) -> str:
+    """Cheap fingerprint of the corpus and of the settings that shape the index."""
+    from .embedding_reduction import reduction_settings
+    from .near_duplicates import settings as near_duplicate_settings
+    from .providers import get_provider
+
+    base = Path(base_dir)
+    digest = hashlib.sha1()
+    digest.update(
+        repr(
+            (get_provider().embedding_model, reduction_settings(), near_duplicate_settings())
+        ).encode()
+    )
+    for path in sorted(base.rglob("*.md")):
+        try:
+            stat = path.stat()
+        except OSError:
+            continue
+        digest.update(f"{path.relative_to(base)}\0{stat.st_mtime_ns}\0{stat.st_size}\n".encode())
+    return digest.hexdigest()
+
+
+def _check_interval() -> float:
+    return float(os.getenv("INDEX_CHECK_INTERVAL_SECONDS", "2"))
+
+
+def index_root(base_dir) -> Path:
+    from .rag_pipeline_llm_driven import get_embeddings_cache_path
+
+    return get_embeddings_cache_path(str(base_dir)).parent / ".index"
+
+
+def atomic_write_bytes(path: Path, data: bytes):
+    """Replace ``path`` so readers see either the old or the new content, never a mix."""
+    path = Path(path)
+    fd, tmp = tempfile.mkstemp(prefix=f".{path.name}-", dir=path.parent)
+    try:
+        with os.fdopen(fd, "wb") as handle:
+            handle.write(data)
+            handle.flush()
+            os.fsync(handle.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+
+
+def read_current(root: Path) -> Optional[Path]:
+    """The generation directory ``CURRENT`` points at, if it exists."""
+    try:
+        name = (Path(root) / CURRENT_POINTER).read_text(encoding="utf-8").strip()
+    except OSError:
+        return None
+    directory = Path(root) / name
+    return directory if name and (directory / "meta.json").exists() else None
+
+
+def publish(root: Path, directory: Path):
+    """Atomically point ``CURRENT`` at ``directory``."""
+    atomic_write_bytes(Path(root) / CURRENT_POINTER, Path(directory).name.encode("utf-8"))
+
+
+def _generations(root: Path) -> Dict[int, Path]:
+    """Generation directories (``v<version>-<digest>``) under ``root`` by version."""
+    generations = {}
+    for path in root.iterdir():
+        version = path.name[1:].split("-", 1)[0]
+        if path.is_dir() and path.name.startswith("v") and version.isdigit():
+            generations[int(version)] = path
+    return generations
+
+
+def _next_version(root: Path) -> int:
+    """One past the newest generation on disk, published or not."""
+    return max(_generations(root), default=0) + 1
+
+
+def write_generation(
+    root: Path, signature: str, chunks: List[Dict], reduction=None
+) -> Path:
+    """
+    Write the embedded ``chunks`` as a new generation directory under ``root``.
+
+    Everything is written to a staging directory and renamed into place, so a
+    generation is either complete or absent. ``CURRENT`` is not touched; call
+    :func:`publish` to make it the live generation.
+    """
+    root.mkdir(parents=True, exist_ok=True)
+    version = _next_version(root)
+    embedded = [chunk for chunk in chunks if chunk.get("embedding")]
+    digest = hashlib.sha1(signature.encode())
+    for chunk in embedded:
+        digest.update(chunk["chunk_id"].encode() + b"\0")
+    target = root / f"v{version:06d}-{digest.hexdigest()[:12]}"
+
+    staging = Path(tempfile.mkdtemp(prefix=f".{target.name}-", dir=root))
+    try:
+        if embedded:
+            matrix = np.asarray([chunk["embedding"] for chunk in embedded], dtype=np.float32)
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            matrix /= norms
+        else:
+            matrix = np.zeros((0, 0), dtype=np.float32)
+        np.save(staging / "matrix.npy", matrix)
+
+        offsets = [0]
+        with open(staging / "chunks.jsonl", "wb") as blob:
+            for chunk in embedded:
+                line = json.dumps({k: chunk.get(k) for k in CHUNK_FIELDS}).encode("utf-8") + b"\n"
+                blob.write(line)
+                offsets.append(offsets[-1] + len(line))
+        np.save(staging / "offsets.npy", np.asarray(offsets, dtype=np.int64))
+
+        meta = {
+            "version": version,
+            "signature": signature,
+            "total_chunks": len(chunks),
+            "embedded_chunks": len(embedded),
+            "created_at": time.time(),
+            "reduction": None,
+        }
+        if reduction is not None:
+            reduction.save(staging / "projection.npz", signature)
+            meta["reduction"] = {"method": reduction.method, "dim": reduction.dim}
+        (staging / "meta.json").write_text(json.dumps(meta), encoding="utf-8")
+        os.rename(staging, target)
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+    return target
+
+
+def _prune(root: Path, keep: Path):
+    """Remove older generations; mapped files stay readable until unmapped."""
+    keep_count = int(os.getenv("INDEX_KEEP_GENERATIONS", "3"))
+    generations = _generations(root)
+    for version in sorted(generations, reverse=True)[keep_count:]:
+        old = generations[version]
+        if old != keep:
+            shutil.rmtree(old, ignore_errors=True)
+
+
+def build_index(
+    api_key: str,
+    base_dir,
+    force_refresh: bool = False,
+    rebuild: bool = False,
+    reembed: Optional[Callable[[Dict], bool]] = None,
+    progress: Optional[Callable[[int, int, int], None]] = None,
+) -> KnowledgeIndex:
+    """
+    Map the live generation if it matches the corpus, else build and publish a
+    new one. Builders on the host are serialised with a lock file, so a rebuild
+    another worker just published is reused instead of repeated.
+
+    ``rebuild`` writes a new generation even when the live one is current;
+    ``force_refresh`` also re-embeds every chunk and ``reembed`` the chunks it
+    selects. ``progress`` is passed to ``load_or_generate_embeddings``.
+    """
+    from .rag_pipeline_llm_driven import get_embedding_reduction, load_or_generate_embeddings
+
+    key = str(base_dir)
+    root = index_root(key)
+    root.mkdir(parents=True, exist_ok=True)
+    with exclusive(root / ".build.lock"):
+        signature = corpus_signature(key)
+        current = read_current(root)
+        if current is not None and not (force_refresh or rebuild or reembed):
+            index = KnowledgeIndex(key, current)
+            if index.signature == signature and index.complete:
+                return index
+
+        chunks = load_or_generate_embeddings(
+            key, api_key, force_refresh=force_refresh, reembed=reembed, progress=progress
+        )
+        directory = write_generation(
+            root, signature, chunks, get_embedding_reduction(key)
+        )
+        index = KnowledgeIndex(key, directory)
+        publish(root, directory)
+        _prune(root, directory)
+        logger.info(
+            "published knowledge index generation",
+            extra={"generation": directory.name, "chunks": len(index)},
+        )
+        return index
+
+
+def current_index(base_dir=None) -> Optional[KnowledgeIndex]:
+    """The loaded index for ``base_dir`` without checking freshness, if any."""
+    return _indexes.get(str(base_dir or DEFAULT_RESOURCES_DIR))
+
+
+def refresh_index(api_key: str, base_dir=None, **build_options) -> KnowledgeIndex:
+    """
+    Build or map the newest generation and swap it in for new requests.
+    ``build_options`` are those of :func:`build_index`.
+    """
+    key = str(base_dir or DEFAULT_RESOURCES_DIR)
+    index = build_index(api_key, key, **build_options)
+    return _swap(key, index)
+
+
+def _swap(key: str, index: KnowledgeIndex) -> KnowledgeIndex:
+    with _lock:
+        previous = _indexes.get(key)
+        # Never swap an older generation over a newer one
+        if previous is None or index.version >= previous.version:
+            _indexes[key] = index
+        return _indexes[key]
+
+
+def _follow_current(key: str, index: KnowledgeIndex, signature: str) -> KnowledgeIndex:
+    """Map a newer generation another process published for this corpus, if any."""
+    current = read_current(index_root(key))
+    if current is None or current.name == index.directory.name:
+        return index
+    try:
+        published = KnowledgeIndex(key, current)
+    except (OSError, ValueError, KeyError):
+        return index
+    if published.signature != signature or published.version <= index.version:
+        return index
+    published.checked_at = index.checked_at
+    return _swap(key, published)
+
+
+def _refresh_in_background(api_key: str, key: str):
+    def run():
+        try:
+            refresh_index(api_key, key)
+        except Exception:
+            logger.exception("background index refresh failed")
+        finally:
+            with _lock:
+                _refreshing.pop(key, None)
+
+    with _lock:
+        if key in _refreshing:
+            return
+        thread = _refreshing[key] = threading.Thread(
+            target=run, name="index-refresh", daemon=True
+        )
+    thread.start()
+
+
+def get_index(api_key: str, base_dir=None, force_refresh: bool = False) -> KnowledgeIndex:
+    """
+    Return the index for ``base_dir``. A stale index keeps serving while a
+    background thread builds its replacement; only the very first load (or
+    ``force_refresh``) happens in the caller.
+    """
+    key = str(base_dir or DEFAULT_RESOURCES_DIR)
+    index = _indexes.get(key)
+    if index is not None and not force_refresh:
+        if index.complete and time.monotonic() - index.checked_at < _check_interval():
+            return index
+        index.checked_at = time.monotonic()
+        signature = corpus_signature(key)
+        index = _follow_current(key, index, signature)
+        if not index.complete or index.signature != signature:
+            _refresh_in_background(api_key, key)
+        return index
+
+    if force_refresh:
+        return refresh_index(api_key, key, force_refresh=True)
+    # Build outside _lock so readiness, stats and other corpora are not held up
+    with _lock:
+        first_load = _first_loads.setdefault(key, threading.Lock())
+    with first_load:
+        # Another thread may have finished the first load while this one waited
+        index = _indexes.get(key)
+        if index is None:
+            index = _swap(key, build_index(api_key, key))
+        return index
+
+
+def invalidate(base_dir=None):
+    """Forget the loaded index so the next request maps the live generation again."""
+    with _lock:
+        _indexes.pop(str(base_dir or DEFAULT_RESOURCES_DIR), None)
+
+
+def preload_for_fork(api_key: str, base_dir=None) -> KnowledgeIndex:
+    """
+    Load the index in a pre-fork master (e.g. ``gunicorn --preload``) so the
+    workers inherit it, then move every live object to the permanent GC
+    generation: collections in the workers then never write to the inherited
+    objects' GC headers, which would copy their pages.
+    """
+    import gc
+
+    index = get_index(api_key, base_dir)
+    gc.collect()
+    gc.freeze()
+    return index
@@ -3,6 +3,8 @@ import json
 import sys
 from datetime import datetime
 
+from .timings import format_timings
+
 
 class JsonFormatter(logging.Formatter):
     def format(self, record):
@@ -21,6 +23,7 @@ class JsonFormatter(logging.Formatter):
             "ip",
             "user_id",
             "request_id",
+            "stages",
         ]:
             if hasattr(record, key):
                 data[key] = getattr(record, key)
@@ -44,6 +47,9 @@ class KeyValueFormatter(logging.Formatter):
         for k in self.missing_keys:
             if not hasattr(record, k):
                 setattr(record, k, "-")
+        stages = getattr(record, "stages", None)
+        if not isinstance(stages, str):
+            record.stages = format_timings(stages)
         return super().format(record)
 
 
@@ -63,7 +69,8 @@ def configure_logging(app):
             fmt=(
                 "%(asctime)s level=%(levelname)-7s logger=%(name)-15s "
                 "msg='%(message)s' method=%(method)s path=%(path)s status=%(status)s "
-                "duration_ms=%(duration_ms)s ip=%(ip)s user_id=%(user_id)s request_id=%(request_id)s"
+                "duration_ms=%(duration_ms)s ip=%(ip)s user_id=%(user_id)s request_id=%(request_id)s "
+                "stages=%(stages)s"
             ),
             datefmt="%Y-%m-%dT%H:%M:%S",
         )
@@ -0,0 +1,453 @@
+"""
+Prometheus-compatible metrics.
+
+A small in-process registry of counters, gauges and fixed-bucket histograms,
+rendered at ``/metrics`` in the text exposition format. Under a multi-process
+server (gunicorn) set ``METRICS_MULTIPROC_DIR`` to a directory shared by the
+workers: each process periodically writes its samples to ``<dir>/<pid>.json``
+and a scrape merges every file, so any worker can answer for all of them.
+Scrapes need ``Authorization: Bearer <METRICS_TOKEN>`` or an admin login.
+Counters and histograms of exited workers keep counting towards the totals;
+gauges only include live processes. Nothing here empties the directory: clear
+it before starting the server (workers only ever add their own files).
+"""
+
+import os
+import json
+import time
+import atexit
+import bisect
+import logging
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Iterable[str], values: Iterable) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class _Metric:
+    type = ""
+
+    def __init__(self, registry, name: str, documentation: str, labelnames=()):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values: Dict[Tuple, object] = {}
+
+    def _key(self, labels: Dict) -> Tuple:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def describe(self) -> Dict:
+        return {"type": self.type, "help": self.documentation, "labels": list(self.labelnames)}
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self.registry.lock():
+            self.values[key] = self.values.get(key, 0.0) + amount
+        self.registry.touch()
+
+
+class Gauge(_Metric):
+    type = "gauge"
+
+    def __init__(self, registry, name, documentation, labelnames=(), multiprocess_mode="max"):
+        super().__init__(registry, name, documentation, labelnames)
+        # How live workers' values combine: "max", "sum" or "all" (one series per pid)
+        self.multiprocess_mode = multiprocess_mode
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self.registry.lock():
+            self.values[key] = float(value)
+        self.registry.touch()
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self.registry.lock():
+            self.values[key] = self.values.get(key, 0.0) + amount
+        self.registry.touch()
+
+    def describe(self) -> Dict:
+        return {**super().describe(), "mode": self.multiprocess_mode}
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, registry, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(registry, name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self.registry.lock():
+            # [per-bucket counts..., +Inf count, sum]
+            data = self.values.get(key)
+            if data is None:
+                data = self.values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            data[index] += 1
+            data[-1] += value
+        self.registry.touch()
+
+    def describe(self) -> Dict:
+        return {**super().describe(), "buckets": list(self.buckets)}
+
+
+class MetricsRegistry:
+    def __init__(self, multiproc_dir: Optional[str] = None, flush_interval: float = 1.0):
+        self.metrics: Dict[str, _Metric] = {}
+        self.multiproc_dir = Path(multiproc_dir) if multiproc_dir else None
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._last_flush = 0.0
+
+    def lock(self) -> threading.Lock:
+        self._reset_after_fork()
+        return self._lock
+
+    def _reset_after_fork(self):
+        # A forked worker must not re-report samples inherited from the master
+        if os.getpid() != self._pid:
+            with self._lock:
+                if os.getpid() != self._pid:
+                    self._pid = os.getpid()
+                    self._last_flush = 0.0
+                    for metric in self.metrics.values():
+                        metric.values = {}
+
+    def _register(self, metric: _Metric) -> _Metric:
+        if metric.name in self.metrics:
+            raise ValueError(f"Metric '{metric.name}' is already registered")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()) -> Counter:
+        return self._register(Counter(self, name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=(), multiprocess_mode="max") -> Gauge:
+        return self._register(Gauge(self, name, documentation, labelnames, multiprocess_mode))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(self, name, documentation, labelnames, buckets))
+
+    def snapshot(self) -> Dict:
+        self._reset_after_fork()
+        with self._lock:
+            return {
+                name: {
+                    **metric.describe(),
+                    "samples": [
+                        [list(key), list(value) if isinstance(value, list) else value]
+                        for key, value in metric.values.items()
+                    ],
+                }
+                for name, metric in self.metrics.items()
+            }
+
+    def touch(self):
+        """Write this process's samples to the shared dir at most every flush_interval."""
+        if self.multiproc_dir and time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        if not self.multiproc_dir:
+            return
+        self._last_flush = time.monotonic()
+        try:
+            self.multiproc_dir.mkdir(parents=True, exist_ok=True)
+            path = self.multiproc_dir / f"{os.getpid()}.json"
+            tmp = path.with_name(f"{os.getpid()}.{threading.get_ident()}.tmp")
+            tmp.write_text(json.dumps({"pid": os.getpid(), "metrics": self.snapshot()}))
+            os.replace(tmp, path)
+        except OSError:
+            logger.exception("failed to flush metrics to %s", self.multiproc_dir)
+
+    def _process_snapshots(self) -> List[Tuple[int, Dict]]:
+        if not self.multiproc_dir:
+            return [(os.getpid(), self.snapshot())]
+        self.flush()
+        snapshots = []
+        for path in sorted(self.multiproc_dir.glob("*.json")):
+            try:
+                data = json.loads(path.read_text())
+                snapshots.append((int(data["pid"]), data["metrics"]))
+            except (OSError, ValueError, KeyError):
+                continue  # Half-written or foreign file
+        return snapshots
+
+    def collect(self) -> Dict[str, Dict]:
+        """Merge every process's samples into ``{name: {..., "samples": {key: value}}}``."""
+        merged: Dict[str, Dict] = {}
+        for pid, metrics in self._process_snapshots():
+            alive = pid == os.getpid() or _pid_alive(pid)
+            for name, metric in metrics.items():
+                target = merged.setdefault(name, {**metric, "samples": {}})
+                samples = target["samples"]
+                for labels, value in metric["samples"]:
+                    if metric["type"] == "gauge":
+                        if not alive:
+                            continue
+                        mode = metric.get("mode", "max")
+                        if mode == "all":
+                            key = tuple(labels) + (str(pid),)
+                            samples[key] = value
+                        elif mode == "sum":
+                            key = tuple(labels)
+                            samples[key] = samples.get(key, 0.0) + value
+                        else:
+                            key = tuple(labels)
+                            samples[key] = max(samples.get(key, value), value)
+                    elif metric["type"] == "histogram":
+                        key = tuple(labels)
+                        current = samples.get(key)
+                        samples[key] = (
+                            list(value)
+                            if current is None
+                            else [a + b for a, b in zip(current, value)]
+                        )
+                    else:
+                        key = tuple(labels)
+                        samples[key] = samples.get(key, 0.0) + value
+        return merged
+
+    def render(self) -> str:
+        """Text exposition format (version 0.0.4)."""
+        lines = []
+        for name, metric in sorted(self.collect().items()):
+            labelnames = list(metric["labels"])
+            if metric["type"] == "gauge" and metric.get("mode") == "all":
+                labelnames.append("pid")
+            lines.append(f"# HELP {name} {_escape(metric['help'])}")
+            lines.append(f"# TYPE {name} {metric['type']}")
+            for key, value in sorted(metric["samples"].items()):
+                if metric["type"] != "histogram":
+                    lines.append(f"{name}{_format_labels(labelnames, key)} {_format_value(value)}")
+                    continue
+                cumulative = 0
+                bounds = [_format_value(b) for b in metric["buckets"]] + ["+Inf"]
+                for bound, count in zip(bounds, value[:-1]):
+                    cumulative += count
+                    labels = _format_labels(labelnames + ["le"], list(key) + [bound])
+                    lines.append(f"{name}_bucket{labels} {cumulative}")
+                labels = _format_labels(labelnames, key)
+                lines.append(f"{name}_sum{labels} {_format_value(value[-1])}")
+                lines.append(f"{name}_count{labels} {cumulative}")
+        return "\n".join(lines) + "\n"
+
+    def configure(self, multiproc_dir: Optional[str] = None, flush_interval: float = 1.0):
+        self.multiproc_dir = Path(multiproc_dir) if multiproc_dir else None
+        self.flush_interval = flush_interval
+
+    def configure_from_env(self):
+        self.configure(
+            multiproc_dir=os.getenv("METRICS_MULTIPROC_DIR")
+            or os.getenv("PROMETHEUS_MULTIPROC_DIR")
+            or None,
+            flush_interval=float(os.getenv("METRICS_FLUSH_INTERVAL", "1.0")),
+        )
+
+    @classmethod
+    def from_env(cls):
+        registry = cls()
+        registry.configure_from_env()
+        return registry
+
+
+# Configured from the environment in init_app, once .env has been loaded
+REGISTRY = MetricsRegistry()
+# Persist the final counts of a worker that exits between flushes
+atexit.register(REGISTRY.flush)
+
+HTTP_REQUESTS = REGISTRY.counter(
+    "http_requests_total", "HTTP requests served", ("endpoint", "method", "status")
+)
+HTTP_LATENCY = REGISTRY.histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency",
+    ("endpoint", "method", "status"),
+)
+LLM_LATENCY = REGISTRY.histogram(
+    "llm_request_duration_seconds",
+    "Provider call latency (generation and embeddings)",
+    ("provider", "operation", "outcome"),
+)
+LLM_TOKENS = REGISTRY.counter(
+    "llm_tokens_total", "Tokens reported by the provider", ("provider", "kind")
+)
+CACHE_REQUESTS = REGISTRY.counter(
+    "cache_requests_total",
+    "Cache lookups; hit ratio = hit / (hit + miss)",
+    ("cache", "result"),
+)
+INDEX_CHUNKS = REGISTRY.gauge(
+    "rag_index_chunks", "Chunks with an embedding in the loaded index", ("index",)
+)
+INDEX_DIMENSIONS = REGISTRY.gauge(
+    "rag_index_embedding_dimensions", "Embedding dimensionality of the loaded index", ("index",)
+)
+DB_QUERIES = REGISTRY.counter(
+    "db_queries_total", "SQL statements executed", ("statement",)
+)
+DB_QUERY_LATENCY = REGISTRY.histogram(
+    "db_query_duration_seconds",
+    "SQL statement latency",
+    ("statement",),
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0),
+)
+STAGE_LATENCY = REGISTRY.histogram(
+    "chat_stage_duration_seconds",
+    "Chat pipeline time per stage",
+    ("pipeline", "stage"),
+)
+
+
+def track_llm_call(provider: str, operation: str, fn, failed=lambda result: False):
+    """
+    Run a provider call, recording its latency with an ok/error outcome.
+
+    ``failed`` flags results that report an error without raising.
+    """
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        result = fn()
+        outcome = "error" if failed(result) else "ok"
+        return result
+    finally:
+        LLM_LATENCY.observe(
+            time.perf_counter() - started,
+            provider=provider,
+            operation=operation,
+            outcome=outcome,
+        )
+
+
+def record_tokens(provider: str, usage: Optional[Dict]):
+    if not usage:
+        return
+    for kind in ("prompt", "completion", "cached"):
+        tokens = usage.get(f"{kind}_tokens") or 0
+        if tokens:
+            LLM_TOKENS.inc(tokens, provider=provider, kind=kind)
+
+
+def record_cache(cache: str, hits: int = 0, misses: int = 0):
+    if hits:
+        CACHE_REQUESTS.inc(hits, cache=cache, result="hit")
+    if misses:
+        CACHE_REQUESTS.inc(misses, cache=cache, result="miss")
+
+
+_db_instrumented = False
+
+
+def _instrument_db():
+    # Engine-class listeners are process-wide; register them once
+    global _db_instrumented
+    if _db_instrumented:
+        return
+    _db_instrumented = True
+
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+
+    @event.listens_for(Engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("metrics_started", []).append(time.perf_counter())
+
+    @event.listens_for(Engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.get("metrics_started")
+        if not started:
+            return
+        verb = statement.lstrip().split(None, 1)[0].lower() if statement.strip() else "other"
+        if verb not in ("select", "insert", "update", "delete"):
+            verb = "other"
+        DB_QUERIES.inc(statement=verb)
+        DB_QUERY_LATENCY.observe(time.perf_counter() - started.pop(), statement=verb)
+
+    @event.listens_for(Engine, "handle_error")
+    def _error(context):
+        # A failed statement never reaches after_cursor_execute; drop its start
+        # so the next statement on this pooled connection is not mismatched
+        conn = context.connection
+        if conn is None or context.execution_context is None:
+            return
+        started = conn.info.get("metrics_started")
+        if started:
+            started.pop()
+
+
+def init_app(app):
+    """Register ``/metrics`` and per-request HTTP metrics on the app."""
+    REGISTRY.configure_from_env()
+    if os.getenv("METRICS_ENABLED", "true").lower() != "true":
+        return
+
+    from flask import Response, g, request
+
+    _instrument_db()
+    token = os.getenv("METRICS_TOKEN", "").strip()
+
+    @app.after_request
+    def _record_request_metrics(response):
+        started = getattr(g, "start_time", None)
+        # Route template, not the raw path, to keep label cardinality bounded
+        endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+        labels = {
+            "endpoint": endpoint,
+            "method": request.method,
+            "status": str(response.status_code),
+        }
+        HTTP_REQUESTS.inc(**labels)
+        if started is not None:
+            HTTP_LATENCY.observe(time.time() - started, **labels)
+        return response
+
+    def metrics_view():
+        if not (token and request.headers.get("Authorization", "") == f"Bearer {token}"):
+            from .routes import _auth_user, _is_admin
+
+            user = _auth_user()
+            if not user:
+                return {"error": "Unauthorized"}, 401
+            if not _is_admin(user):
+                return {"error": "Forbidden"}, 403
+        return Response(REGISTRY.render(), mimetype=None, content_type=CONTENT_TYPE)
+
+    app.add_url_rule("/metrics", "metrics", metrics_view, methods=["GET"])
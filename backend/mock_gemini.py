@@ -0,0 +1,299 @@
+"""
+Stand-in Gemini API server for load testing.
+
+Implements the ``embedContent``, ``batchEmbedContents``, ``generateContent`` and
+``streamGenerateContent`` endpoints plus ``cachedContents`` (context caching)
+with configurable latency distributions, error rates, a requests-per-minute quota
+(429 + Retry-After), completion token counts and a per-prompt-token cost that
+cached prefixes avoid. Start it with ``flask mock-gemini`` and point the backend at it with
+``GEMINI_API_BASE_URL=http://127.0.0.1:8089/v1beta``.
+"""
+
+import json
+import math
+import time
+import uuid
+import random
+import threading
+from collections import deque
+from typing import Callable, Dict
+
+from flask import Flask, Response, request
+
+from .providers.local import hashing_embedding, templated_answer
+
+
+def parse_latency(spec: str) -> Callable[[], float]:
+    """
+    Build a sampler (seconds) from a latency spec in milliseconds.
+
+    Supported forms: ``fixed:MS`` (or just ``MS``), ``uniform:LO:HI``,
+    ``normal:MEAN:STD``, ``lognormal:MEDIAN:SIGMA`` and ``exp:MEAN``. Long-tailed
+    distributions (lognormal/exp) reproduce the slow outliers that drive p99.
+    """
+    kind, *args = str(spec or "0").split(":")
+    try:
+        if not args:
+            kind, args = "fixed", [kind]
+        values = [float(a) for a in args]
+    except ValueError:
+        raise ValueError(f"Invalid latency spec '{spec}'")
+
+    if kind == "fixed":
+        sampler = lambda: values[0]
+    elif kind == "uniform":
+        sampler = lambda: random.uniform(values[0], values[1])
+    elif kind == "normal":
+        sampler = lambda: random.gauss(values[0], values[1])
+    elif kind == "lognormal":
+        sampler = lambda: random.lognormvariate(math.log(max(values[0], 1e-3)), values[1])
+    elif kind == "exp":
+        sampler = lambda: random.expovariate(1.0 / max(values[0], 1e-3))
+    else:
+        raise ValueError(f"Unknown latency distribution '{kind}'")
+    return lambda: max(0.0, sampler()) / 1000.0
+
+
+class MockGeminiConfig:
+    def __init__(
+        self,
+        embed_latency: str = "fixed:20",
+        generate_latency: str = "lognormal:800:0.5",
+        stream_chunk_latency: str = "fixed:40",
+        error_rate: float = 0.0,
+        rate_limit_rpm: int = 0,
+        completion_tokens: int = 0,
+        embedding_dim: int = 768,
+        prompt_token_latency_ms: float = 0.0,
+        cache_min_tokens: int = 0,
+    ):
+        self.embed_latency = parse_latency(embed_latency)
+        self.generate_latency = parse_latency(generate_latency)
+        self.stream_chunk_latency = parse_latency(stream_chunk_latency)
+        self.error_rate = error_rate
+        self.rate_limit_rpm = rate_limit_rpm
+        self.completion_tokens = completion_tokens
+        self.embedding_dim = embedding_dim
+        # Prefill cost per uncached prompt token, so context caching shows up in TTFT
+        self.prompt_token_latency = prompt_token_latency_ms / 1000.0
+        self.cache_min_tokens = cache_min_tokens
+
+
+class _MockState:
+    """Quota window and per-endpoint counters shared across request threads."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.window = deque()
+        self.counts = {}
+        self.caches = {}  # id -> (text, expires_at)
+
+    def count(self, key: str):
+        with self.lock:
+            self.counts[key] = self.counts.get(key, 0) + 1
+
+    def over_quota(self, rpm: int) -> float:
+        """Return seconds until a slot frees up, or 0 if the call is allowed."""
+        if rpm <= 0:
+            return 0.0
+        now = time.monotonic()
+        with self.lock:
+            while self.window and now - self.window[0] >= 60.0:
+                self.window.popleft()
+            if len(self.window) >= rpm:
+                return 60.0 - (now - self.window[0])
+            self.window.append(now)
+            return 0.0
+
+
+def _error(code: int, status: str, message: str, headers: Dict = None):
+    body = {"error": {"code": code, "message": message, "status": status}}
+    return Response(json.dumps(body), code, mimetype="application/json", headers=headers)
+
+
+def _prompt_text(body: Dict) -> str:
+    return "".join(
+        part.get("text", "")
+        for content in body.get("contents", [])
+        for part in content.get("parts", [])
+    )
+
+
+def _tokens(text: str) -> int:
+    return int(len(text.split()) * 1.3)
+
+
+def _usage(prompt: str, text: str, cached: str = "") -> Dict:
+    prompt_tokens = _tokens(cached + prompt)
+    completion_tokens = _tokens(text)
+    usage = {
+        "promptTokenCount": prompt_tokens,
+        "candidatesTokenCount": completion_tokens,
+        "totalTokenCount": prompt_tokens + completion_tokens,
+    }
+    if cached:
+        usage["cachedContentTokenCount"] = _tokens(cached)
+    return usage
+
+
+def create_mock_gemini_app(config: MockGeminiConfig = None) -> Flask:
+    config = config or MockGeminiConfig()
+    state = _MockState()
+    app = Flask("mock_gemini")
+
+    def cached_prefix(body: Dict):
+        """Text of the referenced cachedContent, "" if none, None if unknown/expired."""
+        name = body.get("cachedContent")
+        if not name:
+            return ""
+        with state.lock:
+            entry = state.caches.get(name.rsplit("/", 1)[-1])
+        if entry is None or entry[1] < time.time():
+            return None
+        return entry[0]
+
+    def answer_for(body: Dict, cached: str = "") -> str:
+        text = templated_answer(cached + _prompt_text(body))
+        if config.completion_tokens > 0:
+            words = text.split()
+            filler = (words * (config.completion_tokens // max(len(words), 1) + 1))
+            text = " ".join(filler[: config.completion_tokens])
+        return text
+
+    def embedding(content: Dict):
+        text = "".join(part.get("text", "") for part in content.get("parts", []))
+        return {"values": hashing_embedding(text, config.embedding_dim)}
+
+    @app.get("/__mock/stats")
+    def stats():
+        with state.lock:
+            return {"requests": dict(state.counts)}
+
+    @app.post("/v1beta/cachedContents")
+    def create_cached_content():
+        state.count("cachedContents.create")
+        body = request.get_json(silent=True) or {}
+        text = _prompt_text(body)
+        if _tokens(text) < config.cache_min_tokens:
+            return _error(
+                400,
+                "INVALID_ARGUMENT",
+                f"Cached content is too small. min_total_token_count={config.cache_min_tokens}",
+            )
+        ttl = float(str(body.get("ttl", "3600s")).rstrip("s") or 3600)
+        cache_id = uuid.uuid4().hex[:16]
+        with state.lock:
+            state.caches[cache_id] = (text, time.time() + ttl)
+        return {
+            "name": f"cachedContents/{cache_id}",
+            "model": body.get("model"),
+            "usageMetadata": {"totalTokenCount": _tokens(text)},
+        }
+
+    @app.route("/v1beta/cachedContents/<cache_id>", methods=["GET", "DELETE"])
+    def cached_content(cache_id):
+        with state.lock:
+            entry = state.caches.get(cache_id)
+            if entry is not None and request.method == "DELETE":
+                del state.caches[cache_id]
+        state.count(f"cachedContents.{request.method.lower()}")
+        if entry is None:
+            return _error(404, "NOT_FOUND", f"CachedContent not found: {cache_id}")
+        return {} if request.method == "DELETE" else {"name": f"cachedContents/{cache_id}"}
+
+    @app.post("/v1beta/models/<path:target>")
+    def model_call(target):
+        model, _, method = target.partition(":")
+        state.count(method or "unknown")
+
+        retry_in = state.over_quota(config.rate_limit_rpm)
+        if retry_in:
+            state.count("rate_limited")
+            return _error(
+                429,
+                "RESOURCE_EXHAUSTED",
+                "Resource has been exhausted (e.g. check quota).",
+                headers={"Retry-After": str(int(math.ceil(retry_in)))},
+            )
+        if config.error_rate and random.random() < config.error_rate:
+            state.count("injected_errors")
+            return _error(503, "UNAVAILABLE", "The model is overloaded. Please try again later.")
+
+        body = request.get_json(silent=True) or {}
+
+        if method == "embedContent":
+            time.sleep(config.embed_latency())
+            return {"embedding": embedding(body.get("content", {}))}
+
+        if method == "batchEmbedContents":
+            time.sleep(config.embed_latency())
+            return {
+                "embeddings": [
+                    embedding(item.get("content", {})) for item in body.get("requests", [])
+                ]
+            }
+
+        if method == "generateContent":
+            cached = cached_prefix(body)
+            if cached is None:
+                return _error(403, "PERMISSION_DENIED", "CachedContent not found (or expired)")
+            if cached:
+                state.count("cache_hits")
+            prompt = _prompt_text(body)
+            time.sleep(
+                config.generate_latency() + _tokens(prompt) * config.prompt_token_latency
+            )
+            text = answer_for(body, cached)
+            return {
+                "candidates": [
+                    {
+                        "content": {"parts": [{"text": text}], "role": "model"},
+                        "finishReason": "STOP",
+                    }
+                ],
+                "usageMetadata": _usage(prompt, text, cached),
+                "modelVersion": model,
+            }
+
+        if method == "streamGenerateContent":
+            cached = cached_prefix(body)
+            if cached is None:
+                return _error(403, "PERMISSION_DENIED", "CachedContent not found (or expired)")
+            prompt = _prompt_text(body)
+            text = answer_for(body, cached)
+            words = text.split(" ")
+            pieces = [" ".join(words[i : i + 8]) for i in range(0, len(words), 8)]
+            sse = request.args.get("alt") == "sse"
+
+            def stream():
+                # Time to first token, then a steady inter-chunk cadence
+                time.sleep(
+                    config.generate_latency()
+                    + _tokens(prompt) * config.prompt_token_latency
+                )
+                if not sse:
+                    yield "["
+                for i, piece in enumerate(pieces):
+                    if i:
+                        time.sleep(config.stream_chunk_latency())
+                    chunk = {
+                        "candidates": [
+                            {"content": {"parts": [{"text": piece + " "}], "role": "model"}}
+                        ]
+                    }
+                    if i == len(pieces) - 1:
+                        chunk["candidates"][0]["finishReason"] = "STOP"
+                        chunk["usageMetadata"] = _usage(prompt, text, cached)
+                    if sse:
+                        yield f"data: {json.dumps(chunk)}\r\n\r\n"
+                    else:
+                        yield ("," if i else "") + json.dumps(chunk)
+                if not sse:
+                    yield "]"
+
+            mimetype = "text/event-stream" if sse else "application/json"
+            return Response(stream(), mimetype=mimetype)
+
+        return _error(404, "NOT_FOUND", f"Method '{method}' is not supported by the mock")
+
+    return app
@@ -1,9 +1,11 @@
 from .. import db
 from .user_models import User, Role, roles_users
-from .chat_models import ChatHistory
+from .chat_models import ChatHistory, ConversationSummary
 from .feedback_models import Feedback
 from .session_models import Session, PasswordResetToken
 from .settings_models import UserSettings
 from .audit_models import FileAuditLog
 from .persona_models import Persona
 from .resource_models import Resource
+from .document_store_models import ClientDocument
+from .chunk_models import Chunk, ChunkEmbedding
@@ -23,3 +23,23 @@ class ChatHistory(db.Model):
     )
 
     user = db.relationship("User", back_populates="chats")
+
+
+class ConversationSummary(db.Model):
+    """Rolling summary of a chat session, folded forward after each turn."""
+
+    __tablename__ = "conversation_summaries"
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
+    session_id = db.Column(db.String(100), nullable=False)
+    summary = db.Column(db.Text, nullable=False, default="")
+    # Last chat_history row folded into the summary; later turns are sent verbatim
+    summarized_through_id = db.Column(db.Integer, nullable=False, default=0)
+    turns = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(
+        db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow
+    )
+
+    __table_args__ = (
+        db.UniqueConstraint("user_id", "session_id", name="uq_conversation_summaries_session"),
+    )
@@ -0,0 +1,93 @@
+"""
+Knowledge-base chunks and their embeddings, stored in the database.
+"""
+
+from datetime import datetime
+
+import numpy as np
+
+from ..models import db
+
+
+class Chunk(db.Model):
+    """One section of a knowledge-base markdown file, as the indexer split it."""
+
+    __tablename__ = "chunks"
+
+    id = db.Column(db.Integer, primary_key=True)
+    chunk_id = db.Column(db.String(300), nullable=False)
+    source_path = db.Column(db.String(500), nullable=False)
+    position = db.Column(db.Integer, nullable=False)
+    resource_id = db.Column(
+        db.Integer, db.ForeignKey("resources.id", ondelete="SET NULL"), nullable=True
+    )
+    # Owner of the uploaded resource; NULL for corpus files without one
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=True)
+    header = db.Column(db.Text, nullable=False, default="")
+    text = db.Column(db.Text, nullable=False)
+    # SHA-1 of the text: chunks with equal text share an embedding
+    content_hash = db.Column(db.String(40), nullable=False, index=True)
+    file_mtime = db.Column(db.Float, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    updated_at = db.Column(
+        db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow
+    )
+
+    embeddings = db.relationship(
+        "ChunkEmbedding",
+        back_populates="chunk",
+        cascade="all, delete-orphan",
+        passive_deletes=True,
+    )
+
+    __table_args__ = (
+        db.UniqueConstraint("source_path", "position", name="uq_chunks_source_position"),
+        db.CheckConstraint("LENGTH(content_hash) = 40", name="check_chunk_hash_length"),
+    )
+
+    def to_dict(self):
+        """The chunk in the pipeline's dict shape (without an embedding)."""
+        return {
+            "text": self.text,
+            "source_file": self.source_path.rsplit("/", 1)[-1],
+            "source_path": self.source_path,
+            "chunk_id": self.chunk_id,
+            "header": self.header,
+            "file_mtime": self.file_mtime,
+        }
+
+    def __repr__(self):
+        return f"<Chunk {self.chunk_id}>"
+
+
+class ChunkEmbedding(db.Model):
+    """A chunk's vector from one embedding model, as a float32 blob."""
+
+    __tablename__ = "chunk_embeddings"
+
+    id = db.Column(db.Integer, primary_key=True)
+    chunk_pk = db.Column(
+        db.Integer, db.ForeignKey("chunks.id", ondelete="CASCADE"), nullable=False
+    )
+    embedding_model = db.Column(db.String(100), nullable=False)
+    dimensions = db.Column(db.Integer, nullable=False)
+    vector = db.Column(db.LargeBinary, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    chunk = db.relationship("Chunk", back_populates="embeddings")
+
+    __table_args__ = (
+        db.UniqueConstraint("chunk_pk", "embedding_model", name="uq_chunk_embeddings_model"),
+        db.CheckConstraint("dimensions > 0", name="check_embedding_dimensions_positive"),
+    )
+
+    @staticmethod
+    def pack(vector) -> bytes:
+        return np.asarray(vector, dtype=np.float32).tobytes()
+
+    @staticmethod
+    def unpack(blob: bytes) -> np.ndarray:
+        return np.frombuffer(blob, dtype=np.float32)
+
+    def __repr__(self):
+        return f"<ChunkEmbedding chunk={self.chunk_pk} {self.embedding_model}>"
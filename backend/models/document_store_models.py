@@ -0,0 +1,48 @@
+"""
+Content-addressed store for documents supplied by the chat client.
+"""
+
+from datetime import datetime
+from ..models import db
+
+
+class ClientDocument(db.Model):
+    """
+    A document body registered by a user, keyed by the SHA-256 of its content.
+
+    Hashes are scoped per user: identical content uploaded by two users is stored
+    twice, so one user can never probe for another user's documents.
+    """
+
+    __tablename__ = "client_documents"
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
+    sha256 = db.Column(db.String(64), nullable=False)
+    filename = db.Column(db.String(255), nullable=False, default="unknown")
+    content = db.Column(db.Text, nullable=False)
+    size_bytes = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    last_used_at = db.Column(
+        db.DateTime, nullable=False, default=datetime.utcnow, index=True
+    )
+
+    __table_args__ = (
+        db.UniqueConstraint("user_id", "sha256", name="uq_client_documents_user_sha"),
+        db.CheckConstraint("LENGTH(sha256) = 64", name="check_sha256_length"),
+        db.CheckConstraint("size_bytes >= 0", name="check_size_non_negative"),
+    )
+
+    def to_dict(self):
+        return {
+            "sha256": self.sha256,
+            "filename": self.filename,
+            "size_bytes": self.size_bytes,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "last_used_at": (
+                self.last_used_at.isoformat() if self.last_used_at else None
+            ),
+        }
+
+    def __repr__(self):
+        return f"<ClientDocument {self.sha256[:12]} user={self.user_id}>"
@@ -2,10 +2,12 @@
 Persona database models for dynamic persona management through Flask-Admin.
 """
 
+import logging
 from datetime import datetime
 from typing import List
+from sqlalchemy import event
 from sqlalchemy import Column, Integer, String, Text, Float, Boolean, DateTime, JSON
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import Session, object_session, relationship
 from sqlalchemy.ext.declarative import declarative_base
 from ..models import db
 
@@ -233,3 +235,42 @@ class Persona(db.Model):
 
         # Filter out empty strings and return unique values
         return list(set([area.strip() for area in areas if area.strip()]))
+
+
+_PENDING_TAGS = "persona_cache_tags"
+
+
+@event.listens_for(Persona, "after_update")
+@event.listens_for(Persona, "after_delete")
+def _queue_prompt_prefix_invalidation(mapper, connection, target):
+    """Remember the persona's cache tag; it is invalidated once the change commits."""
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault(_PENDING_TAGS, set()).add(f"persona:{target.id}")
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_prompt_prefix_invalidations(session):
+    session.info.pop(_PENDING_TAGS, None)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_cached_prompt_prefixes(session):
+    """
+    Drop provider-side cached prompt prefixes built from changed personas.
+
+    This is an HTTP call per cached prefix, so it runs after the commit (never
+    inside the flush, holding the write transaction, or for rolled-back changes).
+    """
+    tags = session.info.pop(_PENDING_TAGS, None)
+    if not tags:
+        return
+    from ..providers import get_provider
+
+    for tag in sorted(tags):
+        try:
+            get_provider().invalidate_prefix_cache(tag)
+        except Exception:
+            logging.getLogger(__name__).exception(
+                "failed to invalidate cached prompt prefix %s", tag
+            )
@@ -0,0 +1,146 @@
+"""
+Near-duplicate chunk detection for ingestion (MinHash + LSH).
+
+Copy-pasted sections across knowledge-base files produce chunks that differ
+by a few words. Each one would cost an embedding call, a row in the index and
+a top-k slot. :func:`dedupe_chunks` collapses every cluster of chunks whose
+estimated Jaccard similarity (word 5-gram shingles) reaches
+``NEAR_DUPLICATE_THRESHOLD`` into one representative, the longest text of the
+cluster. The representative keeps the provenance of every copy in
+``duplicates``.
+
+Signatures are ``NEAR_DUPLICATE_PERMUTATIONS`` multiply-shift hashes over CRC32
+shingle hashes, computed in one vectorised pass per chunk and seeded so every
+process clusters identically. LSH banding only proposes candidate pairs; each
+pair is confirmed against the full signatures before it is merged.
+"""
+
+import os
+import re
+import zlib
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+SHINGLE_WORDS = 5
+_SEED = 20240611
+_WORD = re.compile(r"\w+")
+
+
+def settings() -> Tuple[bool, float, int]:
+    """``(enabled, threshold, permutations)`` from the environment."""
+    return (
+        os.getenv("NEAR_DUPLICATE_DEDUP", "true").lower() == "true",
+        float(os.getenv("NEAR_DUPLICATE_THRESHOLD", "0.85")),
+        int(os.getenv("NEAR_DUPLICATE_PERMUTATIONS", "128")),
+    )
+
+
+def shingles(text: str, size: int = SHINGLE_WORDS) -> np.ndarray:
+    """CRC32 hashes of the word ``size``-grams of ``text`` (at least one)."""
+    words = _WORD.findall(text.lower())
+    grams = {
+        " ".join(words[i : i + size]) for i in range(max(1, len(words) - size + 1))
+    }
+    return np.fromiter(
+        (zlib.crc32(gram.encode("utf-8")) for gram in grams), dtype=np.uint64, count=len(grams)
+    )
+
+
+class MinHasher:
+    def __init__(self, permutations: int = 128, seed: int = _SEED):
+        rng = np.random.default_rng(seed)
+        # Odd multipliers for multiply-shift hashing of 32-bit values
+        self.a = rng.integers(1, 2**63, size=permutations, dtype=np.uint64) | np.uint64(1)
+        self.b = rng.integers(0, 2**63, size=permutations, dtype=np.uint64)
+
+    def signature(self, hashes: np.ndarray) -> np.ndarray:
+        with np.errstate(over="ignore"):
+            mixed = (self.a[:, None] * hashes[None, :] + self.b[:, None]) >> np.uint64(32)
+        return mixed.min(axis=1)
+
+
+def lsh_bands(permutations: int, threshold: float) -> Tuple[int, int]:
+    """``(bands, rows)`` whose S-curve midpoint sits just below ``threshold``."""
+    best = (permutations, 1)
+    for rows in range(1, permutations + 1):
+        if permutations % rows:
+            continue
+        bands = permutations // rows
+        if (1 / bands) ** (1 / rows) <= threshold:
+            best = (bands, rows)
+    return best
+
+
+def clusters(signatures: np.ndarray, threshold: float) -> List[List[int]]:
+    """Groups of row indices whose signatures agree on at least ``threshold``."""
+    count, permutations = signatures.shape
+    bands, rows = lsh_bands(permutations, threshold)
+    parent = list(range(count))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for band in range(bands):
+        buckets: Dict[bytes, List[int]] = {}
+        block = np.ascontiguousarray(signatures[:, band * rows : (band + 1) * rows])
+        for i in range(count):
+            buckets.setdefault(block[i].tobytes(), []).append(i)
+        for members in buckets.values():
+            first = members[0]
+            for other in members[1:]:
+                root_first, root_other = find(first), find(other)
+                if root_first == root_other:
+                    continue
+                if np.mean(signatures[first] == signatures[other]) >= threshold:
+                    parent[root_other] = root_first
+
+    groups: Dict[int, List[int]] = {}
+    for i in range(count):
+        groups.setdefault(find(i), []).append(i)
+    return list(groups.values())
+
+
+def _provenance(chunk: Dict) -> Dict:
+    return {
+        "chunk_id": chunk["chunk_id"],
+        "source_file": chunk["source_file"],
+        "source_path": chunk.get("source_path"),
+    }
+
+
+def dedupe_chunks(chunks: List[Dict]) -> Tuple[List[Dict], Dict]:
+    """
+    Keep one representative per near-duplicate cluster, in corpus order.
+
+    Representatives of clusters larger than one get ``duplicates``: the
+    provenance of the other members. Returns ``(chunks, stats)``.
+    """
+    enabled, threshold, permutations = settings()
+    if not enabled or len(chunks) < 2:
+        return chunks, {"chunks": len(chunks), "removed": 0, "clusters": 0}
+
+    hasher = MinHasher(permutations)
+    signatures = np.stack([hasher.signature(shingles(chunk["text"])) for chunk in chunks])
+    keep = []
+    merged = 0
+    for members in clusters(signatures, threshold):
+        representative = max(members, key=lambda i: (len(chunks[i]["text"]), -i))
+        chunk = chunks[representative]
+        chunk.pop("duplicates", None)
+        if len(members) > 1:
+            chunk["duplicates"] = [
+                _provenance(chunks[i]) for i in sorted(members) if i != representative
+            ]
+            merged += 1
+        keep.append(representative)
+
+    deduped = [chunks[i] for i in sorted(keep)]
+    return deduped, {
+        "chunks": len(chunks),
+        "removed": len(chunks) - len(deduped),
+        "clusters": merged,
+    }
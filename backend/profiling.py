@@ -0,0 +1,291 @@
+"""
+On-demand request profiling.
+
+A WSGI middleware profiles a request when it carries a valid signed
+``X-Profile`` header (minted by an admin via ``POST /api/admin/profiling/token``
+or ``flask profile-token``) or when it is picked by ``PROFILING_SAMPLE_RATE``.
+Each profiled request produces, under ``PROFILING_DIR``:
+
+* ``<id>.prof``      - cProfile stats, loadable with ``pstats``/snakeviz
+* ``<id>.collapsed`` - sampled stacks in collapsed format for flamegraph.pl/speedscope
+* ``<id>.json``      - request metadata (path, status, duration, trigger)
+
+Profiles are listed in the admin under "Profiles".
+"""
+
+import os
+import re
+import sys
+import hmac
+import json
+import time
+import random
+import hashlib
+import logging
+import cProfile
+import threading
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = "HTTP_X_PROFILE"
+DEFAULT_PROFILES_DIR = Path(__file__).parent / "profiles"
+
+
+def _signature(secret: str, expires: int) -> str:
+    return hmac.new(secret.encode(), f"profile:{expires}".encode(), hashlib.sha256).hexdigest()
+
+
+def make_token(secret: str, ttl_seconds: int = 600) -> str:
+    """``<expires>.<hmac>`` token accepted in the ``X-Profile`` header until it expires."""
+    expires = int(time.time()) + int(ttl_seconds)
+    return f"{expires}.{_signature(secret, expires)}"
+
+
+def verify_token(secret: str, token: str) -> bool:
+    expires, _, signature = (token or "").partition(".")
+    try:
+        expires = int(expires)
+    except ValueError:
+        return False
+    if expires < time.time():
+        return False
+    return hmac.compare_digest(signature, _signature(secret, expires))
+
+
+class StackSampler:
+    """Samples one thread's Python stack on a timer into collapsed-stack counts."""
+
+    def __init__(self, thread_id: int, interval: float = 0.005):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            self.stacks[";".join(reversed(names))] += 1
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+class _ProfiledBody:
+    """WSGI body that runs the app's iterable under the profiler and forwards ``close()``."""
+
+    def __init__(self, body, profiler: cProfile.Profile, finish):
+        self._body = body
+        self._profiler = profiler
+        self._finish = finish
+        self._finished = False
+
+    def __iter__(self):
+        self._profiler.enable()
+        try:
+            iterator = iter(self._body)
+        finally:
+            self._profiler.disable()
+        while True:
+            # Time spent by the server writing each chunk is left out
+            self._profiler.enable()
+            try:
+                chunk = next(iterator)
+            except StopIteration:
+                break
+            finally:
+                self._profiler.disable()
+            yield chunk
+        self._end()
+
+    def close(self):
+        try:
+            # Runs the app's call_on_close hooks, as the WSGI contract requires
+            close = getattr(self._body, "close", None)
+            if close is not None:
+                close()
+        finally:
+            self._end()
+
+    def _end(self):
+        if not self._finished:
+            self._finished = True
+            self._finish()
+
+
+class ProfilingMiddleware:
+    def __init__(
+        self,
+        wsgi_app,
+        secret: str,
+        profiles_dir: Path,
+        sample_rate: float = 0.0,
+        path_prefixes=("/api/",),
+        sample_interval: float = 0.005,
+        max_profiles: int = 200,
+    ):
+        self.wsgi_app = wsgi_app
+        self.secret = secret
+        self.profiles_dir = Path(profiles_dir)
+        self.sample_rate = sample_rate
+        self.path_prefixes = tuple(path_prefixes)
+        self.sample_interval = sample_interval
+        self.max_profiles = max_profiles
+
+    def _trigger(self, environ) -> Optional[str]:
+        token = environ.get(PROFILE_HEADER)
+        if token:
+            if verify_token(self.secret, token):
+                return "header"
+            logger.warning("ignoring invalid or expired X-Profile token")
+        path = environ.get("PATH_INFO", "")
+        if (
+            self.sample_rate > 0
+            and path.startswith(self.path_prefixes)
+            and random.random() < self.sample_rate
+        ):
+            return "sampled"
+        return None
+
+    def __call__(self, environ, start_response):
+        trigger = self._trigger(environ)
+        if trigger is None:
+            return self.wsgi_app(environ, start_response)
+
+        status_holder = {}
+
+        def capture(status, headers, exc_info=None):
+            status_holder["status"] = int(status.split(" ", 1)[0])
+            return start_response(status, headers, exc_info)
+
+        profiler = cProfile.Profile()
+        sampler = StackSampler(threading.get_ident(), self.sample_interval).start()
+        started = time.perf_counter()
+
+        def finish():
+            duration = time.perf_counter() - started
+            sampler.stop()
+            self._save(environ, status_holder.get("status", 500), duration, trigger, profiler, sampler)
+
+        profiler.enable()
+        try:
+            body = self.wsgi_app(environ, capture)
+        except BaseException:
+            profiler.disable()
+            finish()
+            raise
+        profiler.disable()
+        # Streamed bodies are produced while the server iterates; the profile
+        # ends when the body is exhausted or closed
+        return _ProfiledBody(body, profiler, finish)
+
+    def _save(self, environ, status, duration, trigger, profiler, sampler):
+        try:
+            self.profiles_dir.mkdir(parents=True, exist_ok=True)
+            path = environ.get("PATH_INFO", "")
+            slug = re.sub(r"[^A-Za-z0-9_-]+", "_", path.strip("/"))[:60] or "root"
+            profile_id = (
+                f"{datetime.utcnow().strftime('%Y%m%dT%H%M%S')}-{os.getpid()}-"
+                f"{environ.get('REQUEST_METHOD', 'GET').lower()}-{slug}-{int(duration * 1000)}ms"
+            )
+            profiler.dump_stats(str(self.profiles_dir / f"{profile_id}.prof"))
+            (self.profiles_dir / f"{profile_id}.collapsed").write_text(sampler.collapsed())
+            meta = {
+                "id": profile_id,
+                "method": environ.get("REQUEST_METHOD"),
+                "path": path,
+                "query": environ.get("QUERY_STRING", ""),
+                "status": status,
+                "duration_ms": round(duration * 1000.0, 1),
+                "trigger": trigger,
+                "samples": sum(sampler.stacks.values()),
+                "created_at": datetime.utcnow().isoformat() + "Z",
+            }
+            (self.profiles_dir / f"{profile_id}.json").write_text(json.dumps(meta))
+            logger.info("saved request profile %s", profile_id)
+            self._prune()
+        except Exception:
+            logger.exception("failed to save request profile")
+
+    def _prune(self):
+        metas = sorted(self.profiles_dir.glob("*.json"), key=lambda p: p.stat().st_mtime)
+        for meta in metas[: max(0, len(metas) - self.max_profiles)]:
+            for suffix in (".json", ".prof", ".collapsed"):
+                meta.with_suffix(suffix).unlink(missing_ok=True)
+
+
+def profiles_dir() -> Path:
+    configured = os.getenv("PROFILING_DIR", "").strip()
+    return Path(configured) if configured else DEFAULT_PROFILES_DIR
+
+
+def profiling_secret(app) -> str:
+    return os.getenv("PROFILING_SECRET", "").strip() or app.config["SECRET_KEY"]
+
+
+PROFILE_ID_RE = re.compile(r"^[A-Za-z0-9_-]+$")
+
+
+def profile_path(directory: Path, profile_id: str, suffix: str) -> Optional[Path]:
+    """Path of a stored profile artifact, or ``None`` for unknown/unsafe ids."""
+    if not PROFILE_ID_RE.match(profile_id or ""):
+        return None
+    path = directory / f"{profile_id}{suffix}"
+    return path if path.exists() else None
+
+
+def top_functions(path: Path, sort: str = "cumulative", limit: int = 40) -> str:
+    """Text report of the hottest functions in a ``.prof`` file."""
+    import io
+    import pstats
+
+    out = io.StringIO()
+    stats = pstats.Stats(str(path), stream=out)
+    stats.strip_dirs().sort_stats(sort).print_stats(limit)
+    return out.getvalue()
+
+
+def list_profiles(directory: Path) -> List[Dict]:
+    """Metadata of stored profiles, newest first."""
+    profiles = []
+    for meta in directory.glob("*.json"):
+        try:
+            profiles.append(json.loads(meta.read_text()))
+        except (OSError, ValueError):
+            continue
+    return sorted(profiles, key=lambda p: p.get("created_at", ""), reverse=True)
+
+
+def init_app(app):
+    """Install the profiling middleware when enabled (``PROFILING_ENABLED``)."""
+    if os.getenv("PROFILING_ENABLED", "true").lower() != "true":
+        return
+    prefixes = [p.strip() for p in os.getenv("PROFILING_PATHS", "/api/").split(",") if p.strip()]
+    app.wsgi_app = ProfilingMiddleware(
+        app.wsgi_app,
+        secret=profiling_secret(app),
+        profiles_dir=profiles_dir(),
+        sample_rate=float(os.getenv("PROFILING_SAMPLE_RATE", "0")),
+        path_prefixes=prefixes,
+        sample_interval=float(os.getenv("PROFILING_SAMPLE_INTERVAL_MS", "5")) / 1000.0,
+        max_profiles=int(os.getenv("PROFILING_MAX_PROFILES", "200")),
+    )
@@ -0,0 +1,49 @@
+"""
+Pluggable embedding/LLM providers.
+
+Backends register themselves by name and the active one is selected with the
+``LLM_PROVIDER`` environment variable (``gemini`` by default, ``local`` for the
+offline deterministic backend used in CI and load tests).
+"""
+
+import os
+import threading
+
+from .base import LLMProvider
+
+_registry = {}
+_instances = {}
+_lock = threading.Lock()
+
+
+def register_provider(name: str):
+    """Class decorator registering an LLMProvider subclass under ``name``."""
+
+    def decorator(cls):
+        cls.name = name
+        _registry[name] = cls
+        return cls
+
+    return decorator
+
+
+def available_providers():
+    return sorted(_registry)
+
+
+def get_provider(name: str = None) -> LLMProvider:
+    """Return the (process-wide) provider instance for ``name`` or LLM_PROVIDER."""
+    name = (name or os.getenv("LLM_PROVIDER", "gemini")).strip().lower()
+    with _lock:
+        provider = _instances.get(name)
+        if provider is None:
+            if name not in _registry:
+                raise ValueError(
+                    f"Unknown LLM provider '{name}'. Available: {', '.join(available_providers())}"
+                )
+            provider = _instances[name] = _registry[name]()
+    return provider
+
+
+# Register built-in backends
+from . import gemini, local  # noqa: E402,F401
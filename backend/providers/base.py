@@ -0,0 +1,72 @@
+"""Provider interface shared by all embedding/LLM backends."""
+
+from typing import Dict, List, Optional, Tuple
+
+
+class LLMProvider:
+    """
+    Base class for embedding/generation backends.
+
+    ``embed`` returns a vector or None, ``generate`` returns the same
+    ``(text, usage, error)`` tuple the pipeline has always used.
+    """
+
+    name = "base"
+    requires_api_key = True
+
+    @property
+    def embedding_model(self) -> str:
+        raise NotImplementedError
+
+    @property
+    def generation_model(self) -> str:
+        raise NotImplementedError
+
+    def embed(self, text: str, api_key: str) -> Optional[List[float]]:
+        raise NotImplementedError
+
+    def embed_batch(self, texts: List[str], api_key: str) -> List[Optional[List[float]]]:
+        """Embed several texts; backends with a batch endpoint should override."""
+        return [self.embed(text, api_key) for text in texts]
+
+    def generate(
+        self,
+        prompt: str,
+        api_key: str,
+        model: str = None,
+        timeout: float = None,
+        prefix: str = None,
+        cache_tags=(),
+    ) -> Tuple[Optional[str], Optional[Dict], Optional[str]]:
+        """
+        Complete ``prefix + prompt``. ``prefix`` is a stable leading part that
+        backends with context caching may upload once and reference by handle.
+        """
+        raise NotImplementedError
+
+    def warm_up(self, api_key: str):
+        """Open pooled connections ahead of the first request; a no-op by default."""
+
+    def invalidate_prefix_cache(self, tag: str) -> int:
+        """Drop cached prefixes labelled ``tag``; returns how many were dropped."""
+        return 0
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough token count: ~1.3 tokens per whitespace-separated word, but at least
+    one per 4 characters so unbroken strings (and CJK text) are not undercounted.
+    """
+    text = text or ""
+    return int(max(len(text.split()) * 1.3, len(text) / 4))
+
+
+def estimate_usage(prompt: str, text: str) -> Dict:
+    """Rough token estimate used when a backend reports no usage metadata."""
+    prompt_tokens = len(prompt.split()) * 1.3
+    completion_tokens = len((text or "").split()) * 1.3
+    return {
+        "prompt_tokens": int(prompt_tokens),
+        "completion_tokens": int(completion_tokens),
+        "total_tokens": int(prompt_tokens + completion_tokens),
+    }
@@ -0,0 +1,248 @@
+"""Google Gemini backend (text-embedding-004 + generateContent)."""
+
+import os
+import json
+from typing import Dict, List, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from . import register_provider
+from .base import LLMProvider, estimate_usage
+from ..context_cache import ContextCache
+from ..resilience import CircuitBreaker, CircuitOpenError, ResilientCaller
+
+# batchEmbedContents accepts at most this many requests per call
+EMBED_BATCH_MAX = 100
+
+SAFETY_SETTINGS = [
+    {"category": category, "threshold": "BLOCK_MEDIUM_AND_ABOVE"}
+    for category in (
+        "HARM_CATEGORY_HARASSMENT",
+        "HARM_CATEGORY_HATE_SPEECH",
+        "HARM_CATEGORY_SEXUALLY_EXPLICIT",
+        "HARM_CATEGORY_DANGEROUS_CONTENT",
+    )
+]
+
+
+@register_provider("gemini")
+class GeminiProvider(LLMProvider):
+    DEFAULT_BASE_URL = "https://generativelanguage.googleapis.com/v1beta"
+
+    def __init__(self):
+        # Overridable so load tests can target the bundled mock server
+        self.base_url = os.getenv("GEMINI_API_BASE_URL", self.DEFAULT_BASE_URL).rstrip("/")
+
+        # One breaker per provider: embedding and generation failures both indicate a
+        # degraded Gemini API, but latency is tracked per operation for hedging.
+        self.breaker = CircuitBreaker.from_env("gemini")
+        self.embed_caller = ResilientCaller.from_env("gemini-embed", self.breaker)
+        self.generate_caller = ResilientCaller.from_env("gemini-generate", self.breaker)
+
+        # Pooled keep-alive connections instead of a TLS handshake per call
+        pool_size = int(os.getenv("GEMINI_HTTP_POOL_SIZE", "20"))
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        # Handles of cachedContents holding stable prompt prefixes
+        self.context_cache = ContextCache.from_env()
+
+    @property
+    def embedding_model(self) -> str:
+        return os.getenv("GEMINI_EMBEDDING_MODEL", "text-embedding-004")
+
+    @property
+    def generation_model(self) -> str:
+        return os.getenv("GOOGLE_GEMINI_MODEL", "gemini-1.5-flash-latest")
+
+    def warm_up(self, api_key: str):
+        # Any HTTP answer means the TLS connection is now pooled; only transport
+        # errors count as failures
+        self.session.get(
+            f"{self.base_url}/models/{self.embedding_model}",
+            headers={"x-goog-api-key": api_key},
+            timeout=10,
+        )
+
+    def _post_json(self, url: str, timeout: float, **kwargs) -> Dict:
+        """Single HTTP attempt; raises on transport errors and non-2xx statuses."""
+        response = self.session.post(url, timeout=timeout, **kwargs)
+        response.raise_for_status()
+        return response.json()
+
+    def embed(self, text: str, api_key: str) -> Optional[List[float]]:
+        model = self.embedding_model
+        url = f"{self.base_url}/models/{model}:embedContent"
+        payload = {
+            "model": f"models/{model}",
+            "content": {"parts": [{"text": text}]},
+        }
+        headers = {"Content-Type": "application/json", "x-goog-api-key": api_key}
+
+        data = self.embed_caller.call(
+            lambda: self._post_json(url, 30, json=payload, headers=headers)
+        )
+        embedding = data.get("embedding", {}).get("values", [])
+        return embedding if embedding else None
+
+    def embed_batch(self, texts: List[str], api_key: str) -> List[Optional[List[float]]]:
+        if not texts:
+            return []
+        model = self.embedding_model
+        url = f"{self.base_url}/models/{model}:batchEmbedContents"
+        headers = {"Content-Type": "application/json", "x-goog-api-key": api_key}
+
+        results: List[Optional[List[float]]] = []
+        for start in range(0, len(texts), EMBED_BATCH_MAX):
+            batch = texts[start : start + EMBED_BATCH_MAX]
+            payload = {
+                "requests": [
+                    {"model": f"models/{model}", "content": {"parts": [{"text": text}]}}
+                    for text in batch
+                ]
+            }
+            data = self.embed_caller.call(
+                # Bound now: a hedged attempt may start after the loop moves on
+                lambda payload=payload: self._post_json(url, 60, json=payload, headers=headers)
+            )
+            embeddings = data.get("embeddings", [])
+            results.extend(
+                (embeddings[i].get("values") or None) if i < len(embeddings) else None
+                for i in range(len(batch))
+            )
+        return results
+
+    def generate(
+        self,
+        prompt: str,
+        api_key: str,
+        model: str = None,
+        timeout: float = None,
+        prefix: str = None,
+        cache_tags=(),
+    ) -> Tuple[Optional[str], Optional[Dict], Optional[str]]:
+        timeout = timeout or float(os.getenv("GEMINI_TIMEOUT", "15"))
+        model = model or self.generation_model
+
+        cached = None
+        if prefix:
+            cached = self.context_cache.handle_for(
+                model,
+                prefix,
+                lambda ttl: self._create_cached_content(model, prefix, api_key, ttl),
+                tags=cache_tags,
+            )
+        if cached:
+            result, status = self._generate_once(prompt, api_key, model, timeout, cached)
+            if status not in (400, 403, 404):
+                return result
+            # Handle expired or evicted provider-side: resend the prefix inline
+            self.context_cache.forget(cached)
+
+        result, _status = self._generate_once(
+            (prefix or "") + prompt, api_key, model, timeout, None
+        )
+        return result
+
+    def _generate_once(self, text, api_key, model, timeout, cached_content):
+        """One generateContent call; returns ``((text, usage, error), http_status)``."""
+        url = f"{self.base_url}/models/{model}:generateContent?key={api_key}"
+
+        payload = {
+            "contents": [{"role": "user", "parts": [{"text": text}]}],
+            "generationConfig": {
+                "temperature": 0.3,  # Lower temperature for more consistent analysis
+                "topK": 40,
+                "topP": 0.95,
+                "maxOutputTokens": 2048,  # Increased for detailed analysis
+            },
+            "safetySettings": SAFETY_SETTINGS,
+        }
+        if cached_content:
+            payload["cachedContent"] = cached_content
+
+        data = json.dumps(payload)
+        headers = {"Content-Type": "application/json"}
+
+        try:
+            response_data = self.generate_caller.call(
+                lambda: self._post_json(url, timeout, data=data, headers=headers)
+            )
+        except CircuitOpenError:
+            raise
+        except requests.exceptions.HTTPError as e:
+            try:
+                error_data = e.response.json()
+                error_detail = error_data.get("error", {}).get("message", str(e))
+            except Exception:
+                error_detail = f"HTTP {e.response.status_code}: {str(e)}"
+            return (None, None, f"API Error: {error_detail}"), e.response.status_code
+        except Exception as e:
+            return (None, None, f"Request Error: {str(e)}"), None
+
+        return parse_generate_response(text, response_data), 200
+
+    def _create_cached_content(self, model: str, prefix: str, api_key: str, ttl: int) -> Optional[str]:
+        url = f"{self.base_url}/cachedContents"
+        payload = {
+            "model": f"models/{model}",
+            "contents": [{"role": "user", "parts": [{"text": prefix}]}],
+            "ttl": f"{int(ttl)}s",
+        }
+        headers = {"Content-Type": "application/json", "x-goog-api-key": api_key}
+        data = self._post_json(url, 30, json=payload, headers=headers)
+        return data.get("name")
+
+    def invalidate_prefix_cache(self, tag: str) -> int:
+        api_key = os.getenv("GOOGLE_GEMINI_API_KEY", "").strip()
+
+        def delete(name):
+            self.session.delete(
+                f"{self.base_url}/{name}", headers={"x-goog-api-key": api_key}, timeout=10
+            )
+
+        return self.context_cache.invalidate_tag(tag, delete=delete)
+
+
+def parse_generate_response(
+    prompt: str, response_data: Dict
+) -> Tuple[Optional[str], Optional[Dict], Optional[str]]:
+    """Extract ``(text, usage, error)`` from a generateContent response body."""
+    try:
+        candidates = response_data.get("candidates", [])
+        if not candidates:
+            return None, None, "No response generated"
+
+        content = candidates[0].get("content", {})
+        parts = content.get("parts", [])
+
+        if not parts:
+            return None, None, "Empty response from AI"
+
+        text = "".join(part.get("text", "") for part in parts).strip()
+
+        if not text:
+            return None, None, "Empty text in response"
+
+    except Exception as e:
+        return None, None, f"Failed to parse response: {str(e)}"
+
+    # Extract usage metadata
+    usage = None
+    try:
+        usage_metadata = response_data.get("usageMetadata", {})
+        if usage_metadata:
+            usage = {
+                "prompt_tokens": usage_metadata.get("promptTokenCount", 0),
+                "completion_tokens": usage_metadata.get("candidatesTokenCount", 0),
+                "total_tokens": usage_metadata.get("totalTokenCount", 0),
+            }
+            if usage_metadata.get("cachedContentTokenCount"):
+                usage["cached_tokens"] = usage_metadata["cachedContentTokenCount"]
+    except Exception:
+        usage = estimate_usage(prompt, text)
+
+    return text, usage, None
@@ -0,0 +1,127 @@
+"""
+Offline deterministic backend.
+
+Embeddings use the hashing trick over word unigrams and bigrams, so related texts
+still land near each other and retrieval behaves plausibly. Generation is a
+templated responder that quotes the retrieved context. Both support simulated
+latency so indexing and chat paths can be load-tested without a provider key.
+"""
+
+import os
+import re
+import time
+import random
+import hashlib
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from . import register_provider
+from .base import LLMProvider, estimate_usage
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def _latency_seconds(env_name: str) -> float:
+    """Simulated latency: ``<mean_ms>`` or ``<mean_ms>:<jitter_ms>`` from the env."""
+    raw = os.getenv(env_name, "0")
+    mean, _, jitter = raw.partition(":")
+    try:
+        mean_ms = float(mean or 0)
+        jitter_ms = float(jitter or 0)
+    except ValueError:
+        return 0.0
+    return max(0.0, mean_ms + random.uniform(-jitter_ms, jitter_ms)) / 1000.0
+
+
+@register_provider("local")
+class LocalProvider(LLMProvider):
+    requires_api_key = False
+
+    def __init__(self):
+        self.dim = int(os.getenv("LOCAL_EMBEDDING_DIM", "768"))
+
+    @property
+    def embedding_model(self) -> str:
+        return f"local-hashing-{self.dim}"
+
+    @property
+    def generation_model(self) -> str:
+        return "local-template"
+
+    def embed(self, text: str, api_key: str = None) -> Optional[List[float]]:
+        delay = _latency_seconds("LOCAL_EMBED_LATENCY_MS")
+        if delay:
+            time.sleep(delay)
+        return hashing_embedding(text, self.dim)
+
+    def embed_batch(self, texts: List[str], api_key: str = None) -> List[Optional[List[float]]]:
+        # One simulated round trip per batch, like a real batch endpoint
+        delay = _latency_seconds("LOCAL_EMBED_LATENCY_MS")
+        if delay:
+            time.sleep(delay)
+        return [hashing_embedding(text, self.dim) for text in texts]
+
+    def generate(
+        self,
+        prompt: str,
+        api_key: str = None,
+        model: str = None,
+        timeout: float = None,
+        prefix: str = None,
+        cache_tags=(),
+    ) -> Tuple[Optional[str], Optional[Dict], Optional[str]]:
+        delay = _latency_seconds("LOCAL_LLM_LATENCY_MS")
+        if delay:
+            time.sleep(delay)
+
+        prompt = (prefix or "") + prompt
+        text = templated_answer(prompt)
+        return text, estimate_usage(prompt, text), None
+
+
+def hashing_embedding(text: str, dim: int = 768) -> List[float]:
+    """Deterministic unit vector from signed feature hashing of unigrams and bigrams."""
+    tokens = _TOKEN_RE.findall(text.lower())
+    features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+    vec = np.zeros(dim, dtype=np.float32)
+    for feature in features:
+        digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+        value = int.from_bytes(digest, "little")
+        sign = 1.0 if value & 1 else -1.0
+        vec[(value >> 1) % dim] += sign
+    norm = np.linalg.norm(vec)
+    if norm == 0:
+        vec[0] = 1.0
+        norm = 1.0
+    return (vec / norm).tolist()
+
+
+def templated_answer(prompt: str) -> str:
+    """Answer that echoes the question and quotes the retrieved context."""
+    question = _section(prompt, "## User Question:")
+    question = question.replace("Please provide a helpful response:", "").strip()
+    question = question or "your question"
+    context = _section(prompt, "## Knowledge Base Context:")
+    sources = re.findall(r"^# From: (.+)$", context, flags=re.MULTILINE)
+    excerpt = " ".join(
+        line.strip()
+        for line in context.splitlines()
+        if line.strip() and not line.startswith("#")
+    )[:400]
+
+    return (
+        f"Based on the knowledge base, here is what I found about: {question.strip()}\n\n"
+        f"{excerpt or 'No matching content was provided.'}\n\n"
+        f"Sources: {', '.join(dict.fromkeys(sources)) or 'none'}"
+    )
+
+
+def _section(prompt: str, heading: str) -> str:
+    """Text between ``heading`` and the next level-2 heading."""
+    start = prompt.find(heading)
+    if start == -1:
+        return ""
+    start += len(heading)
+    end = prompt.find("\n## ", start)
+    return prompt[start : end if end != -1 else len(prompt)].strip()
@@ -1,12 +1,48 @@
 import os
 import json
-import requests
 import ssl
 import numpy as np
 import pickle
 import hashlib
 from pathlib import Path
-from typing import List, Tuple, Dict, Optional
+from typing import Callable, List, Tuple, Dict, Optional
+
+from . import chunk_store, conversation_summary
+from .context_compression import compress_chunks
+from .embedding_log import EmbeddingLog
+from .embedding_reduction import EmbeddingReduction, reduce_chunks
+from .knowledge_index import get_index
+from .metrics import INDEX_CHUNKS, INDEX_DIMENSIONS, record_cache, record_tokens, track_llm_call
+from .near_duplicates import dedupe_chunks
+from .providers import get_provider
+from .providers.base import estimate_tokens
+from .resilience import CircuitOpenError
+from .singleflight import SingleFlight, flight_key
+from .timings import current_timer, stage, timed_request
+
+# Identical concurrent embedding/generation requests share one provider call
+embed_flight = SingleFlight.from_env("embed")
+generate_flight = SingleFlight.from_env("generate")
+
+# Reduced-dimension projection of each loaded index, keyed by its cache path
+_reductions: Dict[str, Optional[EmbeddingReduction]] = {}
+# Append-only embedding store per knowledge base, keyed by its directory
+_embedding_logs: Dict[str, EmbeddingLog] = {}
+
+
+def get_api_key() -> str:
+    """Return the provider API key, raising if the active provider needs one."""
+    api_key = os.getenv("GOOGLE_GEMINI_API_KEY", "").strip()
+
+    # Require API key - no fallback (the offline local provider needs none)
+    if get_provider().requires_api_key and (
+        not api_key
+        or api_key == "AIzaSy-PLACEHOLDER-GET-YOUR-OWN-KEY-FROM-GOOGLE-AI-STUDIO"
+    ):
+        raise ValueError(
+            "GOOGLE_GEMINI_API_KEY is required. Get one from https://makersuite.google.com/app/apikey"
+        )
+    return api_key
 
 
 def get_chat_history(user_id: int, session_id: str, limit: int = 10) -> List[Dict]:
@@ -43,6 +79,42 @@ def get_chat_history(user_id: int, session_id: str, limit: int = 10) -> List[Dic
         return []
 
 
+def get_conversation_context(
+    user_id: int, session_id: str, limit: int = 5
+) -> Tuple[List[Dict], Optional[str]]:
+    """
+    Recent turns and the session's rolling summary for the prompt.
+
+    With conversation summaries enabled, the turns the summary does not cover
+    yet come back verbatim (normally just the latest). If the background
+    summariser has fallen more than ``limit`` turns behind, they are folded
+    here first until at most ``limit`` are left; if folding fails, only the
+    last ``limit`` of them are sent. Otherwise this is ``get_chat_history``
+    and no summary.
+    """
+    if not user_id or not session_id:
+        return [], None
+    if not conversation_summary.enabled():
+        return get_chat_history(user_id, session_id, limit=limit), None
+
+    try:
+        # One extra turn tells whether the summariser is behind
+        summary, history = conversation_summary.load(user_id, session_id, limit + 1)
+        while len(history) > limit:
+            try:
+                with stage("llm_wait"):
+                    folded = conversation_summary.update(user_id, session_id, get_api_key())
+            except CircuitOpenError:
+                folded = False
+            if not folded:
+                break
+            summary, history = conversation_summary.load(user_id, session_id, limit + 1)
+        return history[-limit:], summary
+    except Exception as e:
+        print(f"Warning: Could not retrieve conversation summary: {e}")
+        return get_chat_history(user_id, session_id, limit=limit), None
+
+
 def load_resources(base_dir: str) -> str:
     """Load all markdown files and return as a single context string."""
     resources_dir = Path(base_dir)
@@ -51,7 +123,7 @@ def load_resources(base_dir: str) -> str:
     if not resources_dir.exists():
         return ""
 
-    for path in resources_dir.rglob("*.md"):
+    for path in sorted(resources_dir.rglob("*.md")):
         try:
             content = path.read_text(encoding="utf-8")
             filename = path.name
@@ -63,29 +135,38 @@ def load_resources(base_dir: str) -> str:
 
 
 def generate_text_embedding(text: str, api_key: str) -> Optional[List[float]]:
-    """Generate text embedding using Google's text-embedding model."""
-    url = "https://generativelanguage.googleapis.com/v1beta/models/text-embedding-004:embedContent"
-
-    payload = {
-        "model": "models/text-embedding-004",
-        "content": {"parts": [{"text": text}]},
-    }
-
-    headers = {"Content-Type": "application/json", "x-goog-api-key": api_key}
-
+    """Generate a text embedding with the configured provider."""
+    provider = get_provider()
     try:
-        response = requests.post(url, json=payload, headers=headers, timeout=30)
-        response.raise_for_status()
-
-        data = response.json()
-        embedding = data.get("embedding", {}).get("values", [])
-        return embedding if embedding else None
-
+        return embed_flight.do(
+            flight_key(provider.name, provider.embedding_model, text),
+            lambda: track_llm_call(
+                provider.name, "embed", lambda: provider.embed(text, api_key)
+            ),
+        )
+    except CircuitOpenError:
+        raise
     except Exception as e:
         print(f"Warning: Failed to generate embedding: {e}")
         return None
 
 
+def generate_text_embeddings(
+    texts: List[str], api_key: str
+) -> List[Optional[List[float]]]:
+    """Embed several texts in one provider round trip; failed items are None."""
+    provider = get_provider()
+    try:
+        return track_llm_call(
+            provider.name, "embed_batch", lambda: provider.embed_batch(texts, api_key)
+        )
+    except CircuitOpenError:
+        raise
+    except Exception as e:
+        print(f"Warning: Failed to generate batch embeddings: {e}")
+        return [None] * len(texts)
+
+
 def cosine_similarity(vec1: List[float], vec2: List[float]) -> float:
     """Calculate cosine similarity between two vectors."""
     if not vec1 or not vec2 or len(vec1) != len(vec2):
@@ -169,7 +250,9 @@ def load_document_chunks(base_dir: str) -> List[Dict]:
                         {
                             "text": section_text,
                             "source_file": filename,
+                            "source_path": path.relative_to(resources_dir).as_posix(),
                             "chunk_id": f"{filename}_{i}",
+                            "position": i,
                             "header": section.get("header", ""),
                             "embedding": None,  # Will be filled later
                             "file_mtime": path.stat().st_mtime,  # Track file modification time
@@ -187,16 +270,78 @@ def load_document_chunks(base_dir: str) -> List[Dict]:
 
 
 def get_embeddings_cache_path(base_dir: str) -> Path:
-    """Get the path for the embeddings cache file."""
+    """Path of the legacy embeddings pickle; index artifacts live beside it."""
     return Path(base_dir).parent / ".embeddings_cache.pkl"
 
 
+def get_embedding_reduction(base_dir: str) -> Optional[EmbeddingReduction]:
+    """Projection applied to the index last loaded from ``base_dir`` (None if full size)."""
+    return _reductions.get(str(get_embeddings_cache_path(base_dir)))
+
+
+def _reduce_index(base_dir: str, chunks: List[Dict], content_hash: str):
+    cache_path = get_embeddings_cache_path(base_dir)
+    _reductions[str(cache_path)] = reduce_chunks(
+        chunks, cache_path.with_name(".embeddings_projection.npz"), content_hash
+    )
+
+
+def get_embedding_log(base_dir: str) -> EmbeddingLog:
+    """The append-only embedding store shared by the index built from ``base_dir``."""
+    directory = get_embeddings_cache_path(base_dir).with_name(".embeddings_log")
+    log = _embedding_logs.get(str(directory))
+    if log is None:
+        log = _embedding_logs.setdefault(str(directory), EmbeddingLog(directory))
+    return log
+
+
+def get_embedding_store(base_dir: str):
+    """
+    Where ``base_dir``'s vectors are persisted: the local embedding log, or the
+    ``chunks``/``chunk_embeddings`` tables with ``EMBEDDING_STORE=database``.
+    """
+    if chunk_store.backend() == "database":
+        return chunk_store.get_store()
+    return get_embedding_log(base_dir)
+
+
+def _log_embeddings(
+    base_dir: str, chunks: List[Dict], embedding_model: str
+) -> Dict[str, np.ndarray]:
+    """Vectors by chunk text from the local embedding log, to seed an empty database."""
+    log = get_embedding_log(base_dir)
+    if not log.directory.exists():
+        return {}
+    logged = log.load()
+    vectors = {}
+    for chunk in chunks:
+        vector = logged.get(log.key(chunk, embedding_model))
+        if vector is not None:
+            vectors[chunk["text"]] = vector
+    return vectors
+
+
 def load_or_generate_embeddings(
-    base_dir: str, api_key: str, force_refresh: bool = False
+    base_dir: str,
+    api_key: str,
+    force_refresh: bool = False,
+    reembed: Optional[Callable[[Dict], bool]] = None,
+    progress: Optional[Callable[[int, int, int], None]] = None,
 ) -> List[Dict]:
-    """Load existing embeddings or generate new ones for all document chunks."""
-    cache_path = get_embeddings_cache_path(base_dir)
-    chunks = load_document_chunks(base_dir)
+    """
+    Load existing embeddings or generate new ones for all document chunks.
+
+    Vectors come from the embedding store (:func:`get_embedding_store`); only
+    chunks without one are embedded, and each batch is stored as it arrives.
+    ``reembed`` selects chunks whose stored vector is ignored. ``progress`` is
+    called as ``(chunks_done, chunks_to_embed, api_calls)`` after each batch;
+    if it raises, the batches already stored are kept.
+    """
+    chunks, dedup = dedupe_chunks(load_document_chunks(base_dir))
+    if dedup["removed"]:
+        print(
+            f"🧬 Collapsed {dedup['removed']} near-duplicate chunks into {dedup['clusters']} representatives"
+        )
 
     # Create a content hash that includes file modification times
     content_for_hash = []
@@ -205,43 +350,43 @@ def load_or_generate_embeddings(
             {"text": chunk["text"], "file_mtime": chunk.get("file_mtime", 0)}
         )
 
+    # Vectors from different embedding models are not comparable
+    embedding_model = get_provider().embedding_model
     content_hash = hashlib.md5(
-        json.dumps(content_for_hash, sort_keys=True).encode()
+        json.dumps([embedding_model, content_for_hash], sort_keys=True).encode()
     ).hexdigest()
 
-    # Try to load from cache
-    cached_data = None
-    if cache_path.exists() and not force_refresh:
-        try:
-            with open(cache_path, "rb") as f:
-                cached_data = pickle.load(f)
-
-            # Check if content has changed (including file modification times)
-            if cached_data.get("content_hash") == content_hash:
-                print(
-                    f"✅ Using cached embeddings ({len(cached_data.get('chunks', []))} chunks)"
-                )
-                return cached_data.get("chunks", [])
-            else:
-                print("📁 Content changed, updating embeddings...")
-        except Exception as e:
-            print(f"Warning: Failed to load embeddings cache: {e}")
-
-    # Count chunks that need new embeddings
-    existing_embeddings = {}
-    if cached_data and cached_data.get("chunks"):
-        for chunk in cached_data["chunks"]:
-            existing_embeddings[chunk["chunk_id"]] = chunk.get("embedding")
+    store = get_embedding_store(base_dir)
+    keys = [store.key(chunk, embedding_model) for chunk in chunks]
+    stored = {}
+    try:
+        stored = store.load(chunks, embedding_model)
+        if not stored and not isinstance(store, EmbeddingLog):
+            previous = _log_embeddings(base_dir, chunks, embedding_model)
+            records = [
+                (key, previous[chunk["text"]])
+                for chunk, key in zip(chunks, keys)
+                if chunk["text"] in previous
+            ]
+            if records:
+                store.append(records, embedding_model)
+                print(f"📥 Imported {len(records)} embeddings from the embedding log")
+                stored = store.load(chunks, embedding_model)
+    except OSError as e:
+        print(f"Warning: Failed to load embedding store: {e}")
 
     chunks_to_process = []
-    for chunk in chunks:
-        if (
-            chunk["chunk_id"] in existing_embeddings
-            and existing_embeddings[chunk["chunk_id"]]
-        ):
-            chunk["embedding"] = existing_embeddings[chunk["chunk_id"]]
+    for chunk, key in zip(chunks, keys):
+        if key in stored and not force_refresh and not (reembed and reembed(chunk)):
+            chunk["embedding"] = stored[key].tolist()
         else:
-            chunks_to_process.append(chunk)
+            chunks_to_process.append((chunk, key))
+
+    record_cache(
+        "embeddings",
+        hits=len(chunks) - len(chunks_to_process),
+        misses=len(chunks_to_process),
+    )
 
     if chunks_to_process:
         print(
@@ -250,64 +395,98 @@ def load_or_generate_embeddings(
 
         # Process in batches with progress indicators
         batch_size = 10
-        for i in range(0, len(chunks_to_process), batch_size):
-            batch = chunks_to_process[i : i + batch_size]
-            batch_num = (i // batch_size) + 1
-            total_batches = (len(chunks_to_process) + batch_size - 1) // batch_size
+        api_calls = 0
+        try:
+            for i in range(0, len(chunks_to_process), batch_size):
+                batch = chunks_to_process[i : i + batch_size]
+                batch_num = (i // batch_size) + 1
+                total_batches = (len(chunks_to_process) + batch_size - 1) // batch_size
 
-            print(
-                f"📦 Processing batch {batch_num}/{total_batches} ({len(batch)} chunks)"
-            )
+                print(
+                    f"📦 Processing batch {batch_num}/{total_batches} ({len(batch)} chunks)"
+                )
 
-            for j, chunk in enumerate(batch):
-                embedding = generate_text_embedding(chunk["text"], api_key)
-                chunk["embedding"] = embedding
+                try:
+                    api_calls += 1
+                    embeddings = generate_text_embeddings(
+                        [chunk["text"] for chunk, _key in batch], api_key
+                    )
+                except CircuitOpenError as e:
+                    # Provider degraded: leave the rest for the next refresh
+                    print(f"⚠️ {e}")
+                    embeddings = [None] * len(batch)
 
-                if embedding is None:
-                    print(
-                        f"⚠️ Failed to generate embedding for chunk {chunk['chunk_id']}"
+                for (chunk, _key), embedding in zip(batch, embeddings):
+                    chunk["embedding"] = embedding
+
+                    if embedding is None:
+                        print(
+                            f"⚠️ Failed to generate embedding for chunk {chunk['chunk_id']}"
+                        )
+
+                try:
+                    store.append(
+                        [(key, embedding) for (_chunk, key), embedding in zip(batch, embeddings)],
+                        embedding_model,
                     )
+                except OSError as e:
+                    print(f"Warning: Failed to persist embeddings: {e}")
+
+                if progress:
+                    progress(i + len(batch), len(chunks_to_process), api_calls)
+        finally:
+            store.close()
+        print(f"💾 Embeddings persisted ({len(chunks_to_process)} new/changed chunks)")
     else:
         print("✅ All embeddings up to date!")
 
-    # Cache the results
-    try:
-        cache_data = {
-            "content_hash": content_hash,
-            "chunks": chunks,
-            "generated_at": json.dumps({"timestamp": "now"}),
-        }
+    store.maintain(keys)
+    if isinstance(store, EmbeddingLog):
+        # Keep the database's chunk rows (and full-text index) current too
+        chunk_store.sync_corpus(chunks)
 
-        with open(cache_path, "wb") as f:
-            pickle.dump(cache_data, f)
-        print(f"💾 Embeddings cached successfully ({len(chunks)} total chunks)")
+    # The store keeps full-size vectors; only the in-memory index is reduced
+    _reduce_index(base_dir, chunks, content_hash)
+    _record_index_size(chunks)
+    return chunks
 
-    except Exception as e:
-        print(f"Warning: Failed to cache embeddings: {e}")
 
-    return chunks
+def _record_index_size(chunks: List[Dict]):
+    embedded = [chunk["embedding"] for chunk in chunks if chunk.get("embedding")]
+    INDEX_CHUNKS.set(len(embedded), index="knowledge_base")
+    INDEX_DIMENSIONS.set(len(embedded[0]) if embedded else 0, index="knowledge_base")
 
 
 def semantic_search(
-    query: str, chunks: List[Dict], api_key: str, top_k: int = 5
+    query: str,
+    chunks: List[Dict],
+    api_key: str,
+    top_k: int = 5,
 ) -> List[Dict]:
-    """Find the most semantically similar chunks to the query."""
+    """
+    Find the most semantically similar chunks to the query.
+
+    Used for ad-hoc chunk lists (client documents); the knowledge base is
+    searched through :meth:`KnowledgeIndex.search`.
+    """
     # Generate embedding for the query
-    query_embedding = generate_text_embedding(query, api_key)
+    with stage("embedding"):
+        query_embedding = generate_text_embedding(query, api_key)
 
     if not query_embedding:
         print("⚠️ Failed to generate query embedding")
         return []
 
     # Calculate similarities
-    similarities = []
-    for chunk in chunks:
-        if chunk.get("embedding"):
-            similarity = cosine_similarity(query_embedding, chunk["embedding"])
-            similarities.append({"chunk": chunk, "similarity": similarity})
+    with stage("search"):
+        similarities = []
+        for chunk in chunks:
+            if chunk.get("embedding"):
+                similarity = cosine_similarity(query_embedding, chunk["embedding"])
+                similarities.append({"chunk": chunk, "similarity": similarity})
 
-    # Sort by similarity and return top results
-    similarities.sort(key=lambda x: x["similarity"], reverse=True)
+        # Sort by similarity and return top results
+        similarities.sort(key=lambda x: x["similarity"], reverse=True)
 
     print(
         f"🔍 Semantic search processed {len(similarities)} chunks, returning top {top_k}"
@@ -321,117 +500,98 @@ def semantic_search(
 
 
 def call_gemini(
-    prompt: str, api_key: str, model: str = None, timeout: int = 15
+    prompt: str,
+    api_key: str,
+    model: str = None,
+    timeout: int = None,
+    prefix: str = None,
+    cache_tags=(),
 ) -> Tuple[Optional[str], Optional[Dict], Optional[str]]:
-    """Call Gemini API with enhanced error handling."""
-    model = model or os.getenv("GOOGLE_GEMINI_MODEL", "gemini-1.5-flash-latest")
-    url = f"https://generativelanguage.googleapis.com/v1beta/models/{model}:generateContent?key={api_key}"
-
-    payload = {
-        "contents": [{"parts": [{"text": prompt}]}],
-        "generationConfig": {
-            "temperature": 0.3,  # Lower temperature for more consistent analysis
-            "topK": 40,
-            "topP": 0.95,
-            "maxOutputTokens": 2048,  # Increased for detailed analysis
-        },
-        "safetySettings": [
-            {
-                "category": "HARM_CATEGORY_HARASSMENT",
-                "threshold": "BLOCK_MEDIUM_AND_ABOVE",
-            },
-            {
-                "category": "HARM_CATEGORY_HATE_SPEECH",
-                "threshold": "BLOCK_MEDIUM_AND_ABOVE",
-            },
-            {
-                "category": "HARM_CATEGORY_SEXUALLY_EXPLICIT",
-                "threshold": "BLOCK_MEDIUM_AND_ABOVE",
-            },
-            {
-                "category": "HARM_CATEGORY_DANGEROUS_CONTENT",
-                "threshold": "BLOCK_MEDIUM_AND_ABOVE",
-            },
-        ],
-    }
-
-    data = json.dumps(payload)
-    headers = {"Content-Type": "application/json"}
-
-    try:
-        response = requests.post(url, data=data, headers=headers, timeout=timeout)
-        response.raise_for_status()  # Raises HTTPError for bad responses
-        response_data = response.json()
-    except requests.exceptions.HTTPError as e:
-        try:
-            error_data = e.response.json()
-            error_detail = error_data.get("error", {}).get("message", str(e))
-        except:
-            error_detail = f"HTTP {e.response.status_code}: {str(e)}"
-        return None, None, f"API Error: {error_detail}"
-    except Exception as e:
-        return None, None, f"Request Error: {str(e)}"
-
-    # Extract response text
-    try:
-        candidates = response_data.get("candidates", [])
-        if not candidates:
-            return None, None, "No response generated"
-
-        content = candidates[0].get("content", {})
-        parts = content.get("parts", [])
-
-        if not parts:
-            return None, None, "Empty response from AI"
-
-        text = "".join(part.get("text", "") for part in parts).strip()
-
-        if not text:
-            return None, None, "Empty text in response"
-
-    except Exception as e:
-        return None, None, f"Failed to parse response: {str(e)}"
-
-    # Extract usage metadata
-    usage = None
-    try:
-        usage_metadata = response_data.get("usageMetadata", {})
-        if usage_metadata:
-            usage = {
-                "prompt_tokens": usage_metadata.get("promptTokenCount", 0),
-                "completion_tokens": usage_metadata.get("candidatesTokenCount", 0),
-                "total_tokens": usage_metadata.get("totalTokenCount", 0),
-            }
-    except Exception:
-        # Fallback token estimation
-        prompt_tokens = len(prompt.split()) * 1.3
-        completion_tokens = len(text.split()) * 1.3
-        usage = {
-            "prompt_tokens": int(prompt_tokens),
-            "completion_tokens": int(completion_tokens),
-            "total_tokens": int(prompt_tokens + completion_tokens),
-        }
+    """
+    Generate a completion with the configured provider (Gemini by default).
 
-    return text, usage, None
+    ``prefix`` is a stable leading part of the prompt (persona, instructions) that
+    the provider may serve from its context cache; ``cache_tags`` label that cache
+    entry for invalidation. Raises CircuitOpenError when the provider is known to
+    be degraded, so callers can fail fast instead of waiting on a timeout.
+    """
+    provider = get_provider()
+    model = model or provider.generation_model
+
+    def generate():
+        result = track_llm_call(
+            provider.name,
+            "generate",
+            lambda: provider.generate(
+                prompt,
+                api_key,
+                model=model,
+                timeout=timeout,
+                prefix=prefix,
+                cache_tags=cache_tags,
+            ),
+            failed=lambda result: result[2] is not None,
+        )
+        record_tokens(provider.name, result[1])
+        return result
+
+    return generate_flight.do(
+        flight_key(provider.name, model, prefix or "", prompt),
+        generate,
+        # Only successful completions are handed to other workers
+        share=lambda result: result[2] is None,
+        decode=tuple,
+    )
 
 
 def create_analysis_prompt(
-    query: str, all_data: str, chat_history: List[Dict] = None, persona_name: str = None
+    query: str,
+    all_data: str,
+    chat_history: List[Dict] = None,
+    persona_name: str = None,
+    history_summary: str = None,
 ) -> str:
     """Create a comprehensive prompt for LLM-driven analysis with conversation memory and persona support."""
+    prefix, suffix, _persona = build_analysis_prompt(
+        query, all_data, chat_history, persona_name, history_summary=history_summary
+    )
+    return prefix + suffix
 
+
+def _resolve_persona(persona_name: str = None):
+    """The named active persona, else the default, else any active one."""
     # Import here to avoid circular imports
     from .models.persona_models import Persona
 
-    # Get the persona to use
-    if persona_name:
-        persona = Persona.query.filter_by(name=persona_name, is_active=True).first()
-    else:
+    with stage("persona"):
+        if persona_name:
+            return Persona.query.filter_by(name=persona_name, is_active=True).first()
         # Get the default persona
         persona = Persona.query.filter_by(is_default=True, is_active=True).first()
         if not persona:
             # Fallback to any active persona
             persona = Persona.query.filter_by(is_active=True).first()
+        return persona
+
+
+def build_analysis_prompt(
+    query: str,
+    all_data: str,
+    chat_history: List[Dict] = None,
+    persona_name: str = None,
+    pinned_data: str = None,
+    history_summary: str = None,
+):
+    """
+    Build the analysis prompt as ``(prefix, suffix, persona)``.
+
+    The prefix (persona block, instructions and optional ``pinned_data``) is the
+    same for every request with that persona, so providers can cache it; the
+    suffix carries the conversation (``history_summary`` of earlier turns, then
+    ``chat_history`` verbatim), retrieved context and question.
+    """
+
+    persona = _resolve_persona(persona_name)
 
     # Build the persona-specific prompt
     persona_prompt = ""
@@ -451,27 +611,25 @@ def create_analysis_prompt(
 
     # Build conversation context
     conversation_context = ""
+    if history_summary:
+        conversation_context = (
+            f"\n## Conversation Summary (earlier turns):\n{history_summary}\n"
+        )
     if chat_history:
-        conversation_context = "\n## Recent Conversation History:\n"
-        for chat in chat_history[-3:]:  # Last 3 exchanges
+        conversation_context += "\n## Recent Conversation History:\n"
+        # Last 3 exchanges, or the (bounded) turns the rolling summary does not cover
+        recent = chat_history if conversation_summary.enabled() else chat_history[-3:]
+        for chat in recent:
             conversation_context += (
                 f"Human: {chat['message']}\nAssistant: {chat['response']}\n\n"
             )
         conversation_context += "---\n"
 
-    # Create the complete prompt
-    prompt = f"""{persona_prompt}
+    # Stable prefix: identical for every request with this persona
+    prefix = f"""{persona_prompt}
 
 You are analyzing the following knowledge base to answer user questions. Use the provided data to give accurate, detailed, and helpful responses.
 
-{conversation_context}
-
-## Knowledge Base Context:
-{all_data}
-
-## User Question:
-{query}
-
 ## Instructions:
 1. Analyze the provided knowledge base content carefully
 2. Answer the user's question directly and comprehensively
@@ -479,12 +637,35 @@ You are analyzing the following knowledge base to answer user questions. Use the
 4. If the information isn't in the knowledge base, say so clearly
 5. Provide practical, actionable advice when appropriate
 6. Keep your response focused and well-structured
+"""
+    if pinned_data:
+        prefix += f"""
+## Knowledge Base Context:
+{pinned_data}
+"""
+
+    suffix = f"""
+{conversation_context}
+"""
+    if all_data:
+        suffix += f"""
+## Knowledge Base Context:
+{all_data}
+"""
+    suffix += f"""
+## User Question:
+{query}
 
 Please provide a helpful response:"""
 
-    return prompt
+    return prefix, suffix, persona
+
 
+def _persona_cache_tags(persona) -> Tuple[str, ...]:
+    return (f"persona:{persona.id}",) if persona is not None else ()
 
+
+@timed_request
 def answer_query_with_client_documents(
     query: str,
     documents: list,
@@ -509,16 +690,7 @@ def answer_query_with_client_documents(
     Returns:
         tuple: (response, source_info, context)
     """
-    api_key = os.getenv("GOOGLE_GEMINI_API_KEY", "").strip()
-
-    # Require API key - no fallback
-    if (
-        not api_key
-        or api_key == "AIzaSy-PLACEHOLDER-GET-YOUR-OWN-KEY-FROM-GOOGLE-AI-STUDIO"
-    ):
-        raise ValueError(
-            "GOOGLE_GEMINI_API_KEY is required. Get one from https://makersuite.google.com/app/apikey"
-        )
+    api_key = get_api_key()
 
     try:
         # Early return if no documents provided
@@ -539,15 +711,12 @@ def answer_query_with_client_documents(
 
         print(f"🔍 Processing {len(documents)} documents/chunks for user {user_id}")
 
-        # Since the client may have already done semantic search and sent us
-        # the most relevant chunks, we can use them directly without additional filtering
-        relevant_data = "\n\n".join(
-            [
-                f"# From: {doc.get('filename', 'unknown')}\n{doc.get('content', '')}"
-                for doc in documents
-                if doc.get("content", "").strip()
-            ]
-        )
+        # Pre-selected chunks that fit the token budget are used as sent; anything
+        # larger is chunked, ranked and packed server-side
+        with stage("search"):
+            relevant_data, source_file, packing = pack_client_documents(
+                query, documents, api_key
+            )
 
         if not relevant_data.strip():
             no_content_response = "The provided documents appear to be empty or contain no readable content."
@@ -564,24 +733,22 @@ def answer_query_with_client_documents(
                 },
             )
 
-        # Get source file info from the first document
-        source_file = documents[0].get("filename", "unknown") if documents else None
-
         # Get conversation history for context
-        chat_history = (
-            get_chat_history(user_id, session_id, limit=5)
-            if user_id and session_id
-            else []
-        )
+        with stage("history"):
+            chat_history, history_summary = get_conversation_context(user_id, session_id)
 
         # Create comprehensive analysis prompt with conversation memory, relevant data, and persona
-        prompt = create_analysis_prompt(
-            query, relevant_data, chat_history, persona_name
-        )
+        with stage("prompt_build"):
+            prefix, prompt, persona = build_analysis_prompt(
+                query, relevant_data, chat_history, persona_name, history_summary=history_summary
+            )
 
         # Get AI analysis using existing Gemini call
         print(f"🤖 Using LLM-driven analysis with client documents for query: {query}")
-        response_text, usage, error = call_gemini(prompt, api_key)
+        with stage("llm_wait"):
+            response_text, usage, error = call_gemini(
+                prompt, api_key, prefix=prefix, cache_tags=_persona_cache_tags(persona)
+            )
 
         if error:
             raise RuntimeError(f"Gemini API failed: {error}")
@@ -589,52 +756,54 @@ def answer_query_with_client_documents(
         if not response_text:
             raise RuntimeError("Empty response from Gemini API")
 
-        # Extract follow-up suggestions if present (same logic as existing function)
-        follow_up_suggestions = []
-        if "🤔 You might also want to ask:" in response_text:
-            # Split response to separate main content from suggestions
-            parts = response_text.split("## 🤔 You might also want to ask:")
-            if len(parts) > 1:
-                main_response = parts[0].strip()
-                suggestions_text = parts[1].strip()
-
-                # Extract bullet points as suggestions
-                for line in suggestions_text.split("\n"):
-                    line = line.strip()
-                    if line.startswith("- ") or line.startswith("* "):
-                        suggestion = line[2:].strip()
-                        if suggestion:
-                            follow_up_suggestions.append(suggestion)
-
-                # Use main response without suggestions for display
-                response_text = main_response
-
-        # Get persona information for metadata (same logic as existing function)
-        from .models.persona_models import Persona
-
-        current_persona_data = None
-        if persona_name:
-            persona = Persona.query.filter_by(name=persona_name, is_active=True).first()
-            if persona:
-                current_persona_data = {
-                    "name": persona.name,
-                    "display_name": persona.display_name,
-                    "description": persona.description,
-                    "expertise_areas": persona.expertise_areas or [],
-                }
-
-        if not current_persona_data:
-            # Get default persona
-            default_persona = Persona.query.filter_by(
-                is_default=True, is_active=True
-            ).first()
-            if default_persona:
-                current_persona_data = {
-                    "name": default_persona.name,
-                    "display_name": default_persona.display_name,
-                    "description": default_persona.description,
-                    "expertise_areas": default_persona.expertise_areas or [],
-                }
+        with stage("post_processing"):
+            # Extract follow-up suggestions if present (same logic as existing function)
+            follow_up_suggestions = []
+            if "🤔 You might also want to ask:" in response_text:
+                # Split response to separate main content from suggestions
+                parts = response_text.split("## 🤔 You might also want to ask:")
+                if len(parts) > 1:
+                    main_response = parts[0].strip()
+                    suggestions_text = parts[1].strip()
+
+                    # Extract bullet points as suggestions
+                    for line in suggestions_text.split("\n"):
+                        line = line.strip()
+                        if line.startswith("- ") or line.startswith("* "):
+                            suggestion = line[2:].strip()
+                            if suggestion:
+                                follow_up_suggestions.append(suggestion)
+
+                    # Use main response without suggestions for display
+                    response_text = main_response
+
+        with stage("persona"):
+            # Get persona information for metadata (same logic as existing function)
+            from .models.persona_models import Persona
+
+            current_persona_data = None
+            if persona_name:
+                persona = Persona.query.filter_by(name=persona_name, is_active=True).first()
+                if persona:
+                    current_persona_data = {
+                        "name": persona.name,
+                        "display_name": persona.display_name,
+                        "description": persona.description,
+                        "expertise_areas": persona.expertise_areas or [],
+                    }
+
+            if not current_persona_data:
+                # Get default persona
+                default_persona = Persona.query.filter_by(
+                    is_default=True, is_active=True
+                ).first()
+                if default_persona:
+                    current_persona_data = {
+                        "name": default_persona.name,
+                        "display_name": default_persona.display_name,
+                        "description": default_persona.description,
+                        "expertise_areas": default_persona.expertise_areas or [],
+                    }
 
         print(
             f"✅ Generated response using {len(documents)} document chunks from client"
@@ -655,9 +824,13 @@ def answer_query_with_client_documents(
                 "persona": current_persona_data,
                 "client_documents": True,
                 "documents_count": len(documents),
+                "context_packing": packing,
             },
         )
 
+    except CircuitOpenError:
+        # The route answers 503 with Retry-After instead of a canned reply
+        raise
     except Exception as e:
         print(f"❌ Error in answer_query_with_client_documents: {str(e)}")
         error_response = (
@@ -716,12 +889,22 @@ def split_text_into_chunks(text: str, chunk_size: int = 1000, overlap: int = 200
 
 
 def find_relevant_chunks_from_documents(
-    query: str, document_chunks: list, top_k: int = 10
+    query: str, document_chunks: list = None, top_k: int = 10
 ):
     """
     Find the most relevant document chunks for a given query using keyword-based similarity.
     Fallback when semantic search is not available.
+
+    Without ``document_chunks`` the knowledge base is searched through its
+    on-disk FTS5 index, ranked by BM25 (empty if the index is unavailable).
     """
+    if document_chunks is None:
+        try:
+            return chunk_store.keyword_search(query, top_k)
+        except Exception as e:
+            print(f"❌ Error in knowledge-base keyword search: {str(e)}")
+            return []
+
     try:
         # Simple keyword-based relevance scoring
         query_words = set(query.lower().split())
@@ -747,6 +930,108 @@ def find_relevant_chunks_from_documents(
         return []
 
 
+def pack_client_documents(
+    query: str, documents: list, api_key: str
+) -> Tuple[str, Optional[str], Dict]:
+    """
+    Bound client-supplied documents to CLIENT_DOCS_TOKEN_BUDGET prompt tokens.
+
+    Documents that already fit are used as sent (clients usually send pre-selected
+    chunks). Otherwise they are split into chunks, ranked lexically, optionally
+    re-ranked by embedding similarity, and the best chunks are packed greedily
+    into the budget in rank order.
+
+    Returns:
+        tuple: (context_text, source_file, packing_info)
+    """
+    budget = int(os.getenv("CLIENT_DOCS_TOKEN_BUDGET", "6000"))
+    max_chars = int(os.getenv("CLIENT_DOCS_MAX_CHARS", "2000000"))
+    candidates_limit = int(os.getenv("CLIENT_DOCS_RERANK_CANDIDATES", "40"))
+    vector_rerank = os.getenv("CLIENT_DOCS_VECTOR_RERANK", "true").lower() == "true"
+
+    documents = [
+        {"filename": doc.get("filename", "unknown"), "content": doc.get("content", "")}
+        for doc in documents
+        if isinstance(doc, dict) and str(doc.get("content", "")).strip()
+    ]
+    # Anything past max_chars is never scored or sent, whichever path is taken
+    remaining_chars = max_chars
+    for doc in documents:
+        doc["content"] = doc["content"][: max(remaining_chars, 0)]
+        remaining_chars -= len(doc["content"])
+    documents = [doc for doc in documents if doc["content"]]
+    sections = [f"# From: {doc['filename']}\n{doc['content']}" for doc in documents]
+    total_tokens = sum(estimate_tokens(section) for section in sections)
+
+    if total_tokens <= budget:
+        return (
+            "\n\n".join(sections),
+            documents[0]["filename"] if documents else None,
+            {"context_tokens": total_tokens, "packed": False},
+        )
+
+    # Chunk server-side
+    chunks = []
+    for doc in documents:
+        for index, text in enumerate(split_text_into_chunks(doc["content"])):
+            chunks.append(
+                {"text": text, "source_file": doc["filename"], "chunk_index": index}
+            )
+
+    ranked = find_relevant_chunks_from_documents(query, chunks, top_k=candidates_limit)
+    if len(ranked) < candidates_limit:
+        # Keep document order for chunks without keyword overlap
+        seen = {id(chunk) for chunk in ranked}
+        ranked += [chunk for chunk in chunks if id(chunk) not in seen][
+            : candidates_limit - len(ranked)
+        ]
+
+    if vector_rerank and len(ranked) > 1:
+        try:
+            with stage("embedding"):
+                embeddings = generate_text_embeddings(
+                    [chunk["text"] for chunk in ranked], api_key
+                )
+        except CircuitOpenError:
+            embeddings = []
+        if embeddings and all(embeddings):
+            for chunk, embedding in zip(ranked, embeddings):
+                chunk["embedding"] = embedding
+            ranked = semantic_search(query, ranked, api_key, top_k=len(ranked)) or ranked
+
+    packed, used_tokens = [], 0
+    for chunk in ranked:
+        section = f"# From: {chunk['source_file']}\n{chunk['text']}"
+        tokens = estimate_tokens(section)
+        if used_tokens + tokens > budget:
+            continue
+        packed.append(section)
+        used_tokens += tokens
+
+    if not packed and ranked:
+        # A single chunk larger than the budget: truncate it by characters, then
+        # by words, so neither side of estimate_tokens exceeds the budget
+        section = f"# From: {ranked[0]['source_file']}\n{ranked[0]['text']}"[: budget * 4]
+        packed = [" ".join(section.split(" ")[: int(budget / 1.3)])]
+        used_tokens = estimate_tokens(packed[0])
+
+    print(
+        f"📦 Packed {len(packed)}/{len(chunks)} client chunks into {used_tokens}/{budget} tokens"
+    )
+    return (
+        "\n\n".join(packed),
+        ranked[0]["source_file"] if ranked else None,
+        {
+            "context_tokens": used_tokens,
+            "packed": True,
+            "original_tokens": total_tokens,
+            "chunks_considered": len(chunks),
+            "chunks_packed": len(packed),
+        },
+    )
+
+
+@timed_request
 def answer_query(
     query: str,
     user_id: int = None,
@@ -765,16 +1050,7 @@ def answer_query(
     Returns:
         tuple: (response_text, source_info, metadata)
     """
-    api_key = os.getenv("GOOGLE_GEMINI_API_KEY", "").strip()
-
-    # Require API key - no fallback
-    if (
-        not api_key
-        or api_key == "AIzaSy-PLACEHOLDER-GET-YOUR-OWN-KEY-FROM-GOOGLE-AI-STUDIO"
-    ):
-        raise ValueError(
-            "GOOGLE_GEMINI_API_KEY is required. Get one from https://makersuite.google.com/app/apikey"
-        )
+    api_key = get_api_key()
 
     # Define the static path to the knowledge base resources
     current_dir = Path(__file__).parent
@@ -786,42 +1062,76 @@ def answer_query(
     # Use semantic search to find relevant content
     print(f"🔍 Using semantic search for query: {query}")
 
-    # Load or generate embeddings for all documents
-    chunks = load_or_generate_embeddings(str(resources_base), api_key)
+    # Loaded once per worker and reloaded only when the corpus changes
+    with stage("search"):
+        index = get_index(api_key, resources_base)
 
-    if not chunks:
+    if not index.total_chunks:
         raise ValueError(
             "No knowledge documents found. Add Markdown files to the resources directory."
         )
 
-    # Find semantically relevant chunks
-    relevant_chunks = semantic_search(query, chunks, api_key, top_k=5)
+    # Small knowledge bases can be pinned whole into the cacheable prefix; the
+    # pinned text is read once per index generation and replaces retrieval
+    pinned_data = None
+    if os.getenv("CONTEXT_CACHE_PIN_KNOWLEDGE_BASE", "false").lower() == "true":
+        pinned_data = index.pinned_text()
+
+    relevant_chunks, relevant_data, source_file, compression = [], "", None, None
+    if not pinned_data:
+        # Find semantically relevant chunks
+        with stage("embedding"):
+            query_embedding = generate_text_embedding(query, api_key)
+        if not query_embedding:
+            print("⚠️ Failed to generate query embedding")
+        with stage("search"):
+            (relevant_chunks,) = index.search([query_embedding], top_k=5)
+        print(f"🔍 Semantic search processed {len(index)} chunks, returning top 5")
+        for i, chunk in enumerate(relevant_chunks[:3]):  # Show top 3 similarities
+            print(f"  {i+1}. {chunk['source_file']} (similarity: {chunk['similarity']:.3f})")
+
+        if not relevant_chunks:
+            # No usable query embedding: fall back to the full-text index
+            with stage("search"):
+                relevant_chunks = find_relevant_chunks_from_documents(query, top_k=5)
+            print(f"🔤 Keyword search returned {len(relevant_chunks)} chunks")
+
+        if not relevant_chunks:
+            raise ValueError(f"No relevant content found for query: {query}")
+
+        # Keep only the sentences that bear on the question
+        with stage("prompt_build"):
+            context_chunks, compression = compress_context(
+                query, relevant_chunks, api_key, query_embedding
+            )
 
-    if not relevant_chunks:
-        raise ValueError(f"No relevant content found for query: {query}")
+        # Combine relevant chunks into context
+        relevant_data = format_knowledge_chunks(context_chunks)
 
-    # Combine relevant chunks into context
-    relevant_data = "\n\n".join(
-        [
-            f"# From: {chunk['source_file']}\n{chunk['text']}"
-            for chunk in relevant_chunks
-        ]
-    )
-
-    # Get source file info from the most relevant chunk
-    source_file = relevant_chunks[0]["source_file"]
+        # Get source file info from the most relevant chunk
+        source_file = relevant_chunks[0]["source_file"]
 
     # Get conversation history for context
-    chat_history = (
-        get_chat_history(user_id, session_id, limit=5) if user_id and session_id else []
-    )
+    with stage("history"):
+        chat_history, history_summary = get_conversation_context(user_id, session_id)
 
     # Create comprehensive analysis prompt with conversation memory, relevant data, and persona
-    prompt = create_analysis_prompt(query, relevant_data, chat_history, persona_name)
+    with stage("prompt_build"):
+        prefix, prompt, persona = build_analysis_prompt(
+            query,
+            None if pinned_data else relevant_data,
+            chat_history,
+            persona_name,
+            pinned_data=pinned_data,
+            history_summary=history_summary,
+        )
 
     # Get AI analysis
     print(f"🤖 Using LLM-driven analysis with semantic search for query: {query}")
-    response_text, usage, error = call_gemini(prompt, api_key)
+    with stage("llm_wait"):
+        response_text, usage, error = call_gemini(
+            prompt, api_key, prefix=prefix, cache_tags=_persona_cache_tags(persona)
+        )
 
     if error:
         raise RuntimeError(f"Gemini API failed: {error}")
@@ -829,52 +1139,39 @@ def answer_query(
     if not response_text:
         raise RuntimeError("Empty response from Gemini API")
 
-    # Extract follow-up suggestions if present
-    follow_up_suggestions = []
-    if "🤔 You might also want to ask:" in response_text:
-        # Split response to separate main content from suggestions
-        parts = response_text.split("## 🤔 You might also want to ask:")
-        if len(parts) > 1:
-            main_response = parts[0].strip()
-            suggestions_text = parts[1].strip()
-
-            # Extract bullet points as suggestions
-            for line in suggestions_text.split("\n"):
-                line = line.strip()
-                if line.startswith("- ") or line.startswith("* "):
-                    suggestion = line[2:].strip()
-                    if suggestion:
-                        follow_up_suggestions.append(suggestion)
-
-            # Use main response without suggestions for display
-            response_text = main_response
-
-    # Get persona information for metadata
-    from .models.persona_models import Persona
+    with stage("post_processing"):
+        # Extract follow-up suggestions if present
+        response_text, follow_up_suggestions = _split_follow_up_suggestions(
+            response_text
+        )
 
-    current_persona_data = None
-    if persona_name:
-        persona = Persona.query.filter_by(name=persona_name, is_active=True).first()
-        if persona:
-            current_persona_data = {
-                "name": persona.name,
-                "display_name": persona.display_name,
-                "description": persona.description,
-                "expertise_areas": persona.expertise_areas or [],
-            }
+    with stage("persona"):
+        # Get persona information for metadata
+        from .models.persona_models import Persona
 
-    if not current_persona_data:
-        # Get default persona
-        default_persona = Persona.query.filter_by(
-            is_default=True, is_active=True
-        ).first()
-        if default_persona:
-            current_persona_data = {
-                "name": default_persona.name,
-                "display_name": default_persona.display_name,
-                "description": default_persona.description,
-                "expertise_areas": default_persona.expertise_areas or [],
-            }
+        current_persona_data = None
+        if persona_name:
+            persona = Persona.query.filter_by(name=persona_name, is_active=True).first()
+            if persona:
+                current_persona_data = {
+                    "name": persona.name,
+                    "display_name": persona.display_name,
+                    "description": persona.description,
+                    "expertise_areas": persona.expertise_areas or [],
+                }
+
+        if not current_persona_data:
+            # Get default persona
+            default_persona = Persona.query.filter_by(
+                is_default=True, is_active=True
+            ).first()
+            if default_persona:
+                current_persona_data = {
+                    "name": default_persona.name,
+                    "display_name": default_persona.display_name,
+                    "description": default_persona.description,
+                    "expertise_areas": default_persona.expertise_areas or [],
+                }
 
     return (
         response_text,
@@ -884,15 +1181,243 @@ def answer_query(
             or {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
             "ai_generated": True,
             "query": query,
-            "data_length": len(relevant_data),
+            "data_length": len(pinned_data or relevant_data),
             "follow_up_suggestions": follow_up_suggestions,
-            "semantic_search": True,
+            "semantic_search": not pinned_data,
             "relevant_chunks": len(relevant_chunks),
+            "context_compression": compression,
             "persona": current_persona_data,
         },
     )
 
 
+def compress_context(
+    query: str, chunks: List[Dict], api_key: str, query_embedding=None
+) -> Tuple[List[Dict], Dict]:
+    """Cut retrieved chunks down to their most relevant sentences (see context_compression)."""
+
+    def embed(texts: List[str]):
+        try:
+            with stage("embedding"):
+                return generate_text_embeddings(texts, api_key)
+        except CircuitOpenError:
+            return []
+
+    compressed, stats = compress_chunks(query, chunks, query_embedding, embed)
+    if stats["compressed"]:
+        print(
+            f"✂️ Compressed context from {stats['original_tokens']} to "
+            f"{stats['context_tokens']} tokens ({stats['sentences_kept']}/"
+            f"{stats['sentences']} sentences, {stats['scorer']})"
+        )
+    return compressed, stats
+
+
+def format_knowledge_chunks(chunks: List[Dict]) -> str:
+    """Prompt context for retrieved chunks, naming every file a deduplicated chunk came from."""
+    sections = []
+    for chunk in chunks:
+        source = chunk["source_file"]
+        copies = sorted(
+            {d["source_file"] for d in chunk.get("duplicates") or []} - {source}
+        )
+        if copies:
+            source += f" (also in: {', '.join(copies)})"
+        sections.append(f"# From: {source}\n{chunk['text']}")
+    return "\n\n".join(sections)
+
+
+def _split_follow_up_suggestions(response_text: str) -> Tuple[str, List[str]]:
+    """Separate the "You might also want to ask" bullets from the answer body."""
+    parts = response_text.split("## 🤔 You might also want to ask:")
+    if len(parts) < 2:
+        return response_text, []
+    suggestions = []
+    for line in parts[1].strip().split("\n"):
+        line = line.strip()
+        if line.startswith("- ") or line.startswith("* "):
+            suggestion = line[2:].strip()
+            if suggestion:
+                suggestions.append(suggestion)
+    return parts[0].strip(), suggestions
+
+
+def top_k_rows(query_matrix: np.ndarray, matrix: np.ndarray, k: int) -> List[np.ndarray]:
+    """
+    Row indices of ``matrix`` most similar to each query row, best first.
+
+    ``matrix`` rows must be unit length; queries are normalised here. Ties keep
+    index order, as the stable sort in :func:`semantic_search` does.
+    """
+    norms = np.linalg.norm(query_matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    scores = (query_matrix / norms) @ matrix.T
+    k = min(k, matrix.shape[0])
+    if k <= 0:
+        return [np.zeros(0, dtype=np.int64) for _ in range(len(query_matrix))]
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    ordered = []
+    for row in range(len(query_matrix)):
+        candidates = np.sort(top[row])
+        ordered.append(candidates[np.argsort(-scores[row, candidates], kind="stable")])
+    return ordered
+
+
+def rank_rows(
+    query_matrix: np.ndarray,
+    matrix: np.ndarray,
+    top_k: int,
+    reduction: Optional[EmbeddingReduction] = None,
+    full_rows: np.ndarray = None,
+) -> List[np.ndarray]:
+    """
+    :func:`top_k_rows` for full-size query embeddings against a possibly reduced
+    ``matrix``. With a ``reduction`` the queries are projected first and, when it
+    re-ranks, a deeper candidate list is rescored at full size; ``full_rows``
+    maps ``matrix`` rows to rows of the reduction's full vectors.
+    """
+    if reduction is None:
+        return top_k_rows(query_matrix, matrix, top_k)
+    if not reduction.can_rerank:
+        return top_k_rows(reduction.project(query_matrix), matrix, top_k)
+
+    depth = max(top_k, reduction.rerank_candidates)
+    ranked = []
+    for query, order in zip(
+        query_matrix, top_k_rows(reduction.project(query_matrix), matrix, depth)
+    ):
+        scores = reduction.full_scores(query, full_rows[order])
+        ranked.append(order[np.argsort(-scores, kind="stable")][:top_k])
+    return ranked
+
+
+def answer_queries_batch(
+    queries: List[str],
+    user_id: int = None,
+    session_id: str = None,
+    persona_name: str = None,
+    top_k: int = 5,
+    max_concurrency: int = None,
+):
+    """
+    Answer many independent questions with one persona.
+
+    Retrieval is batched (one embedding call, one matrix product) and runs before this
+    returns, so provider or knowledge-base failures raise immediately. Context
+    compression, prompt building and generation are then fanned out over at
+    most ``max_concurrency`` threads (``CHAT_BATCH_MAX_CONCURRENCY``).
+
+    Returns:
+        tuple: (persona metadata, iterator of per-question results in completion
+        order, each carrying its ``index`` in ``queries``)
+    """
+    import time
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+    from flask import current_app
+
+    api_key = get_api_key()
+    resources_base = Path(__file__).parent / "resources"
+    if not resources_base.exists():
+        raise ValueError(f"Knowledge base directory not found at {resources_base}")
+
+    with stage("search"):
+        index = get_index(api_key, resources_base)
+    if not index.total_chunks:
+        raise ValueError(
+            "No knowledge documents found. Add Markdown files to the resources directory."
+        )
+
+    # One embedding call and one matrix-matrix product for every question
+    with stage("embedding"):
+        embeddings = generate_text_embeddings(queries, api_key)
+    with stage("search"):
+        retrieved = index.search(embeddings, top_k=top_k)
+
+    with stage("history"):
+        chat_history, history_summary = get_conversation_context(user_id, session_id)
+
+    persona = _resolve_persona(persona_name)
+    persona_data = None
+    if persona is not None:
+        persona_data = {
+            "name": persona.name,
+            "display_name": persona.display_name,
+            "description": persona.description,
+            "expertise_areas": persona.expertise_areas or [],
+        }
+    cache_tags = _persona_cache_tags(persona)
+
+    if max_concurrency is None:
+        max_concurrency = int(os.getenv("CHAT_BATCH_MAX_CONCURRENCY", "4"))
+    max_concurrency = max(1, min(max_concurrency, len(queries)))
+
+    # Workers look up the persona while building their prompt
+    app = current_app._get_current_object()
+
+    def answer_one(index: int) -> Dict:
+        query, relevant_chunks = queries[index], retrieved[index]
+        result = {"index": index, "query": query}
+        if not relevant_chunks:
+            result["error"] = "No relevant content found"
+            return result
+        try:
+            # Compression may embed the sentences, so it runs here, not before
+            # the first result can stream
+            context_chunks, _compression = compress_context(
+                query, relevant_chunks, api_key, embeddings[index]
+            )
+            with app.app_context():
+                prefix, prompt, _persona = build_analysis_prompt(
+                    query,
+                    format_knowledge_chunks(context_chunks),
+                    chat_history,
+                    persona_name,
+                    history_summary=history_summary,
+                )
+            response_text, usage, error = call_gemini(
+                prompt, api_key, prefix=prefix, cache_tags=cache_tags
+            )
+        except CircuitOpenError as e:
+            result["error"] = str(e)
+            return result
+        if error or not response_text:
+            result["error"] = f"Gemini API failed: {error or 'empty response'}"
+            return result
+        response_text, follow_up_suggestions = _split_follow_up_suggestions(response_text)
+        result.update(
+            {
+                "response": response_text,
+                "source_file": relevant_chunks[0]["source_file"],
+                "token_usage": usage
+                or {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+                "follow_up_suggestions": follow_up_suggestions,
+                "relevant_chunks": len(relevant_chunks),
+            }
+        )
+        return result
+
+    # Generation runs on pool threads while the caller streams; its wall-clock
+    # time is added to the caller's timer as llm_wait
+    timer = current_timer()
+
+    def results():
+        print(f"🤖 Answering {len(queries)} questions with concurrency {max_concurrency}")
+        started = time.perf_counter()
+        pool = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="chat-batch")
+        try:
+            futures = [pool.submit(answer_one, i) for i in range(len(queries))]
+            for future in as_completed(futures):
+                yield future.result()
+        finally:
+            # A disconnected client closes the generator: drop the queued calls
+            # instead of generating (and paying for) answers nobody reads
+            pool.shutdown(wait=False, cancel_futures=True)
+            if timer is not None:
+                timer.add("llm_wait", time.perf_counter() - started)
+
+    return persona_data, results()
+
+
 def index_resource_document(resource):
     """
     Index a resource document (embedding, vector DB, etc.).
@@ -906,7 +1431,9 @@ def index_resource_document(resource):
     try:
         # Get API key from environment
         api_key = os.getenv("GOOGLE_GEMINI_API_KEY", "").strip()
-        if not api_key or api_key.startswith("AIzaSy-PLACEHOLDER"):
+        if get_provider().requires_api_key and (
+            not api_key or api_key.startswith("AIzaSy-PLACEHOLDER")
+        ):
             return "GOOGLE_GEMINI_API_KEY not set"
 
         # Read file content
@@ -0,0 +1,215 @@
+"""
+Admin-triggered knowledge-base rebuilds running in the background.
+
+``POST /api/admin/reindex`` starts a :class:`ReindexJob` in a thread of the
+worker that received it; the job builds and publishes a new index generation
+(:func:`knowledge_index.refresh_index`), which every other worker maps on its
+next freshness check, so no restart is needed. Options:
+
+* ``mode`` - ``incremental`` reuses the live generation when it is current and
+  otherwise embeds only new or changed chunks; ``full`` always writes a new
+  generation (re-chunking the corpus and refitting any reduction)
+* ``force_reembed`` - discard cached vectors and embed again
+* ``subdirectory`` - limit ``force_reembed`` to chunks from this folder of the
+  knowledge base (implies ``force_reembed`` for it)
+
+Job state is a small JSON file under ``.index/jobs/`` so that
+``GET /api/admin/reindex/<job_id>`` and cancellation work from any worker on
+the host. Cancellation is checked after every embedding batch; vectors already
+generated are kept in the embedding log and the live generation is left
+untouched.
+"""
+
+import os
+import json
+import time
+import uuid
+import logging
+import threading
+from pathlib import Path
+from typing import Dict, Optional
+
+from .knowledge_index import DEFAULT_RESOURCES_DIR, atomic_write_bytes, index_root
+from .metrics import _pid_alive
+
+logger = logging.getLogger(__name__)
+
+MODES = ("incremental", "full")
+FINISHED = ("succeeded", "failed", "cancelled")
+# Job files older than this are removed when a new job starts
+JOB_RETENTION_SECONDS = 7 * 24 * 3600
+
+
+class ReindexCancelled(Exception):
+    pass
+
+
+def _jobs_dir(base_dir) -> Path:
+    return index_root(base_dir) / "jobs"
+
+
+def _job_path(base_dir, job_id: str) -> Optional[Path]:
+    # Job ids are uuid4 hex; anything else cannot name a job file
+    if len(job_id) != 32 or not all(c in "0123456789abcdef" for c in job_id):
+        return None
+    return _jobs_dir(base_dir) / f"{job_id}.json"
+
+
+class ReindexJob:
+    def __init__(self, options: Dict, requested_by: str = None, base_dir=None):
+        self.id = uuid.uuid4().hex
+        self.base_dir = str(base_dir or DEFAULT_RESOURCES_DIR)
+        self.options = options
+        self.state = {
+            "job_id": self.id,
+            "status": "queued",
+            "options": options,
+            "requested_by": requested_by,
+            "pid": os.getpid(),
+            "created_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+            "chunks_to_embed": 0,
+            "chunks_processed": 0,
+            "api_calls": 0,
+            "generation": None,
+            "error": None,
+        }
+        self._last_saved = 0.0
+
+    def _save(self):
+        path = _job_path(self.base_dir, self.id)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        atomic_write_bytes(path, json.dumps(self.state).encode("utf-8"))
+        self._last_saved = time.monotonic()
+
+    def _cancel_requested(self) -> bool:
+        return _cancel_marker(self.base_dir, self.id).exists()
+
+    def _progress(self, processed: int, total: int, api_calls: int):
+        self.state.update(chunks_processed=processed, chunks_to_embed=total, api_calls=api_calls)
+        if self._cancel_requested():
+            raise ReindexCancelled()
+        if time.monotonic() - self._last_saved >= 0.5 or processed == total:
+            self._save()
+
+    def _reembed_filter(self):
+        subdirectory = self.options.get("subdirectory")
+        if subdirectory:
+            prefix = subdirectory.rstrip("/") + "/"
+            return lambda chunk: (chunk.get("source_path") or "").startswith(prefix)
+        return None
+
+    def run(self, api_key: str):
+        from .knowledge_index import refresh_index
+
+        self.state.update(status="running", started_at=time.time())
+        self._save()
+        try:
+            if self._cancel_requested():
+                raise ReindexCancelled()
+            reembed = self._reembed_filter()
+            index = refresh_index(
+                api_key,
+                self.base_dir,
+                force_refresh=self.options["force_reembed"] and reembed is None,
+                rebuild=self.options["mode"] == "full",
+                reembed=reembed,
+                progress=self._progress,
+            )
+            self.state.update(
+                status="succeeded", generation=index.directory.name, index=index.stats()
+            )
+        except ReindexCancelled:
+            self.state["status"] = "cancelled"
+        except Exception as e:
+            logger.exception("reindex job %s failed", self.id)
+            self.state.update(status="failed", error=str(e))
+        finally:
+            self.state["finished_at"] = time.time()
+            self._save()
+            _cancel_marker(self.base_dir, self.id).unlink(missing_ok=True)
+
+    def start(self, api_key: str) -> "ReindexJob":
+        _prune_jobs(self.base_dir)
+        self._save()
+        threading.Thread(
+            target=self.run, args=(api_key,), name=f"reindex-{self.id[:8]}", daemon=True
+        ).start()
+        return self
+
+
+def _cancel_marker(base_dir, job_id: str) -> Path:
+    return _jobs_dir(base_dir) / f"{job_id}.cancel"
+
+
+def _prune_jobs(base_dir):
+    directory = _jobs_dir(base_dir)
+    if not directory.exists():
+        return
+    cutoff = time.time() - JOB_RETENTION_SECONDS
+    for path in directory.iterdir():
+        try:
+            if path.stat().st_mtime < cutoff:
+                path.unlink()
+        except OSError:
+            continue
+
+
+def parse_options(data: Dict, base_dir=None) -> Dict:
+    """Validated job options from a request body; raises ``ValueError``."""
+    base = Path(base_dir or DEFAULT_RESOURCES_DIR).resolve()
+    mode = (data.get("mode") or "incremental").strip().lower()
+    if mode not in MODES:
+        raise ValueError(f"mode must be one of {', '.join(MODES)}")
+    force_reembed = data.get("force_reembed", False)
+    if not isinstance(force_reembed, bool):
+        raise ValueError("force_reembed must be a boolean")
+    subdirectory = (data.get("subdirectory") or "").strip().strip("/")
+    if subdirectory:
+        target = (base / subdirectory).resolve()
+        if base not in target.parents or not target.is_dir():
+            raise ValueError("subdirectory must be an existing folder of the knowledge base")
+        subdirectory = target.relative_to(base).as_posix()
+        force_reembed = True
+    return {"mode": mode, "force_reembed": force_reembed, "subdirectory": subdirectory or None}
+
+
+def load_job(job_id: str, base_dir=None) -> Optional[Dict]:
+    """A job's state with derived throughput and ETA, or ``None`` if unknown."""
+    path = _job_path(base_dir or DEFAULT_RESOURCES_DIR, job_id)
+    if path is None:
+        return None
+    try:
+        state = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    if state["status"] not in FINISHED and not _pid_alive(state["pid"]):
+        state.update(status="failed", error="worker exited before the job finished")
+
+    started, finished = state.get("started_at"), state.get("finished_at")
+    elapsed = ((finished or time.time()) - started) if started else 0.0
+    processed, total = state["chunks_processed"], state["chunks_to_embed"]
+    throughput = processed / elapsed if elapsed > 0 else 0.0
+    state["elapsed_seconds"] = round(elapsed, 3)
+    state["chunks_per_second"] = round(throughput, 2)
+    state["eta_seconds"] = (
+        round((total - processed) / throughput, 1)
+        if state["status"] == "running" and throughput > 0
+        else None
+    )
+    state["cancel_requested"] = _cancel_marker(
+        base_dir or DEFAULT_RESOURCES_DIR, job_id
+    ).exists()
+    return state
+
+
+def cancel_job(job_id: str, base_dir=None) -> Optional[Dict]:
+    """Ask a queued or running job to stop; returns its state (``None`` if unknown)."""
+    base_dir = base_dir or DEFAULT_RESOURCES_DIR
+    state = load_job(job_id, base_dir)
+    if state is None or state["status"] in FINISHED:
+        return state
+    _cancel_marker(base_dir, job_id).touch()
+    state["cancel_requested"] = True
+    return state
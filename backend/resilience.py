@@ -0,0 +1,310 @@
+"""
+Resilience primitives for outbound provider calls (Gemini generation and embeddings).
+
+Provides retries with jittered exponential backoff, a circuit breaker that fails
+fast while the provider is degraded, and optional hedged requests that fire a
+second attempt once the first one is slower than the observed p95 latency.
+"""
+
+import os
+import random
+import threading
+import time
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Callable, Optional
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+# HTTP statuses that indicate a transient provider problem worth retrying
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def _env_bool(name: str, default: bool = False) -> bool:
+    return str(os.getenv(name, str(default))).lower() in ("1", "true", "yes", "on")
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling the provider while the circuit breaker is open."""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(
+            f"{name} is temporarily unavailable (circuit open, retry in {retry_after:.0f}s)"
+        )
+        self.name = name
+        self.retry_after = retry_after
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """Return True for timeouts, connection errors and transient HTTP statuses."""
+    if isinstance(exc, (requests.exceptions.Timeout, requests.exceptions.ConnectionError)):
+        return True
+    if isinstance(exc, requests.exceptions.HTTPError):
+        response = getattr(exc, "response", None)
+        return response is not None and response.status_code in RETRYABLE_STATUS_CODES
+    return False
+
+
+def retry_after_seconds(exc: BaseException) -> Optional[float]:
+    """Extract a Retry-After hint (in seconds) from an HTTP error, if any."""
+    response = getattr(exc, "response", None)
+    if response is None:
+        return None
+    value = response.headers.get("Retry-After")
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+class RetryPolicy:
+    """Exponential backoff with full jitter, bounded by a total time budget."""
+
+    def __init__(
+        self,
+        max_attempts: int = 3,
+        base_delay: float = 0.5,
+        max_delay: float = 8.0,
+        max_elapsed: float = 30.0,
+    ):
+        self.max_attempts = max(1, int(max_attempts))
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_elapsed = max_elapsed
+
+    def backoff(self, attempt: int) -> float:
+        """Delay before retry number ``attempt`` (0-based)."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2**attempt)))
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            max_attempts=int(_env_float("LLM_RETRY_MAX_ATTEMPTS", 3)),
+            base_delay=_env_float("LLM_RETRY_BASE_DELAY", 0.5),
+            max_delay=_env_float("LLM_RETRY_MAX_DELAY", 8.0),
+            max_elapsed=_env_float("LLM_RETRY_MAX_ELAPSED", 30.0),
+        )
+
+
+class CircuitBreaker:
+    """
+    Classic closed/open/half-open breaker.
+
+    After ``failure_threshold`` consecutive transient failures the circuit opens and
+    calls fail fast for ``recovery_timeout`` seconds. Then a single trial call is let
+    through; its outcome closes the circuit again or re-opens it.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int = 5, recovery_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.recovery_timeout = recovery_timeout
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == self.OPEN and self._cooldown_elapsed():
+                return self.HALF_OPEN
+            return self._state
+
+    def _cooldown_elapsed(self) -> bool:
+        return time.monotonic() - self._opened_at >= self.recovery_timeout
+
+    def retry_after(self) -> float:
+        return max(0.0, self.recovery_timeout - (time.monotonic() - self._opened_at))
+
+    def before_call(self):
+        """Raise CircuitOpenError if the call must not go through."""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return
+            if self._state == self.OPEN and self._cooldown_elapsed():
+                self._state = self.HALF_OPEN
+                self._trial_in_flight = False
+            if self._state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return
+            raise CircuitOpenError(self.name, self.retry_after())
+
+    def record_success(self):
+        with self._lock:
+            if self._state != self.CLOSED:
+                logger.info(f"Circuit '{self.name}' closed")
+            self._state = self.CLOSED
+            self._failures = 0
+            self._trial_in_flight = False
+
+    def release_trial(self):
+        """End a call that says nothing about provider health, leaving the state as is."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    logger.warning(
+                        f"Circuit '{self.name}' opened after {self._failures} failures"
+                    )
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._trial_in_flight = False
+
+    @classmethod
+    def from_env(cls, name: str):
+        return cls(
+            name,
+            failure_threshold=int(_env_float("LLM_BREAKER_FAILURE_THRESHOLD", 5)),
+            recovery_timeout=_env_float("LLM_BREAKER_RECOVERY_SECONDS", 30.0),
+        )
+
+
+class LatencyTracker:
+    """Sliding window of recent successful call durations (seconds)."""
+
+    def __init__(self, window: int = 200):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, pct: float, min_samples: int = 1) -> Optional[float]:
+        with self._lock:
+            if len(self._samples) < max(1, min_samples):
+                return None
+            ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+        return ordered[index]
+
+
+# Shared worker pool for hedged attempts; losing attempts finish in the background
+_hedge_executor = ThreadPoolExecutor(
+    max_workers=int(_env_float("LLM_HEDGE_MAX_WORKERS", 16)),
+    thread_name_prefix="llm-hedge",
+)
+
+
+class ResilientCaller:
+    """Runs a provider call under a retry policy, a circuit breaker and optional hedging."""
+
+    def __init__(
+        self,
+        name: str,
+        breaker: CircuitBreaker,
+        retry: Optional[RetryPolicy] = None,
+        hedge: bool = False,
+        hedge_percentile: float = 95.0,
+        hedge_min_samples: int = 20,
+        hedge_min_delay: float = 0.05,
+    ):
+        self.name = name
+        self.breaker = breaker
+        self.retry = retry or RetryPolicy()
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.hedge_min_delay = hedge_min_delay
+        self.latency = LatencyTracker()
+
+    def hedge_delay(self) -> Optional[float]:
+        """Delay after which a hedged attempt fires, or None if not enough data yet."""
+        p = self.latency.percentile(self.hedge_percentile, self.hedge_min_samples)
+        return None if p is None else max(self.hedge_min_delay, p)
+
+    def call(self, fn: Callable, idempotent: bool = True):
+        """
+        Invoke ``fn`` (a zero-argument callable performing one HTTP attempt).
+
+        Only idempotent calls are retried or hedged. Raises CircuitOpenError when
+        failing fast, otherwise re-raises the last error from ``fn``.
+        """
+        started = time.monotonic()
+        attempts = self.retry.max_attempts if idempotent else 1
+        last_exc = None
+
+        for attempt in range(attempts):
+            self.breaker.before_call()
+            try:
+                result = self._attempt(fn, hedged=idempotent and self.hedge)
+            except Exception as exc:
+                last_exc = exc
+                if not is_retryable(exc):
+                    # Client-side errors (bad request, auth) say nothing about provider health
+                    self.breaker.release_trial()
+                    raise
+                self.breaker.record_failure()
+                if attempt + 1 >= attempts:
+                    break
+                delay = max(self.retry.backoff(attempt), retry_after_seconds(exc) or 0.0)
+                if time.monotonic() - started + delay > self.retry.max_elapsed:
+                    break
+                logger.warning(
+                    f"{self.name} attempt {attempt + 1}/{attempts} failed ({exc}); "
+                    f"retrying in {delay:.2f}s"
+                )
+                time.sleep(delay)
+                continue
+            self.breaker.record_success()
+            return result
+
+        raise last_exc
+
+    def _timed(self, fn: Callable):
+        t0 = time.monotonic()
+        result = fn()
+        self.latency.record(time.monotonic() - t0)
+        return result
+
+    def _attempt(self, fn: Callable, hedged: bool):
+        delay = self.hedge_delay() if hedged else None
+        if delay is None:
+            return self._timed(fn)
+
+        primary = _hedge_executor.submit(self._timed, fn)
+        done, _ = wait([primary], timeout=delay)
+        if done:
+            return primary.result()
+
+        logger.info(f"{self.name} slower than p{self.hedge_percentile:.0f} ({delay:.2f}s), hedging")
+        pending = {primary, _hedge_executor.submit(self._timed, fn)}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    @classmethod
+    def from_env(cls, name: str, breaker: CircuitBreaker):
+        return cls(
+            name,
+            breaker=breaker,
+            retry=RetryPolicy.from_env(),
+            hedge=_env_bool("LLM_HEDGE_ENABLED", False),
+            hedge_percentile=_env_float("LLM_HEDGE_PERCENTILE", 95.0),
+            hedge_min_samples=int(_env_float("LLM_HEDGE_MIN_SAMPLES", 20)),
+        )
@@ -1,10 +1,11 @@
 import os
+import json
 from pathlib import Path
 import secrets
 from datetime import datetime, timedelta
 import jwt
 from flask import current_app, g, session
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify, stream_with_context
 from werkzeug.utils import secure_filename
 
 from . import db
@@ -16,7 +17,33 @@ from .models.session_models import Session
 from .models.audit_models import FileAuditLog
 from .models.persona_models import Persona
 from .models.resource_models import Resource
-from .rag_pipeline_llm_driven import answer_query, answer_query_with_client_documents
+from .models.document_store_models import ClientDocument
+from .conversation_summary import schedule_update as schedule_summary_update
+from .document_store import (
+    DocumentStoreError,
+    delete_document as delete_client_document,
+    lookup as lookup_documents,
+    register_documents,
+    resolve_documents,
+    usage as document_usage,
+)
+from .rag_pipeline_llm_driven import (
+    answer_queries_batch,
+    answer_query,
+    answer_query_with_client_documents,
+    get_api_key,
+)
+from .reindex import (
+    FINISHED as REINDEX_FINISHED,
+    ReindexJob,
+    cancel_job as cancel_reindex_job,
+    load_job as load_reindex_job,
+    parse_options as parse_reindex_options,
+)
+from .resilience import CircuitOpenError
+from .profiling import make_token, profiling_secret
+from .timings import histogram_snapshot, observe, request_timer
+from .warmup import ensure_started as ensure_warmup_started, readiness as warmup_readiness
 
 
 api_bp = Blueprint("api", __name__)
@@ -27,6 +54,15 @@ def health():
     return {"status": "ok"}
 
 
+@api_bp.get("/health/ready")
+def health_ready():
+    """Readiness probe: 503 until the index, personas and HTTP pool are warm."""
+    ready, state = warmup_readiness()
+    if not ready:
+        ensure_warmup_started(current_app._get_current_object())
+    return state, 200 if ready else 503
+
+
 @api_bp.post("/auth/register")
 def register():
     data = request.get_json() or {}
@@ -196,9 +232,17 @@ def chat_message():
     if not session_id:
         return {"error": "Session ID required. Please create a session first."}, 400
 
-    response, source_file, context = answer_query(
-        message, user.id, session_id, persona_name
-    )
+    try:
+        response, source_file, context = answer_query(
+            message, user.id, session_id, persona_name
+        )
+    except CircuitOpenError as e:
+        return (
+            {"error": "AI provider temporarily unavailable, please retry shortly"},
+            503,
+            {"Retry-After": str(int(e.retry_after) + 1)},
+        )
+    g.stage_timings = (context or {}).get("timings")
     chat = ChatHistory(
         user_id=user.id,
         session_id=session_id,
@@ -209,6 +253,7 @@ def chat_message():
     )
     db.session.add(chat)
     db.session.commit()
+    schedule_summary_update(current_app._get_current_object(), user.id, session_id)
     return {
         "id": chat.id,
         "message": message,
@@ -237,7 +282,9 @@ def chat_message_with_client_documents():
     message = (data.get("message") or "").strip()
     session_id = (data.get("session_id") or "").strip()
     persona_name = (data.get("persona_name") or "").strip() or None
-    documents = data.get("documents", [])  # Array of {filename, content} objects
+    # Array of {filename, content} objects or {sha256[, filename]} references to
+    # documents registered via /api/chat/documents
+    documents = data.get("documents", [])
     search_method = data.get(
         "search_method", "full_documents"
     )  # "semantic_search" or "full_documents"
@@ -249,7 +296,18 @@ def chat_message_with_client_documents():
     if not session_id:
         return {"error": "Session ID required. Please create a session first."}, 400
 
+    if not isinstance(documents, list):
+        return {"error": "documents must be a list"}, 400
+
     try:
+        documents_received = len(documents)
+        documents, missing = resolve_documents(user.id, documents)
+        if missing:
+            return {
+                "error": "Unknown document hashes; register them via /api/chat/documents",
+                "missing": missing,
+            }, 409
+
         # Use client-side RAG function
         response, source_info, context = answer_query_with_client_documents(
             message, documents, user.id, session_id, persona_name
@@ -258,8 +316,9 @@ def chat_message_with_client_documents():
         # Add search method info to context
         if context:
             context["search_method"] = search_method
-            context["documents_received"] = len(documents)
+            context["documents_received"] = documents_received
 
+        g.stage_timings = (context or {}).get("timings")
         chat = ChatHistory(
             user_id=user.id,
             session_id=session_id,
@@ -270,6 +329,7 @@ def chat_message_with_client_documents():
         )
         db.session.add(chat)
         db.session.commit()
+        schedule_summary_update(current_app._get_current_object(), user.id, session_id)
 
         return {
             "id": chat.id,
@@ -282,10 +342,184 @@ def chat_message_with_client_documents():
             "persona": (context or {}).get("persona"),
             "search_method": search_method,
         }
+    except CircuitOpenError as e:
+        return (
+            {"error": "AI provider temporarily unavailable, please retry shortly"},
+            503,
+            {"Retry-After": str(int(e.retry_after) + 1)},
+        )
     except Exception as e:
         return {"error": f"Chat processing failed: {str(e)}"}, 500
 
 
+@api_bp.post("/chat/batch")
+def chat_batch():
+    """
+    Answer many questions in one request, streamed back as NDJSON.
+
+    Body: ``{"questions": [...], "persona_name"?, "session_id"?, "top_k"?,
+    "max_concurrency"?}``. Each output line is one answer (``"type": "result"``,
+    in completion order, with the question's ``index``); the last line is a
+    ``"type": "summary"``. With a ``session_id`` the answers are also saved to
+    the chat history.
+    """
+    user = _auth_user()
+    if not user:
+        return {"error": "Unauthorized"}, 401
+    data = request.get_json() or {}
+    questions = data.get("questions")
+    session_id = (data.get("session_id") or "").strip() or None
+    persona_name = (data.get("persona_name") or "").strip() or None
+    if not isinstance(questions, list) or not questions:
+        return {"error": "questions must be a non-empty list"}, 400
+    questions = [q.strip() if isinstance(q, str) else "" for q in questions]
+    if not all(questions):
+        return {"error": "Every question must be a non-empty string"}, 400
+    max_questions = int(os.getenv("CHAT_BATCH_MAX_QUESTIONS", "100"))
+    if len(questions) > max_questions:
+        return {"error": f"At most {max_questions} questions per batch"}, 400
+    try:
+        top_k = max(1, min(int(data.get("top_k", 5)), 50))
+        max_concurrency = data.get("max_concurrency")
+        if max_concurrency is None:
+            max_concurrency = os.getenv("CHAT_BATCH_MAX_CONCURRENCY", "4")
+        max_concurrency = int(max_concurrency)
+    except (TypeError, ValueError):
+        return {"error": "top_k and max_concurrency must be integers"}, 400
+    if max_concurrency < 1:
+        return {"error": "max_concurrency must be at least 1"}, 400
+    # Clients may lower the fan-out, never raise it past the server limit
+    max_concurrency = max(
+        1, min(max_concurrency, int(os.getenv("CHAT_BATCH_MAX_CONCURRENCY", "4")))
+    )
+
+    try:
+        # Shared retrieval stages are timed here; generation runs while streaming
+        with request_timer() as timer:
+            persona, results = answer_queries_batch(
+                questions, user.id, session_id, persona_name, top_k, max_concurrency
+            )
+    except CircuitOpenError as e:
+        return (
+            {"error": "AI provider temporarily unavailable, please retry shortly"},
+            503,
+            {"Retry-After": str(int(e.retry_after) + 1)},
+        )
+    except ValueError as e:
+        return {"error": str(e)}, 400
+
+    app = current_app._get_current_object()
+
+    def generate():
+        try:
+            failed = 0
+            usage_total = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+            for result in results:
+                if "error" in result:
+                    failed += 1
+                else:
+                    for key in usage_total:
+                        usage_total[key] += (result.get("token_usage") or {}).get(key, 0)
+                    if session_id:
+                        chat = ChatHistory(
+                            user_id=user.id,
+                            session_id=session_id,
+                            message=result["query"],
+                            response=result["response"],
+                            source_file=result["source_file"],
+                            context={
+                                "token_usage": result["token_usage"],
+                                "follow_up_suggestions": result["follow_up_suggestions"],
+                                "relevant_chunks": result["relevant_chunks"],
+                                "persona": persona,
+                                "batch": True,
+                            },
+                        )
+                        db.session.add(chat)
+                        db.session.commit()
+                        result["id"] = chat.id
+                yield json.dumps({"type": "result", **result}) + "\n"
+
+            if session_id:
+                schedule_summary_update(app, user.id, session_id)
+            timings = timer.as_dict()
+            observe("answer_queries_batch", timings)
+            yield json.dumps(
+                {
+                    "type": "summary",
+                    "questions": len(questions),
+                    "failed": failed,
+                    "persona": persona,
+                    "token_usage": usage_total,
+                    "timings": timings,
+                }
+            ) + "\n"
+        finally:
+            # A client disconnect closes this generator; closing results
+            # cancels the generations still queued
+            results.close()
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="application/x-ndjson",
+        headers={"X-Accel-Buffering": "no"},
+    )
+
+
+@api_bp.get("/chat/documents")
+def chat_documents_list():
+    user = _auth_user()
+    if not user:
+        return {"error": "Unauthorized"}, 401
+    docs = (
+        ClientDocument.query.filter_by(user_id=user.id)
+        .order_by(ClientDocument.last_used_at.desc())
+        .all()
+    )
+    return {"documents": [d.to_dict() for d in docs], "usage": document_usage(user.id)}
+
+
+@api_bp.post("/chat/documents")
+def chat_documents_register():
+    """Register document bodies once; chat requests then reference them by sha256."""
+    user = _auth_user()
+    if not user:
+        return {"error": "Unauthorized"}, 401
+    data = request.get_json() or {}
+    documents = data.get("documents")
+    if not isinstance(documents, list) or not documents:
+        return {"error": "documents required"}, 400
+    try:
+        registered = register_documents(user.id, documents)
+    except DocumentStoreError as e:
+        db.session.rollback()
+        return {"error": str(e)}, 400
+    return {"documents": registered, "usage": document_usage(user.id)}, 201
+
+
+@api_bp.post("/chat/documents/lookup")
+def chat_documents_lookup():
+    """Tell the client which hashes are already stored so it uploads only the rest."""
+    user = _auth_user()
+    if not user:
+        return {"error": "Unauthorized"}, 401
+    hashes = (request.get_json() or {}).get("hashes")
+    if not isinstance(hashes, list):
+        return {"error": "hashes must be a list"}, 400
+    present, missing = lookup_documents(user.id, hashes)
+    return {"present": present, "missing": missing}
+
+
+@api_bp.delete("/chat/documents/<sha256>")
+def chat_documents_delete(sha256):
+    user = _auth_user()
+    if not user:
+        return {"error": "Unauthorized"}, 401
+    if not delete_client_document(user.id, sha256):
+        return {"error": "Not found"}, 404
+    return {"message": "Deleted"}
+
+
 @api_bp.get("/chat/history")
 def chat_history():
     user = _auth_user()
@@ -363,18 +597,87 @@ def put_settings():
 
 @api_bp.post("/admin/reindex")
 def admin_reindex():
-    # Placeholder for reindex operation. In simple keyword search, no persistent index.
+    """Start a background rebuild of the knowledge-base index."""
     user = _auth_user()
     if not user:
         return {"error": "Unauthorized"}, 401
     if not _is_admin(user):
         return {"error": "Forbidden"}, 403
+    try:
+        options = parse_reindex_options(request.get_json(silent=True) or {})
+        api_key = get_api_key()
+    except ValueError as e:
+        return {"error": str(e)}, 400
     base = _resources_dir()
     total_md = 0
     if base.exists():
         for _root, _dirs, files in os.walk(base):
             total_md += sum(1 for f in files if f.lower().endswith(".md"))
-    return {"message": "Reindex triggered", "resources_markdown": total_md}
+    job = ReindexJob(options, requested_by=user.username).start(api_key)
+    return {
+        "message": "Reindex started",
+        "job_id": job.id,
+        "options": options,
+        "resources_markdown": total_md,
+    }, 202
+
+
+@api_bp.get("/admin/reindex/<job_id>")
+def admin_reindex_status(job_id):
+    """Progress of a reindex job: chunks processed, API calls, throughput and ETA."""
+    user = _auth_user()
+    if not user:
+        return {"error": "Unauthorized"}, 401
+    if not _is_admin(user):
+        return {"error": "Forbidden"}, 403
+    job = load_reindex_job(job_id)
+    if job is None:
+        return {"error": "Not found"}, 404
+    return job
+
+
+@api_bp.delete("/admin/reindex/<job_id>")
+def admin_reindex_cancel(job_id):
+    """Cancel a reindex job; the live index is left as it was."""
+    user = _auth_user()
+    if not user:
+        return {"error": "Unauthorized"}, 401
+    if not _is_admin(user):
+        return {"error": "Forbidden"}, 403
+    job = cancel_reindex_job(job_id)
+    if job is None:
+        return {"error": "Not found"}, 404
+    if job["status"] in REINDEX_FINISHED:
+        return {"error": f"Job already {job['status']}", "job": job}, 409
+    return {"message": "Cancellation requested", "job": job}, 202
+
+
+@api_bp.get("/admin/timings")
+def admin_timings():
+    """Per-stage chat pipeline latency histograms for this worker process."""
+    user = _auth_user()
+    if not user:
+        return {"error": "Unauthorized"}, 401
+    if not _is_admin(user):
+        return {"error": "Forbidden"}, 403
+    return {"pid": os.getpid(), "pipelines": histogram_snapshot()}
+
+
+@api_bp.post("/admin/profiling/token")
+def admin_profiling_token():
+    """Mint a short-lived X-Profile header value for reproducing a slow request."""
+    user = _auth_user()
+    if not user:
+        return {"error": "Unauthorized"}, 401
+    if not _is_admin(user):
+        return {"error": "Forbidden"}, 403
+    data = request.get_json(silent=True) or {}
+    try:
+        ttl = min(max(int(data.get("ttl_seconds", 600)), 1), 3600)
+    except (TypeError, ValueError):
+        return {"error": "ttl_seconds must be an integer"}, 400
+    token = make_token(profiling_secret(current_app), ttl)
+    return {"header": "X-Profile", "token": token, "ttl_seconds": ttl}
 
 
 @api_bp.get("/admin/resources")
@@ -0,0 +1,187 @@
+"""
+Single-flight coalescing of identical in-flight provider calls.
+
+When several requests need the exact same embedding or completion at the same
+moment, one caller (the leader) does the work and the concurrent duplicates wait
+for its result. Within a process this uses threading primitives; across gunicorn
+workers it optionally uses an flock'd lock file plus a short-lived result file in
+a shared directory (``SINGLEFLIGHT_LOCK_DIR``).
+"""
+
+import os
+import json
+import time
+import hashlib
+import threading
+import logging
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+from .metrics import record_cache
+
+try:
+    import fcntl
+except ImportError:  # Windows: cross-process coalescing unavailable
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+def flight_key(*parts: str) -> str:
+    """Stable hash of the exact call inputs (model, prompt/text, ...)."""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(str(part).encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class _Call:
+    __slots__ = ("event", "result", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Deduplicates concurrent calls sharing the same key."""
+
+    def __init__(
+        self,
+        name: str,
+        lock_dir: Optional[str] = None,
+        result_ttl: float = 5.0,
+        enabled: bool = True,
+    ):
+        self.name = name
+        self.enabled = enabled
+        self.result_ttl = result_ttl
+        self.lock_dir = Path(lock_dir) if lock_dir and fcntl else None
+        if self.lock_dir:
+            self.lock_dir.mkdir(parents=True, exist_ok=True)
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.coalesced = 0
+
+    def do(
+        self,
+        key: str,
+        fn: Callable[[], Any],
+        share: Callable[[Any], bool] = lambda result: True,
+        decode: Callable[[Any], Any] = lambda result: result,
+    ):
+        """
+        Run ``fn`` once per key among concurrent callers and return its result.
+
+        ``share`` decides whether a result may be handed to other worker processes
+        (e.g. skip error payloads); ``decode`` restores a JSON round-tripped result.
+        Exceptions raised by the leader propagate to in-process followers only.
+        """
+        if not self.enabled:
+            return fn()
+
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                self.coalesced += 1
+                leader = False
+                record_cache(f"singleflight_{self.name}", hits=1)
+            else:
+                call = _Call()
+                self._calls[key] = call
+                leader = True
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            if self.lock_dir:
+                call.result = self._do_across_workers(key, fn, share, decode)
+            else:
+                record_cache(f"singleflight_{self.name}", misses=1)
+                call.result = fn()
+        except BaseException as exc:
+            call.error = exc
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.event.set()
+        return call.result
+
+    # Cross-process coalescing -------------------------------------------------
+
+    def _do_across_workers(self, key, fn, share, decode):
+        lock_path = self.lock_dir / f"{self.name}-{key}.lock"
+        result_path = self.lock_dir / f"{self.name}-{key}.json"
+
+        with open(lock_path, "a+") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                cached = self._read_fresh(result_path)
+                if cached is not None:
+                    self.coalesced += 1
+                    record_cache(f"singleflight_{self.name}", hits=1)
+                    return decode(cached["result"])
+
+                record_cache(f"singleflight_{self.name}", misses=1)
+                result = fn()
+                if share(result):
+                    self._write_result(result_path, result)
+                return result
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read_fresh(self, path: Path):
+        try:
+            if time.time() - path.stat().st_mtime > self.result_ttl:
+                return None
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_result(self, path: Path, result):
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"result": result}, f)
+            os.replace(tmp, path)
+        except (OSError, TypeError, ValueError) as e:
+            logger.warning(f"single-flight '{self.name}' could not share result: {e}")
+            tmp.unlink(missing_ok=True)
+            return
+
+        self._writes += 1
+        if self._writes % 100 == 0:
+            self._prune()
+
+    def _prune(self):
+        """
+        Remove stale result/lock files left behind by earlier flights.
+
+        Best effort: racing a worker that is just opening a pruned lock file can
+        only cost one duplicate provider call, never a wrong result.
+        """
+        cutoff = time.time() - max(60.0, self.result_ttl * 10)
+        for path in self.lock_dir.glob(f"{self.name}-*"):
+            try:
+                if path.stat().st_mtime < cutoff:
+                    path.unlink()
+            except OSError:
+                continue
+
+    @classmethod
+    def from_env(cls, name: str):
+        return cls(
+            name,
+            lock_dir=os.getenv("SINGLEFLIGHT_LOCK_DIR") or None,
+            result_ttl=float(os.getenv("SINGLEFLIGHT_RESULT_TTL", "5")),
+            enabled=os.getenv("SINGLEFLIGHT_ENABLED", "true").lower() == "true",
+        )
@@ -0,0 +1,194 @@
+"""
+Per-stage request timings for the chat pipeline.
+
+``answer_query`` and ``answer_query_with_client_documents`` open a
+:class:`StageTimer` for the request; pipeline helpers mark their work with
+``stage("embedding")`` etc. Stage times are exclusive (a nested stage is not
+also counted in its parent), so they add up to at most the request's duration.
+Finished timings are aggregated into fixed-bucket in-process histograms.
+"""
+
+import time
+import bisect
+import functools
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+from .metrics import STAGE_LATENCY
+
+STAGES = (
+    "embedding",
+    "search",
+    "history",
+    "persona",
+    "prompt_build",
+    "llm_wait",
+    "post_processing",
+)
+
+# Upper bounds in milliseconds; the last bucket is open-ended
+DEFAULT_BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+_local = threading.local()
+
+
+class StageTimer:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+        self._stack: List[list] = []
+
+    def push(self, name: str):
+        self._stack.append([name, time.perf_counter(), 0.0])
+
+    def pop(self):
+        name, started, child_time = self._stack.pop()
+        elapsed = time.perf_counter() - started
+        self.stages[name] = self.stages.get(name, 0.0) + elapsed - child_time
+        if self._stack:
+            self._stack[-1][2] += elapsed
+
+    def add(self, name: str, seconds: float):
+        """Record ``seconds`` of ``name`` measured elsewhere (e.g. on worker threads)."""
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def as_dict(self) -> Dict[str, float]:
+        """Stage durations in milliseconds, plus ``total`` for the whole request."""
+        timings = {name: round(seconds * 1000.0, 3) for name, seconds in self.stages.items()}
+        timings["total"] = round((time.perf_counter() - self.started) * 1000.0, 3)
+        return timings
+
+
+def current_timer() -> Optional[StageTimer]:
+    return getattr(_local, "timer", None)
+
+
+@contextmanager
+def request_timer():
+    """Collect stage timings for the enclosed pipeline call on this thread."""
+    previous = current_timer()
+    timer = StageTimer()
+    _local.timer = timer
+    try:
+        yield timer
+    finally:
+        _local.timer = previous
+
+
+@contextmanager
+def stage(name: str):
+    """Attribute the enclosed block to ``name``; a no-op outside a request timer."""
+    timer = current_timer()
+    if timer is None:
+        yield
+        return
+    timer.push(name)
+    try:
+        yield
+    finally:
+        timer.pop()
+
+
+def timed_request(fn):
+    """
+    Run a pipeline entry point under a fresh :class:`StageTimer`.
+
+    The wrapped function returns ``(response, source, context)``; the timings are
+    stored as ``context["timings"]`` and recorded in the histograms under the
+    function's name.
+    """
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        with request_timer() as timer:
+            result = fn(*args, **kwargs)
+        if isinstance(result, tuple) and len(result) == 3 and isinstance(result[2], dict):
+            timings = timer.as_dict()
+            result[2]["timings"] = timings
+            observe(fn.__name__, timings)
+        return result
+
+    return wrapper
+
+
+class Histogram:
+    """Thread-safe fixed-bucket histogram of millisecond samples."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS_MS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, value_ms: float):
+        index = bisect.bisect_left(self.buckets, value_ms)
+        with self.lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.total += value_ms
+
+    def quantile(self, q: float) -> Optional[float]:
+        """
+        Bucket upper bound containing the q-th sample; ``None`` when empty or when
+        the sample falls in the open-ended last bucket.
+        """
+        with self.lock:
+            counts, count = list(self.counts), self.count
+        if not count:
+            return None
+        rank = q * count
+        seen = 0
+        for index, bucket_count in enumerate(counts):
+            seen += bucket_count
+            if seen >= rank:
+                return self.buckets[index] if index < len(self.buckets) else None
+        return None
+
+    def snapshot(self) -> Dict:
+        with self.lock:
+            counts, count, total = list(self.counts), self.count, self.total
+        bounds = [str(b) for b in self.buckets] + ["+Inf"]
+        return {
+            "count": count,
+            "sum_ms": round(total, 3),
+            "mean_ms": round(total / count, 3) if count else None,
+            "p50_ms": self.quantile(0.50),
+            "p95_ms": self.quantile(0.95),
+            "p99_ms": self.quantile(0.99),
+            "buckets": dict(zip(bounds, counts)),
+        }
+
+
+_histograms: Dict[tuple, Histogram] = {}
+_histograms_lock = threading.Lock()
+
+
+def observe(endpoint: str, timings: Dict[str, float]):
+    """Add one request's stage timings to the in-process histograms."""
+    for name, value in timings.items():
+        STAGE_LATENCY.observe(value / 1000.0, pipeline=endpoint, stage=name)
+        key = (endpoint, name)
+        histogram = _histograms.get(key)
+        if histogram is None:
+            with _histograms_lock:
+                histogram = _histograms.setdefault(key, Histogram())
+        histogram.observe(value)
+
+
+def histogram_snapshot() -> Dict[str, Dict[str, Dict]]:
+    """``{endpoint: {stage: summary}}`` for every stage observed so far."""
+    with _histograms_lock:
+        items = list(_histograms.items())
+    snapshot: Dict[str, Dict[str, Dict]] = {}
+    for (endpoint, name), histogram in sorted(items):
+        snapshot.setdefault(endpoint, {})[name] = histogram.snapshot()
+    return snapshot
+
+
+def format_timings(timings: Optional[Dict[str, float]]) -> str:
+    """Compact ``stage=ms`` rendering for key/value log lines."""
+    if not timings:
+        return "-"
+    return ",".join(f"{name}={value:.1f}" for name, value in timings.items())
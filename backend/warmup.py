@@ -0,0 +1,146 @@
+"""
+Background warm-up and readiness for fresh workers.
+
+With ``INDEX_PRELOAD=true`` each worker process loads the knowledge-base index,
+the personas and the provider's HTTP connection pool in a background thread as
+soon as it starts (and again in forked workers, whose threads do not survive
+the fork). ``/api/health/ready`` answers 503 until every component is warm;
+``/api/health`` stays a plain liveness probe. Failed components are retried
+after ``WARMUP_RETRY_SECONDS``.
+
+``INDEX_PRELOAD=fork`` is for pre-forking servers (``gunicorn --preload``): the
+index is loaded synchronously in the master and the heap frozen
+(:func:`knowledge_index.preload_for_fork`), so workers inherit it and only warm
+the remaining components themselves. No thread is started before the fork.
+"""
+
+import os
+import time
+import logging
+import threading
+from typing import Dict, Tuple
+
+logger = logging.getLogger(__name__)
+
+COMPONENTS = ("index", "personas", "http_pool")
+
+_lock = threading.Lock()
+_state: Dict = {"pid": None, "started_at": None, "components": {}}
+
+
+def preload_mode() -> str:
+    """``false``, ``true`` (background warm-up) or ``fork``."""
+    return os.getenv("INDEX_PRELOAD", "false").strip().lower()
+
+
+def preload_enabled() -> bool:
+    return preload_mode() in ("true", "fork")
+
+
+def _warm_index(app):
+    from .knowledge_index import get_index
+    from .rag_pipeline_llm_driven import get_api_key
+
+    index = get_index(get_api_key())
+    if not index.total_chunks:
+        raise RuntimeError("knowledge base is empty")
+    return index.stats()
+
+
+def _warm_personas(app):
+    from .models.persona_models import Persona
+
+    with app.app_context():
+        personas = Persona.query.filter_by(is_active=True).all()
+        return {"active": len(personas)}
+
+
+def _warm_http_pool(app):
+    from .providers import get_provider
+
+    provider = get_provider()
+    provider.warm_up(os.getenv("GOOGLE_GEMINI_API_KEY", "").strip())
+    return {"provider": provider.name}
+
+
+_WARMERS = {
+    "index": _warm_index,
+    "personas": _warm_personas,
+    "http_pool": _warm_http_pool,
+}
+
+
+def _run(app, names):
+    for name in names:
+        started = time.perf_counter()
+        try:
+            detail = _WARMERS[name](app)
+            status = {"status": "ready", "detail": detail}
+        except Exception as e:
+            logger.warning("warm-up of %s failed: %s", name, e)
+            status = {"status": "failed", "error": str(e), "failed_at": time.time()}
+        status["seconds"] = round(time.perf_counter() - started, 3)
+        with _lock:
+            _state["components"][name] = status
+    logger.info("warm-up finished", extra={"components": readiness()[1]["components"]})
+
+
+def ensure_started(app):
+    """Start (or retry) the warm-up in this process if it is not already running."""
+    retry_after = float(os.getenv("WARMUP_RETRY_SECONDS", "10"))
+    with _lock:
+        if _state["pid"] != os.getpid():
+            _state.update(pid=os.getpid(), started_at=time.time(), components={})
+            pending = list(COMPONENTS)
+        else:
+            pending = [
+                name
+                for name, status in _state["components"].items()
+                if status["status"] == "failed"
+                and time.time() - status["failed_at"] >= retry_after
+            ]
+        if not pending:
+            return
+        for name in pending:
+            _state["components"][name] = {"status": "warming"}
+    threading.Thread(
+        target=_run, args=(app, pending), name="warmup", daemon=True
+    ).start()
+
+
+def readiness() -> Tuple[bool, Dict]:
+    with _lock:
+        components = {name: dict(status) for name, status in _state["components"].items()}
+        started_at = _state["started_at"] if _state["pid"] == os.getpid() else None
+    if not preload_enabled():
+        return True, {"status": "ready", "preload": False, "components": components}
+    ready = started_at is not None and all(
+        components.get(name, {}).get("status") == "ready" for name in COMPONENTS
+    )
+    return ready, {
+        "status": "ready" if ready else "warming",
+        "preload": True,
+        "started_at": started_at,
+        "components": components,
+    }
+
+
+def init_app(app):
+    """Kick off the warm-up when ``INDEX_PRELOAD`` is enabled."""
+    if not preload_enabled():
+        return
+    if preload_mode() == "fork":
+        from .knowledge_index import preload_for_fork
+        from .rag_pipeline_llm_driven import get_api_key
+
+        try:
+            preload_for_fork(get_api_key())
+        except Exception:
+            # Workers retry through the normal warm-up
+            logger.exception("failed to preload the index before fork")
+    else:
+        ensure_started(app)
+
+    @app.before_request
+    def _warm_forked_worker():
+        ensure_started(app)
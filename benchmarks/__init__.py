@@ -0,0 +1 @@
+"""Performance benchmarks for the RAG backend (run with ``python -m benchmarks.<name>``)."""
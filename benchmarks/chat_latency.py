@@ -0,0 +1,415 @@
+"""
+End-to-end chat latency and throughput harness.
+
+Boots the real Flask app on an ephemeral port against a throwaway SQLite database,
+drives ``/api/chat/message`` and ``/api/chat/message/client-documents`` with N
+concurrent simulated users, and reports throughput plus p50/p95/p99 latency broken
+down by stage (auth, history, persona, query embedding, retrieval, prompt build,
+generation, DB write). The LLM is stubbed by the offline ``local`` provider or by
+the bundled mock Gemini server, so "our code" and "the provider" separate cleanly:
+
+    python -m benchmarks.chat_latency --users 8 --requests 25 --llm-latency 400:150
+    python -m benchmarks.chat_latency --backend mock --generate-latency lognormal:800:0.6
+    python -m benchmarks.chat_latency --output bench/chat.json --compare bench/chat-base.json
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext, redirect_stdout
+from pathlib import Path
+
+STAGES = [
+    "auth",
+    "history",
+    "persona",
+    "query_embedding",
+    "retrieval",
+    "prompt_build",
+    "generation",
+    "db_write",
+]
+
+ENDPOINTS = {
+    "message": "/api/chat/message",
+    "client-documents": "/api/chat/message/client-documents",
+}
+
+
+class StageTracer:
+    """
+    Per-request exclusive stage timings, keyed by the serving thread.
+
+    Nested stages subtract their time from the enclosing stage, so the stage
+    values of one request add up to (at most) its total server time.
+    """
+
+    def __init__(self):
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.records = []
+
+    def begin(self):
+        self.local.trace = {"stages": defaultdict(float), "stack": []}
+
+    def end(self, path: str, status: int, total: float):
+        trace = getattr(self.local, "trace", None)
+        self.local.trace = None
+        if trace is None:
+            return
+        stages = dict(trace["stages"])
+        stages["other"] = max(0.0, total - sum(stages.values()))
+        with self.lock:
+            self.records.append(
+                {"path": path, "status": status, "total": total, "stages": stages}
+            )
+
+    def push(self, name: str):
+        trace = getattr(self.local, "trace", None)
+        if trace is not None:
+            trace["stack"].append([name, time.perf_counter(), 0.0])
+
+    def pop(self):
+        trace = getattr(self.local, "trace", None)
+        if trace is None or not trace["stack"]:
+            return
+        name, started, child_time = trace["stack"].pop()
+        elapsed = time.perf_counter() - started
+        trace["stages"][name] += elapsed - child_time
+        if trace["stack"]:
+            trace["stack"][-1][2] += elapsed
+
+    @contextmanager
+    def stage(self, name: str):
+        self.push(name)
+        try:
+            yield
+        finally:
+            self.pop()
+
+    def wrap(self, module, attr: str, stage: str):
+        original = getattr(module, attr)
+
+        def traced(*args, **kwargs):
+            with self.stage(stage):
+                return original(*args, **kwargs)
+
+        setattr(module, attr, traced)
+
+    def install(self, app, db):
+        """Wrap pipeline/route functions and hook SQLAlchemy for DB stages."""
+        from sqlalchemy import event
+        from sqlalchemy.orm import Session as OrmSession
+        from backend import routes
+        from backend import rag_pipeline_llm_driven as pipeline
+
+        self.wrap(routes, "_auth_user", "auth")
+        self.wrap(pipeline, "get_chat_history", "history")
+        self.wrap(pipeline, "get_conversation_context", "history")
+        self.wrap(pipeline, "generate_text_embedding", "query_embedding")
+        self.wrap(pipeline, "get_index", "retrieval")
+        self.wrap(pipeline, "semantic_search", "retrieval")
+        self.wrap(pipeline, "find_relevant_chunks_from_documents", "retrieval")
+        self.wrap(pipeline, "build_analysis_prompt", "prompt_build")
+        self.wrap(pipeline, "call_gemini", "generation")
+
+        with app.app_context():
+            engine = db.engine
+
+        @event.listens_for(engine, "before_cursor_execute")
+        def _before(conn, cursor, statement, params, context, executemany):
+            # Persona lookups are scattered through the pipeline; attribute by table
+            if "FROM personas" in statement:
+                context._bench_stage = True
+                self.push("persona")
+
+        @event.listens_for(engine, "after_cursor_execute")
+        def _after(conn, cursor, statement, params, context, executemany):
+            if getattr(context, "_bench_stage", False):
+                self.pop()
+
+        @event.listens_for(OrmSession, "before_commit")
+        def _before_commit(session):
+            self.push("db_write")
+
+        @event.listens_for(OrmSession, "after_commit")
+        def _after_commit(session):
+            self.pop()
+
+        inner = app.wsgi_app
+
+        def traced_wsgi(environ, start_response):
+            status_holder = {}
+
+            def capture(status, headers, exc_info=None):
+                status_holder["status"] = int(status.split(" ", 1)[0])
+                return start_response(status, headers, exc_info)
+
+            self.begin()
+            t0 = time.perf_counter()
+            try:
+                return list(inner(environ, capture))
+            finally:
+                self.end(
+                    environ.get("PATH_INFO", ""),
+                    status_holder.get("status", 500),
+                    time.perf_counter() - t0,
+                )
+
+        app.wsgi_app = traced_wsgi
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--users", type=int, default=8, help="Concurrent simulated users")
+    parser.add_argument("--requests", type=int, default=20, help="Requests per user")
+    parser.add_argument(
+        "--endpoint", choices=["message", "client-documents", "both"], default="both"
+    )
+    parser.add_argument("--backend", choices=["local", "mock"], default="local")
+    parser.add_argument(
+        "--llm-latency", default="300:100", help="local backend: mean_ms[:jitter_ms]"
+    )
+    parser.add_argument("--embed-latency", default="20:5", help="local backend: mean_ms[:jitter_ms]")
+    parser.add_argument(
+        "--generate-latency", default="lognormal:800:0.5", help="mock backend latency spec"
+    )
+    parser.add_argument("--documents", type=int, default=5, help="Client documents per request")
+    parser.add_argument("--think-time", type=float, default=0.0, help="Seconds between requests")
+    parser.add_argument("--output", help="Write results JSON here")
+    parser.add_argument("--compare", help="Baseline JSON to compare against")
+    parser.add_argument("--metric", default="p95_ms")
+    parser.add_argument("--threshold", type=float, default=0.15)
+    parser.add_argument(
+        "--verbose", action="store_true", help="Keep the pipeline's progress output"
+    )
+    return parser.parse_args(argv)
+
+
+def _configure_environment(args, tmp: Path):
+    os.environ["DATABASE_URL"] = f"sqlite:///{tmp / 'bench.db'}"
+    os.environ["LOG_LEVEL"] = "WARNING"
+    os.environ["JWT_SECRET_KEY"] = "bench-" + "x" * 32
+
+    if args.backend == "local":
+        os.environ["LLM_PROVIDER"] = "local"
+        os.environ["LOCAL_LLM_LATENCY_MS"] = args.llm_latency
+        os.environ["LOCAL_EMBED_LATENCY_MS"] = args.embed_latency
+        return None
+
+    from werkzeug.serving import make_server
+    from backend.mock_gemini import MockGeminiConfig, create_mock_gemini_app
+
+    mock = make_server(
+        "127.0.0.1",
+        0,
+        create_mock_gemini_app(MockGeminiConfig(generate_latency=args.generate_latency)),
+        threaded=True,
+    )
+    threading.Thread(target=mock.serve_forever, daemon=True).start()
+    os.environ["LLM_PROVIDER"] = "gemini"
+    os.environ["GOOGLE_GEMINI_API_KEY"] = "mock-key"
+    os.environ["GEMINI_API_BASE_URL"] = f"http://127.0.0.1:{mock.server_port}/v1beta"
+    return mock
+
+
+def _create_schema():
+    """Create tables before create_app() so its startup data sync finds them."""
+    from sqlalchemy import create_engine
+    from backend import db
+    import backend.models  # noqa: F401  (registers all tables on db.metadata)
+
+    engine = create_engine(os.environ["DATABASE_URL"])
+    db.metadata.create_all(engine)
+    engine.dispose()
+
+
+def _seed(app, db, users: int):
+    from backend.models import User
+    from backend.models.persona_models import Persona
+
+    with app.app_context():
+        if Persona.query.count() == 0:
+            Persona.create_default_personas()
+        for i in range(users):
+            user = User(username=f"bench{i}", email=f"bench{i}@example.com", active=True)
+            user.set_password("bench")
+            db.session.add(user)
+        db.session.commit()
+
+
+def _client_documents(rng: random.Random, count: int):
+    from .corpus import generate_markdown
+
+    return [
+        {"filename": f"client_{i}.md", "content": generate_markdown(rng, 3)}
+        for i in range(count)
+    ]
+
+
+def run(args):
+    import requests
+    from .corpus import sample_queries
+
+    with tempfile.TemporaryDirectory(prefix="rag-chat-bench-") as tmp:
+        mock = _configure_environment(args, Path(tmp))
+
+        from werkzeug.serving import make_server
+        from backend import create_app, db
+
+        _create_schema()
+        app = create_app()
+        _seed(app, db, args.users)
+        tracer = StageTracer()
+        tracer.install(app, db)
+
+        server = make_server("127.0.0.1", 0, app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base = f"http://127.0.0.1:{server.server_port}"
+
+        endpoints = (
+            list(ENDPOINTS) if args.endpoint == "both" else [args.endpoint]
+        )
+        queries = sample_queries(50)
+        client_latency = defaultdict(list)
+        errors = defaultdict(int)
+
+        def simulate_user(index: int):
+            rng = random.Random(index)
+            http = requests.Session()
+            token = http.post(
+                f"{base}/api/auth/login",
+                json={"username": f"bench{index}", "password": "bench"},
+            ).json()["token"]
+            http.headers["Authorization"] = f"Bearer {token}"
+            documents = _client_documents(rng, args.documents)
+
+            for n in range(args.requests):
+                endpoint = endpoints[n % len(endpoints)]
+                payload = {"message": rng.choice(queries), "session_id": f"bench-{index}"}
+                if endpoint == "client-documents":
+                    payload["documents"] = documents
+                t0 = time.perf_counter()
+                response = http.post(f"{base}{ENDPOINTS[endpoint]}", json=payload)
+                client_latency[endpoint].append(time.perf_counter() - t0)
+                if response.status_code != 200:
+                    errors[endpoint] += 1
+                if args.think_time:
+                    time.sleep(args.think_time)
+
+        # Warm the knowledge-base embedding cache outside the measured window
+        with app.app_context():
+            from backend.knowledge_index import get_index
+            from backend.rag_pipeline_llm_driven import get_api_key
+
+            get_index(get_api_key())
+        tracer.records.clear()
+
+        # The pipeline prints per-request progress; keep it out of the report
+        quiet = nullcontext() if args.verbose else redirect_stdout(open(os.devnull, "w"))
+        started = time.perf_counter()
+        with quiet, ThreadPoolExecutor(max_workers=args.users) as pool:
+            list(pool.map(simulate_user, range(args.users)))
+        wall = time.perf_counter() - started
+
+        # Background conversation summaries must finish before the database goes
+        from backend.conversation_summary import drain
+
+        drain()
+        server.shutdown()
+        if mock is not None:
+            mock.shutdown()
+
+    return _report(args, tracer.records, client_latency, errors, wall, endpoints)
+
+
+def _report(args, records, client_latency, errors, wall, endpoints):
+    from .harness import percentile
+
+    def stats(samples):
+        ms = [s * 1000.0 for s in samples]
+        if not ms:
+            return {}
+        return {
+            "count": len(ms),
+            "mean_ms": round(sum(ms) / len(ms), 3),
+            "p50_ms": round(percentile(ms, 50), 3),
+            "p95_ms": round(percentile(ms, 95), 3),
+            "p99_ms": round(percentile(ms, 99), 3),
+        }
+
+    results = {}
+    total_requests = 0
+    for endpoint in endpoints:
+        path = ENDPOINTS[endpoint]
+        server_records = [r for r in records if r["path"] == path]
+        stage_stats = {}
+        for stage in STAGES + ["other"]:
+            stage_stats[stage] = stats([r["stages"].get(stage, 0.0) for r in server_records])
+        latency = stats(client_latency[endpoint])
+        total_requests += len(client_latency[endpoint])
+        results[path] = {
+            **latency,
+            "median_ms": latency.get("p50_ms"),
+            "errors": errors[endpoint],
+            "server": stats([r["total"] for r in server_records]),
+            "stages": stage_stats,
+        }
+
+    return {
+        "throughput_rps": round(total_requests / wall, 3) if wall else 0.0,
+        "wall_s": round(wall, 3),
+        "results": results,
+    }
+
+
+def _print_table(report):
+    for path, result in report["results"].items():
+        print(
+            f"\n{path}  n={result.get('count', 0)} errors={result['errors']} "
+            f"p50={result.get('p50_ms')}ms p95={result.get('p95_ms')}ms p99={result.get('p99_ms')}ms",
+            file=sys.stderr,
+        )
+        print(f"  {'stage':<16} {'mean':>10} {'p50':>10} {'p95':>10} {'p99':>10}", file=sys.stderr)
+        for stage, s in result["stages"].items():
+            if s:
+                print(
+                    f"  {stage:<16} {s['mean_ms']:>10.2f} {s['p50_ms']:>10.2f} "
+                    f"{s['p95_ms']:>10.2f} {s['p99_ms']:>10.2f}",
+                    file=sys.stderr,
+                )
+    print(f"\nthroughput: {report['throughput_rps']} req/s", file=sys.stderr)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    from .harness import compare, environment_info, format_comparison, write_results
+
+    report = run(args)
+    payload = {
+        "suite": "chat_latency",
+        "environment": environment_info(),
+        "params": {k: v for k, v in vars(args).items() if k not in ("output", "compare", "verbose")},
+        **report,
+    }
+    _print_table(report)
+    print(write_results(args.output, payload))
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text(encoding="utf-8"))
+        rows = compare(payload, baseline, threshold=args.threshold, metric=args.metric)
+        print(format_comparison(rows, metric=args.metric), file=sys.stderr)
+        if any(row["regression"] for row in rows):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
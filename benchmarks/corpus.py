@@ -0,0 +1,96 @@
+"""
+Synthetic knowledge-base generators for benchmarks.
+
+Produces deterministic markdown corpora shaped like the real resources (headers,
+paragraphs, bullet lists) and in-memory chunk lists with random unit embeddings
+for scoring benchmarks at sizes the real corpus cannot reach.
+"""
+
+import random
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+
+_TOPICS = [
+    "vacation policy", "expense reports", "onboarding", "security training",
+    "performance reviews", "remote work", "benefits enrollment", "travel booking",
+    "equipment requests", "payroll schedule", "incident response", "code review",
+    "customer escalation", "data retention", "api authentication", "release process",
+]
+
+_WORDS = (
+    "employee manager request approval policy system account access document team "
+    "process review report deadline budget quarter customer service support ticket "
+    "update record schedule training compliance security password network database "
+    "server deploy release version feature issue priority escalate contact portal "
+    "submit form invoice receipt travel booking benefit insurance payroll holiday"
+).split()
+
+
+def _sentence(rng: random.Random, topic: str) -> str:
+    words = rng.choices(_WORDS, k=rng.randint(8, 18))
+    words.insert(rng.randint(0, len(words)), topic)
+    return " ".join(words).capitalize() + "."
+
+
+def _section(rng: random.Random, topic: str, level: int) -> str:
+    lines = [f"{'#' * level} {topic.title()} {rng.randint(1, 999)}", ""]
+    for _ in range(rng.randint(2, 4)):
+        lines.append(" ".join(_sentence(rng, topic) for _ in range(rng.randint(3, 6))))
+        lines.append("")
+    if rng.random() < 0.5:
+        lines.extend(f"- {_sentence(rng, topic)}" for _ in range(rng.randint(2, 5)))
+        lines.append("")
+    return "\n".join(lines)
+
+
+def generate_markdown(rng: random.Random, sections: int) -> str:
+    topic = rng.choice(_TOPICS)
+    parts = [f"# {topic.title()} Handbook", ""]
+    for _ in range(sections):
+        parts.append(_section(rng, rng.choice(_TOPICS), rng.choice((2, 2, 3))))
+    return "\n".join(parts)
+
+
+def generate_corpus(
+    out_dir: Path, files: int = 50, sections_per_file: int = 12, seed: int = 42
+) -> Path:
+    """Write ``files`` markdown files (spread over a few subdirectories) into out_dir."""
+    rng = random.Random(seed)
+    out_dir = Path(out_dir)
+    for i in range(files):
+        subdir = out_dir / f"dept_{i % 5}"
+        subdir.mkdir(parents=True, exist_ok=True)
+        (subdir / f"doc_{i:05d}.md").write_text(
+            generate_markdown(rng, sections_per_file), encoding="utf-8"
+        )
+    return out_dir
+
+
+def synthetic_chunks(count: int, dim: int = 768, seed: int = 42) -> List[Dict]:
+    """Chunk dicts in the pipeline's shape with random unit-length embeddings."""
+    rng = random.Random(seed)
+    vectors = np.random.default_rng(seed).standard_normal((count, dim), dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    chunks = []
+    for i in range(count):
+        topic = rng.choice(_TOPICS)
+        chunks.append(
+            {
+                "text": " ".join(_sentence(rng, topic) for _ in range(4)),
+                "source_file": f"doc_{i // 20:05d}.md",
+                "chunk_id": f"doc_{i // 20:05d}.md_{i % 20}",
+                "header": f"## {topic.title()}",
+                "embedding": vectors[i].tolist(),
+            }
+        )
+    return chunks
+
+
+def sample_queries(count: int = 20, seed: int = 7) -> List[str]:
+    rng = random.Random(seed)
+    return [
+        f"What is the {rng.choice(_TOPICS)} {rng.choice(_WORDS)} {rng.choice(_WORDS)}?"
+        for _ in range(count)
+    ]
@@ -0,0 +1,139 @@
+"""Shared timing, result-file and baseline-comparison helpers for benchmarks."""
+
+import io
+import gc
+import json
+import time
+import platform
+import statistics
+import subprocess
+from contextlib import nullcontext, redirect_stdout
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(samples: List[float]) -> Dict:
+    """Latency summary in milliseconds."""
+    ms = [s * 1000.0 for s in samples]
+    return {
+        "runs": len(ms),
+        "min_ms": round(min(ms), 4),
+        "median_ms": round(statistics.median(ms), 4),
+        "mean_ms": round(statistics.fmean(ms), 4),
+        "p95_ms": round(percentile(ms, 95), 4),
+        "max_ms": round(max(ms), 4),
+    }
+
+
+def measure(
+    fn: Callable[[], object],
+    repeat: int = 5,
+    warmup: int = 1,
+    budget_s: float = 30.0,
+    quiet: bool = True,
+) -> Dict:
+    """
+    Time ``fn`` ``repeat`` times after ``warmup`` calls.
+
+    Stops early once ``budget_s`` is spent so the largest sizes stay tractable.
+    The pipeline's progress ``print`` output is swallowed when ``quiet``.
+    """
+    samples = []
+    with redirect_stdout(io.StringIO()) if quiet else nullcontext():
+        for _ in range(warmup):
+            fn()
+        started = time.perf_counter()
+        gc_was_enabled = gc.isenabled()
+        for _ in range(max(1, repeat)):
+            gc.collect()
+            gc.disable()
+            try:
+                t0 = time.perf_counter()
+                fn()
+                samples.append(time.perf_counter() - t0)
+            finally:
+                if gc_was_enabled:
+                    gc.enable()
+            if time.perf_counter() - started > budget_s:
+                break
+    return summarize(samples)
+
+
+def environment_info() -> Dict:
+    """Metadata that makes result files comparable across commits and machines."""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            timeout=5,
+        ).stdout.strip()
+    except Exception:
+        commit = None
+    return {
+        "timestamp": datetime.utcnow().isoformat() + "Z",
+        "git_commit": commit or None,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+    }
+
+
+def write_results(path: Optional[str], payload: Dict):
+    text = json.dumps(payload, indent=2, sort_keys=True)
+    if path:
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        Path(path).write_text(text + "\n", encoding="utf-8")
+    return text
+
+
+def compare(
+    current: Dict, baseline: Dict, threshold: float = 0.15, metric: str = "median_ms"
+) -> List[Dict]:
+    """
+    Compare ``metric`` per benchmark against a baseline result file.
+
+    Returns one row per benchmark present in both; rows whose ratio exceeds
+    ``1 + threshold`` are flagged as regressions.
+    """
+    rows = []
+    base_results = baseline.get("results", {})
+    for name, result in sorted(current.get("results", {}).items()):
+        base = base_results.get(name)
+        if not base or not base.get(metric):
+            continue
+        ratio = result[metric] / base[metric]
+        rows.append(
+            {
+                "name": name,
+                "baseline": base[metric],
+                "current": result[metric],
+                "ratio": round(ratio, 3),
+                "regression": ratio > 1.0 + threshold,
+            }
+        )
+    return rows
+
+
+def format_comparison(rows: List[Dict], metric: str = "median_ms") -> str:
+    lines = [f"{'benchmark':<48} {'baseline':>12} {'current':>12} {'ratio':>7}"]
+    for row in rows:
+        flag = "  REGRESSION" if row["regression"] else ""
+        lines.append(
+            f"{row['name']:<48} {row['baseline']:>12.3f} {row['current']:>12.3f} "
+            f"{row['ratio']:>7.3f}{flag}"
+        )
+    lines.append(f"({metric})")
+    return "\n".join(lines)
@@ -0,0 +1,144 @@
+"""
+Retrieval micro-benchmarks.
+
+Covers corpus loading/chunking, embedding-cache hits, semantic search and keyword
+search over synthetic chunk sets, and text splitting. Runs fully offline on the
+deterministic ``local`` provider and writes machine-readable JSON that can be
+compared against a stored baseline:
+
+    python -m benchmarks.retrieval --output bench/retrieval.json
+    python -m benchmarks.retrieval --save-baseline benchmarks/baseline.json
+    python -m benchmarks.retrieval --compare benchmarks/baseline.json --threshold 0.15
+
+The 1M-chunk scale (``--scale full``) holds every embedding as a Python list, so
+it needs tens of GB of RAM at 768 dimensions; pass ``--dim 64`` on smaller boxes.
+"""
+
+import os
+import sys
+import json
+import argparse
+import tempfile
+from pathlib import Path
+
+SCALES = {
+    "quick": [1_000, 10_000],
+    "default": [1_000, 10_000, 100_000],
+    "full": [1_000, 10_000, 100_000, 1_000_000],
+}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--scale", choices=sorted(SCALES), default="default")
+    parser.add_argument(
+        "--sizes", help="Comma-separated chunk counts (overrides --scale)", default=None
+    )
+    parser.add_argument("--dim", type=int, default=768, help="Embedding dimension")
+    parser.add_argument("--files", type=int, default=200, help="Markdown files in the corpus")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--budget", type=float, default=30.0, help="Seconds per benchmark")
+    parser.add_argument("--output", help="Write results JSON here")
+    parser.add_argument("--save-baseline", help="Also write results as the baseline file")
+    parser.add_argument("--compare", help="Baseline JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.15)
+    return parser.parse_args(argv)
+
+
+def run(args):
+    # Offline, deterministic provider sized to the synthetic embeddings
+    os.environ["LLM_PROVIDER"] = "local"
+    os.environ["LOCAL_EMBEDDING_DIM"] = str(args.dim)
+    os.environ.setdefault("SINGLEFLIGHT_ENABLED", "false")
+
+    from backend.rag_pipeline_llm_driven import (
+        find_relevant_chunks_from_documents,
+        load_document_chunks,
+        load_or_generate_embeddings,
+        semantic_search,
+        split_text_into_chunks,
+    )
+    from .corpus import generate_corpus, generate_markdown, sample_queries, synthetic_chunks
+    from .harness import measure
+
+    import random
+
+    sizes = (
+        [int(s) for s in args.sizes.split(",")] if args.sizes else SCALES[args.scale]
+    )
+    results = {}
+    queries = sample_queries()
+
+    with tempfile.TemporaryDirectory(prefix="rag-bench-") as tmp:
+        resources = generate_corpus(Path(tmp) / "resources", files=args.files)
+
+        results[f"load_document_chunks[files={args.files}]"] = measure(
+            lambda: load_document_chunks(str(resources)),
+            repeat=args.repeat,
+            budget_s=args.budget,
+        )
+
+        # First call builds the cache; measured calls are pure cache hits
+        results[f"load_or_generate_embeddings[cache_hit,files={args.files}]"] = measure(
+            lambda: load_or_generate_embeddings(str(resources), api_key=""),
+            repeat=args.repeat,
+            budget_s=args.budget,
+        )
+
+    for size in sizes:
+        chunks = synthetic_chunks(size, dim=args.dim)
+        query_iter = iter(queries * (args.repeat + 2))
+
+        results[f"semantic_search[n={size},dim={args.dim}]"] = measure(
+            lambda: semantic_search(next(query_iter), chunks, api_key="", top_k=5),
+            repeat=args.repeat,
+            budget_s=args.budget,
+        )
+        query_iter = iter(queries * (args.repeat + 2))
+        results[f"find_relevant_chunks_from_documents[n={size}]"] = measure(
+            lambda: find_relevant_chunks_from_documents(next(query_iter), chunks, top_k=10),
+            repeat=args.repeat,
+            budget_s=args.budget,
+        )
+        del chunks
+
+    rng = random.Random(3)
+    for kb in (10, 100, 1000):
+        text = ""
+        while len(text) < kb * 1024:
+            text += generate_markdown(rng, 10)
+        text = text[: kb * 1024]
+        results[f"split_text_into_chunks[{kb}KB]"] = measure(
+            lambda: split_text_into_chunks(text),
+            repeat=args.repeat,
+            budget_s=args.budget,
+        )
+
+    return results
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    from .harness import compare, environment_info, format_comparison, write_results
+
+    payload = {
+        "suite": "retrieval",
+        "environment": environment_info(),
+        "params": {"dim": args.dim, "files": args.files, "repeat": args.repeat},
+        "results": run(args),
+    }
+    print(write_results(args.output, payload))
+    if args.save_baseline:
+        write_results(args.save_baseline, payload)
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text(encoding="utf-8"))
+        rows = compare(payload, baseline, threshold=args.threshold)
+        print(format_comparison(rows), file=sys.stderr)
+        if any(row["regression"] for row in rows):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
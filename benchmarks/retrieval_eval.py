@@ -0,0 +1,287 @@
+"""
+Retrieval quality-vs-latency evaluation.
+
+Scores each index configuration on a labeled query set (recall@k, MRR, nDCG)
+alongside per-query latency and index memory, so the fastest configuration
+that still meets a recall target can be picked:
+
+    python -m benchmarks.retrieval_eval
+    python -m benchmarks.retrieval_eval --labels bench/labels.json --min-recall 0.9
+    python -m benchmarks.retrieval_eval --files 200 --configs semantic_search,index
+
+Labels are a JSON list of ``{"query": ..., "relevant": [chunk_id, ...]}``.
+Without ``--labels`` they are derived from the corpus headers: each sampled
+header becomes a query whose relevant chunks are the ones under that header.
+The corpus is ``backend/resources`` unless ``--files`` asks for a synthetic one.
+"""
+
+import io
+import os
+import sys
+import json
+import math
+import random
+import shutil
+import argparse
+import tempfile
+import time
+import tracemalloc
+from contextlib import redirect_stdout
+from pathlib import Path
+from typing import Callable, Dict, List
+
+DEFAULT_RESOURCES = Path(__file__).resolve().parent.parent / "backend" / "resources"
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--labels", help="Labeled query set (JSON); synthetic if omitted")
+    parser.add_argument("--resources", help="Markdown corpus directory")
+    parser.add_argument(
+        "--files", type=int, default=0, help="Generate a synthetic corpus of this many files"
+    )
+    parser.add_argument("--queries", type=int, default=200, help="Synthetic queries to sample")
+    parser.add_argument(
+        "--configs", help=f"Comma-separated configs (default: all of {', '.join(CONFIGS)})"
+    )
+    parser.add_argument("--k", default="1,5,10", help="Cut-offs for recall@k")
+    parser.add_argument("--min-recall", type=float, default=0.9, help="Recall@k target")
+    parser.add_argument("--dim", type=int, default=768, help="Local provider embedding size")
+    parser.add_argument("--seed", type=int, default=13)
+    parser.add_argument("--output", help="Write results JSON here")
+    return parser.parse_args(argv)
+
+
+def _header_title(header: str) -> str:
+    return header.lstrip("#").strip()
+
+
+def synthetic_labels(chunks: List[Dict], count: int, seed: int = 13) -> List[Dict]:
+    """Header text as the query; every chunk under that header is relevant."""
+    by_header: Dict[str, List[str]] = {}
+    for chunk in chunks:
+        title = _header_title(chunk.get("header") or "")
+        if len(title.split()) >= 2:
+            by_header.setdefault(title, []).append(chunk["chunk_id"])
+    titles = sorted(by_header)
+    random.Random(seed).shuffle(titles)
+    return [{"query": title, "relevant": by_header[title]} for title in titles[:count]]
+
+
+def recall_at_k(retrieved: List[str], relevant: set, k: int) -> float:
+    return len(set(retrieved[:k]) & relevant) / len(relevant) if relevant else 0.0
+
+
+def reciprocal_rank(retrieved: List[str], relevant: set) -> float:
+    for rank, chunk_id in enumerate(retrieved, start=1):
+        if chunk_id in relevant:
+            return 1.0 / rank
+    return 0.0
+
+
+def ndcg_at_k(retrieved: List[str], relevant: set, k: int) -> float:
+    """Binary-relevance nDCG."""
+    dcg = sum(
+        1.0 / math.log2(rank + 1)
+        for rank, chunk_id in enumerate(retrieved[:k], start=1)
+        if chunk_id in relevant
+    )
+    ideal = sum(1.0 / math.log2(rank + 1) for rank in range(1, min(k, len(relevant)) + 1))
+    return dcg / ideal if ideal else 0.0
+
+
+# --- index configurations -------------------------------------------------
+# Each builder takes the embedded chunks and returns ``search(query, k) -> chunks``.
+# Everything allocated while building counts as the config's index memory.
+
+
+def _build_semantic_search(chunks):
+    from backend.rag_pipeline_llm_driven import semantic_search
+
+    # Fresh float lists, as unpickling the embeddings cache produces
+    index = [dict(chunk, embedding=[float(x) for x in chunk["embedding"]]) for chunk in chunks]
+    return lambda query, k: semantic_search(query, index, api_key="", top_k=k)
+
+
+def _index(method: str = "none", dim: int = 0, rerank_candidates: int = 0):
+    """``KnowledgeIndex.search`` over a generation written the way the indexer writes it."""
+
+    def build(chunks):
+        import numpy as np
+        from backend.embedding_reduction import EmbeddingReduction
+        from backend.knowledge_index import KnowledgeIndex, write_generation
+        from backend.rag_pipeline_llm_driven import generate_text_embedding
+
+        root = Path(tempfile.mkdtemp(prefix="rag-eval-index-"))
+        reduction = None
+        if method != "none":
+            reduction = EmbeddingReduction.fit(
+                method, dim, np.asarray([c["embedding"] for c in chunks], dtype=np.float32)
+            )
+            projected = reduction.project([c["embedding"] for c in chunks])
+            chunks = [dict(c, embedding=row.tolist()) for c, row in zip(chunks, projected)]
+        directory = write_generation(root, "eval", chunks, reduction)
+        del chunks, reduction
+        # The generation's projection is loaded with the configured re-rank depth
+        os.environ["EMBEDDING_RERANK_CANDIDATES"] = str(rerank_candidates)
+        index = KnowledgeIndex(str(root), directory)
+
+        def search(query, k):
+            embedding = generate_text_embedding(query, api_key="")
+            return index.search([embedding], top_k=k)[0]
+
+        return search
+
+    return build
+
+
+def _build_keyword(chunks):
+    from backend.rag_pipeline_llm_driven import find_relevant_chunks_from_documents
+
+    index = [{key: value for key, value in chunk.items() if key != "embedding"} for chunk in chunks]
+    return lambda query, k: find_relevant_chunks_from_documents(query, index, top_k=k)
+
+
+CONFIGS: Dict[str, Callable] = {
+    "semantic_search": _build_semantic_search,
+    "index": _index(),
+    "keyword": _build_keyword,
+    "pca_128": _index("pca", 128),
+    "pca_128_rerank": _index("pca", 128, 50),
+    "pca_256": _index("pca", 256),
+    "truncate_384": _index("truncate", 384),
+    "truncate_384_rerank": _index("truncate", 384, 50),
+}
+
+
+def evaluate(name: str, chunks: List[Dict], labels: List[Dict], ks: List[int]) -> Dict:
+    from .harness import summarize
+
+    tracemalloc.start()
+    try:
+        search = CONFIGS[name](chunks)
+        index_bytes = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+
+    depth = max(ks)
+    recalls = {k: [] for k in ks}
+    reciprocal_ranks, ndcgs, latencies = [], [], []
+    search(labels[0]["query"], depth)  # warm-up
+    for label in labels:
+        relevant = set(label["relevant"])
+        started = time.perf_counter()
+        found = search(label["query"], depth)
+        latencies.append(time.perf_counter() - started)
+        retrieved = [chunk["chunk_id"] for chunk in found]
+        for k in ks:
+            recalls[k].append(recall_at_k(retrieved, relevant, k))
+        reciprocal_ranks.append(reciprocal_rank(retrieved, relevant))
+        ndcgs.append(ndcg_at_k(retrieved, relevant, depth))
+
+    result = {f"recall@{k}": round(sum(v) / len(v), 4) for k, v in recalls.items()}
+    result["mrr"] = round(sum(reciprocal_ranks) / len(reciprocal_ranks), 4)
+    result[f"ndcg@{depth}"] = round(sum(ndcgs) / len(ndcgs), 4)
+    result["index_mb"] = round(index_bytes / (1024 * 1024), 3)
+    result.update(summarize(latencies))
+    return result
+
+
+def format_table(results: Dict[str, Dict], ks: List[int], recall_key: str, best: str) -> str:
+    depth = max(ks)
+    columns = [f"recall@{k}" for k in ks] + ["mrr", f"ndcg@{depth}"]
+    header = f"{'config':<24}" + "".join(f"{c:>11}" for c in columns)
+    header += f"{'p50_ms':>10}{'p95_ms':>10}{'index_mb':>10}"
+    lines = [header]
+    for name, result in results.items():
+        line = f"{name:<24}" + "".join(f"{result[c]:>11.4f}" for c in columns)
+        line += f"{result['median_ms']:>10.3f}{result['p95_ms']:>10.3f}{result['index_mb']:>10.2f}"
+        lines.append(line + ("  <- fastest meeting target" if name == best else ""))
+    lines.append(f"(target: {recall_key})")
+    return "\n".join(lines)
+
+
+def run(args):
+    # Offline, deterministic provider
+    os.environ["LLM_PROVIDER"] = "local"
+    os.environ["LOCAL_EMBEDDING_DIM"] = str(args.dim)
+    os.environ.setdefault("SINGLEFLIGHT_ENABLED", "false")
+    os.environ.setdefault("LOCAL_EMBED_LATENCY_MS", "0")
+
+    from backend.rag_pipeline_llm_driven import load_or_generate_embeddings
+    from .corpus import generate_corpus
+
+    ks = sorted({int(k) for k in args.k.split(",")})
+    names = args.configs.split(",") if args.configs else list(CONFIGS)
+    unknown = [name for name in names if name not in CONFIGS]
+    if unknown:
+        raise SystemExit(f"unknown configs: {', '.join(unknown)}")
+
+    with tempfile.TemporaryDirectory(prefix="rag-eval-") as tmp:
+        if args.files:
+            resources = generate_corpus(Path(tmp) / "resources", files=args.files)
+        else:
+            # Copy so the embeddings cache lands in the temp dir, not the repo
+            resources = Path(tmp) / "resources"
+            shutil.copytree(args.resources or DEFAULT_RESOURCES, resources)
+        with redirect_stdout(io.StringIO()):
+            chunks = load_or_generate_embeddings(str(resources), api_key="")
+    chunks = [chunk for chunk in chunks if chunk.get("embedding")]
+
+    if args.labels:
+        labels = json.loads(Path(args.labels).read_text(encoding="utf-8"))
+    else:
+        labels = synthetic_labels(chunks, args.queries, seed=args.seed)
+    known = {chunk["chunk_id"] for chunk in chunks}
+    labels = [
+        {"query": label["query"], "relevant": [c for c in label["relevant"] if c in known]}
+        for label in labels
+    ]
+    labels = [label for label in labels if label["relevant"]]
+    if not labels:
+        raise SystemExit("no labeled queries with relevant chunks in this corpus")
+
+    results = {}
+    for name in names:
+        with redirect_stdout(io.StringIO()):
+            results[name] = evaluate(name, chunks, labels, ks)
+
+    recall_key = f"recall@{max(ks)} >= {args.min_recall}"
+    passing = [n for n, r in results.items() if r[f"recall@{max(ks)}"] >= args.min_recall]
+    best = min(passing, key=lambda n: results[n]["median_ms"]) if passing else None
+    return {
+        "chunks": len(chunks),
+        "queries": len(labels),
+        "labels": "file" if args.labels else "synthetic_headers",
+        "results": results,
+        "best": best,
+        "table": format_table(results, ks, recall_key, best),
+    }
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    from .harness import environment_info, write_results
+
+    evaluation = run(args)
+    table = evaluation.pop("table")
+    payload = {
+        "suite": "retrieval_eval",
+        "environment": environment_info(),
+        "params": {
+            "dim": args.dim,
+            "files": args.files,
+            "k": args.k,
+            "min_recall": args.min_recall,
+        },
+        **evaluation,
+    }
+    write_results(args.output, payload)
+    print(table)
+    if args.output:
+        print(f"results written to {args.output}", file=sys.stderr)
+    return 0 if evaluation["best"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
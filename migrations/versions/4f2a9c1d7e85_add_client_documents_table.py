@@ -0,0 +1,44 @@
+"""Add client documents table
+
+Revision ID: 4f2a9c1d7e85
+Revises: 903ec58eddde
+Create Date: 2026-10-19 09:30:12.418730
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "4f2a9c1d7e85"
+down_revision = "903ec58eddde"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "client_documents",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("sha256", sa.String(length=64), nullable=False),
+        sa.Column("filename", sa.String(length=255), nullable=False),
+        sa.Column("content", sa.Text(), nullable=False),
+        sa.Column("size_bytes", sa.Integer(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("last_used_at", sa.DateTime(), nullable=False),
+        sa.CheckConstraint("LENGTH(sha256) = 64", name="check_sha256_length"),
+        sa.CheckConstraint("size_bytes >= 0", name="check_size_non_negative"),
+        sa.ForeignKeyConstraint(["user_id"], ["user.id"]),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("user_id", "sha256", name="uq_client_documents_user_sha"),
+    )
+    op.create_index(
+        "ix_client_documents_last_used_at", "client_documents", ["last_used_at"]
+    )
+
+
+def downgrade():
+    op.drop_index("ix_client_documents_last_used_at", table_name="client_documents")
+    op.drop_table("client_documents")
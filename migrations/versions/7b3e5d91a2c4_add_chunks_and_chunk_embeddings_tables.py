@@ -0,0 +1,61 @@
+"""Add chunks and chunk embeddings tables
+
+Revision ID: 7b3e5d91a2c4
+Revises: 4f2a9c1d7e85
+Create Date: 2026-10-19 14:05:37.204118
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "7b3e5d91a2c4"
+down_revision = "4f2a9c1d7e85"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "chunks",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("chunk_id", sa.String(length=300), nullable=False),
+        sa.Column("source_path", sa.String(length=500), nullable=False),
+        sa.Column("position", sa.Integer(), nullable=False),
+        sa.Column("resource_id", sa.Integer(), nullable=True),
+        sa.Column("user_id", sa.Integer(), nullable=True),
+        sa.Column("header", sa.Text(), nullable=False),
+        sa.Column("text", sa.Text(), nullable=False),
+        sa.Column("content_hash", sa.String(length=40), nullable=False),
+        sa.Column("file_mtime", sa.Float(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=False),
+        sa.CheckConstraint("LENGTH(content_hash) = 40", name="check_chunk_hash_length"),
+        sa.ForeignKeyConstraint(["resource_id"], ["resources.id"], ondelete="SET NULL"),
+        sa.ForeignKeyConstraint(["user_id"], ["user.id"]),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("source_path", "position", name="uq_chunks_source_position"),
+    )
+    op.create_index("ix_chunks_content_hash", "chunks", ["content_hash"])
+
+    op.create_table(
+        "chunk_embeddings",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("chunk_pk", sa.Integer(), nullable=False),
+        sa.Column("embedding_model", sa.String(length=100), nullable=False),
+        sa.Column("dimensions", sa.Integer(), nullable=False),
+        sa.Column("vector", sa.LargeBinary(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.CheckConstraint("dimensions > 0", name="check_embedding_dimensions_positive"),
+        sa.ForeignKeyConstraint(["chunk_pk"], ["chunks.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("chunk_pk", "embedding_model", name="uq_chunk_embeddings_model"),
+    )
+
+
+def downgrade():
+    op.drop_table("chunk_embeddings")
+    op.drop_index("ix_chunks_content_hash", table_name="chunks")
+    op.drop_table("chunks")
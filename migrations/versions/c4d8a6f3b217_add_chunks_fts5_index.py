@@ -0,0 +1,70 @@
+"""Add FTS5 full-text index over chunks
+
+Revision ID: c4d8a6f3b217
+Revises: 7b3e5d91a2c4
+Create Date: 2026-10-19 15:22:08.611934
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "c4d8a6f3b217"
+down_revision = "7b3e5d91a2c4"
+branch_labels = None
+depends_on = None
+
+
+def _fts5_available(bind) -> bool:
+    if bind.dialect.name != "sqlite":
+        return False
+    try:
+        bind.execute(sa.text("CREATE VIRTUAL TABLE temp.fts5_probe USING fts5(x)"))
+        bind.execute(sa.text("DROP TABLE temp.fts5_probe"))
+        return True
+    except sa.exc.OperationalError:
+        return False
+
+
+def upgrade():
+    bind = op.get_bind()
+    # SQLite only; other databases keep the in-memory keyword search
+    if not _fts5_available(bind):
+        return
+
+    # External-content table: the text lives in chunks, triggers keep it in sync
+    op.execute(
+        "CREATE VIRTUAL TABLE chunks_fts USING fts5("
+        "header, text, content='chunks', content_rowid='id', "
+        "tokenize='porter unicode61')"
+    )
+    op.execute(
+        "CREATE TRIGGER chunks_fts_ai AFTER INSERT ON chunks BEGIN "
+        "INSERT INTO chunks_fts(rowid, header, text) VALUES (new.id, new.header, new.text); "
+        "END"
+    )
+    op.execute(
+        "CREATE TRIGGER chunks_fts_ad AFTER DELETE ON chunks BEGIN "
+        "INSERT INTO chunks_fts(chunks_fts, rowid, header, text) "
+        "VALUES ('delete', old.id, old.header, old.text); "
+        "END"
+    )
+    op.execute(
+        "CREATE TRIGGER chunks_fts_au AFTER UPDATE OF header, text ON chunks BEGIN "
+        "INSERT INTO chunks_fts(chunks_fts, rowid, header, text) "
+        "VALUES ('delete', old.id, old.header, old.text); "
+        "INSERT INTO chunks_fts(rowid, header, text) VALUES (new.id, new.header, new.text); "
+        "END"
+    )
+    op.execute("INSERT INTO chunks_fts(chunks_fts) VALUES ('rebuild')")
+
+
+def downgrade():
+    if op.get_bind().dialect.name != "sqlite":
+        return
+    op.execute("DROP TRIGGER IF EXISTS chunks_fts_au")
+    op.execute("DROP TRIGGER IF EXISTS chunks_fts_ad")
+    op.execute("DROP TRIGGER IF EXISTS chunks_fts_ai")
+    op.execute("DROP TABLE IF EXISTS chunks_fts")
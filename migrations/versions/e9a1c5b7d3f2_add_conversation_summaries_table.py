@@ -0,0 +1,37 @@
+"""Add conversation summaries table
+
+Revision ID: e9a1c5b7d3f2
+Revises: c4d8a6f3b217
+Create Date: 2026-10-19 17:48:26.305917
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "e9a1c5b7d3f2"
+down_revision = "c4d8a6f3b217"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "conversation_summaries",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("session_id", sa.String(length=100), nullable=False),
+        sa.Column("summary", sa.Text(), nullable=False),
+        sa.Column("summarized_through_id", sa.Integer(), nullable=False),
+        sa.Column("turns", sa.Integer(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(["user_id"], ["user.id"]),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("user_id", "session_id", name="uq_conversation_summaries_session"),
+    )
+
+
+def downgrade():
+    op.drop_table("conversation_summaries")